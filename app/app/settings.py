@@ -35,9 +35,11 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'core',
     'user',
     'recipe',
+    'job',
     'rest_framework',
     'rest_framework.authtoken',
     'drf_spectacular',
@@ -86,6 +88,65 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+RECIPE_CACHE_ALIAS = 'default'
+RECIPE_CACHE_TIMEOUT = 300
+RECIPE_AUTOCOMPLETE_TIMEOUT_MS = 100
+# core.storage.ContentAddressedStorage stores identical images once.
+RECIPE_IMAGE_STORAGE = 'django.core.files.storage.FileSystemStorage'
+RECIPE_IMAGE_MAX_BYTES = 10 * 1024 * 1024
+RECIPE_IMAGE_MAX_PIXELS = 25_000_000
+# How much of an upload may be buffered while looking for the image header.
+RECIPE_IMAGE_HEADER_BYTES = 256 * 1024
+# Once a media request is authorised, hand the transfer to the front proxy
+# with 'X-Accel-Redirect' (nginx, RECIPE_MEDIA_ACCEL_PREFIX being an
+# internal location aliased to MEDIA_ROOT) or 'X-Sendfile' (Apache,
+# lighttpd). None streams the file from the worker.
+RECIPE_MEDIA_SENDFILE_HEADER = None
+RECIPE_MEDIA_ACCEL_PREFIX = '/protected/media/'
+RECIPE_MEDIA_MAX_AGE = 365 * 24 * 60 * 60
+
+# Token to user lookups are cached per process for AUTH_TOKEN_LOCAL_TTL
+# seconds, which bounds how long other processes accept a revoked token,
+# and in the shared cache for AUTH_TOKEN_CACHE_TIMEOUT seconds.
+AUTH_TOKEN_CACHE_ALIAS = 'default'
+AUTH_TOKEN_CACHE_TIMEOUT = 300
+AUTH_TOKEN_LOCAL_TTL = 5
+AUTH_TOKEN_LOCAL_SIZE = 10_000
+# Lifetimes in seconds of the signed tokens of core.tokens. Access tokens
+# are verified without the database, so revocation waits for them to expire.
+AUTH_ACCESS_TOKEN_LIFETIME = 5 * 60
+AUTH_REFRESH_TOKEN_LIFETIME = 14 * 24 * 60 * 60
+# Logins and signups hash a password. Each client IP and email gets a token
+# bucket of (capacity, seconds to refill one token), and at most
+# AUTH_PASSWORD_HASH_CONCURRENCY hashes run at once across processes.
+AUTH_THROTTLE_CACHE_ALIAS = 'default'
+AUTH_THROTTLE_IP_BUCKET = (20, 6)
+AUTH_THROTTLE_EMAIL_BUCKET = (5, 60)
+AUTH_PASSWORD_HASH_CONCURRENCY = 4
+AUTH_PASSWORD_HASH_RETRY_AFTER = 1
+
+JOB_WORKER_CONCURRENCY = 2
+# Idle workers are woken by NOTIFY, and poll in case one is missed.
+JOB_POLL_SECONDS = 5
+# Workers renew the lease of each job they are running this often.
+JOB_HEARTBEAT_SECONDS = 60
+# A running job whose lease has not been renewed for this long is run again,
+# as its worker has died.
+JOB_LEASE_SECONDS = 600
+JOB_MAX_ATTEMPTS = 5
+# Retries wait this long, doubling after each attempt up to the maximum.
+JOB_RETRY_DELAY = 10
+JOB_MAX_RETRY_DELAY = 3600
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
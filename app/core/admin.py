@@ -28,5 +28,6 @@ class UserAdmin(BaseUserAdmin):
 
 admin.site.register(models.User, UserAdmin)
 admin.site.register(models.Recipe)
+admin.site.register(models.Job)
 admin.site.register(models.Tag)
 admin.site.register(models.Ingredient)
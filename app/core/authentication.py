@@ -0,0 +1,168 @@
+"""
+Token authentication with the token to user lookup cached.
+
+A token is looked up in a small per-process LRU, then in the Django cache
+alias AUTH_TOKEN_CACHE_ALIAS, and only then in the database. Entries are
+keyed by a digest of the token, and hold the user's fields except the
+password hash. Deleting a token or saving its user invalidates the shared
+entry and the entry of the current process right away, and leaves a
+marker for a while so a lookup racing with the change cannot cache the old
+user again. Other processes may keep accepting the old entry for up to
+AUTH_TOKEN_LOCAL_TTL seconds.
+
+Signed access tokens from core.tokens are verified by their signature
+alone, with no cache or database lookup.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from drf_spectacular.extensions import OpenApiAuthenticationExtension
+from rest_framework.authentication import BaseAuthentication, TokenAuthentication, get_authorization_header
+from rest_framework.authtoken.models import Token
+from rest_framework.exceptions import AuthenticationFailed
+
+from core import tokens
+
+TOKEN_KEY = 'auth:token:{digest}'
+REVOKED = 'revoked'
+# Longer than a token lookup can take, so a racing lookup sees the marker.
+REVOKED_TIMEOUT = 60
+
+
+class LocalCache:
+    """Thread safe LRU of at most size entries, each expiring after its own time to live"""
+
+    def __init__(self, size):
+        self.size = size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the value of a key, or None if it is missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        """Store a value, dropping the least recently used entries past the size"""
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        """Remove a key if present"""
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        """Remove every entry"""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+local_cache = LocalCache(settings.AUTH_TOKEN_LOCAL_SIZE)
+
+
+def _cache():
+    """Return the cache backend shared by the processes"""
+    return caches[settings.AUTH_TOKEN_CACHE_ALIAS]
+
+
+def _digest(key):
+    """Return the cache key of a token, which does not reveal the token"""
+    return TOKEN_KEY.format(digest=hashlib.sha256(key.encode()).hexdigest())
+
+
+def _user_fields():
+    """Return the names of the user fields that are cached"""
+    return [field.attname for field in get_user_model()._meta.concrete_fields if field.name != 'password']
+
+
+def invalidate(key):
+    """Forget the user of a token in the shared cache and in this process"""
+    digest = _digest(key)
+    local_cache.delete(digest)
+    _cache().set(digest, REVOKED, REVOKED_TIMEOUT)
+
+
+def invalidate_user(user_id):
+    """Forget the user of every token of a user"""
+    for key in Token.objects.filter(user_id=user_id).values_list('key', flat=True):
+        invalidate(key)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """Drop-in TokenAuthentication that caches the token to user lookup"""
+
+    def authenticate_credentials(self, key):
+        """Return the user and token of a key, from a cache where possible"""
+        digest = _digest(key)
+        entry = local_cache.get(digest)
+        if entry is None:
+            entry = _cache().get(digest)
+            if entry is None or entry == REVOKED:
+                user, token = super().authenticate_credentials(key)
+                if entry == REVOKED:
+                    return user, token
+                entry = (token.created, [getattr(user, name) for name in _user_fields()])
+                if not _cache().add(digest, entry, settings.AUTH_TOKEN_CACHE_TIMEOUT):
+                    return user, token
+            local_cache.set(digest, entry, settings.AUTH_TOKEN_LOCAL_TTL)
+        created, values = entry
+        user = get_user_model().from_db(DEFAULT_DB_ALIAS, _user_fields(), values)
+        return user, Token(key=key, user=user, created=created)
+
+
+class SignedTokenAuthentication(BaseAuthentication):
+    """
+    Authenticate a signed access token in an "Authorization: Bearer" header
+    without any query. The user only has its id and token version loaded,
+    and reads its other fields from the database when first accessed.
+    """
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        """Return the user and token of a valid access token, or None for other schemes"""
+        auth = get_authorization_header(request).split()
+        if not auth or auth[0].lower() != self.keyword.lower().encode():
+            return None
+        if len(auth) != 2:
+            raise AuthenticationFailed('Invalid token header.')
+        try:
+            token = auth[1].decode()
+            user_id, version = tokens.verify(tokens.ACCESS, token)
+        except (UnicodeError, tokens.InvalidToken):
+            raise AuthenticationFailed('Invalid or expired token.')
+        return get_user_model().from_db(DEFAULT_DB_ALIAS, ['id', 'token_version'], [user_id, version]), token
+
+    def authenticate_header(self, request):
+        """Return the scheme for the WWW-Authenticate header of 401 responses"""
+        return self.keyword
+
+
+class SignedTokenScheme(OpenApiAuthenticationExtension):
+    """Describe signed access tokens in the API schema"""
+    target_class = 'core.authentication.SignedTokenAuthentication'
+    name = 'signedTokenAuth'
+
+    def get_security_definition(self, auto_schema):
+        """Return the OpenAPI security scheme"""
+        return {'type': 'http', 'scheme': 'bearer'}
@@ -0,0 +1,163 @@
+"""
+Database backed background jobs.
+
+A job is a row in core_job naming a function decorated with task() and
+its keyword arguments. Jobs are inserted in the caller's transaction, so
+a job is only seen by workers once the work that needs it has committed,
+and its NOTIFY wakes idle workers at the same moment. Workers claim jobs
+with SELECT ... FOR UPDATE SKIP LOCKED, highest priority first, so any
+number of them can share the queue without blocking each other.
+
+A job runs at least once: a failure is retried with exponential backoff
+until max_attempts. Workers renew the lease of their running jobs every
+JOB_HEARTBEAT_SECONDS, and a job whose worker died is queued again once
+its lease has gone JOB_LEASE_SECONDS without renewal. Tasks should
+therefore be idempotent.
+"""
+import logging
+import random
+import select
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from core.models import Job
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'core_job'
+
+
+def task(func=None, *, priority=0, max_attempts=None):
+    """
+    Mark a function as runnable by workers, with the priority and number of
+    attempts its jobs get unless enqueue() is given others
+    """
+    def decorate(func):
+        func.job_options = {'priority': priority, 'max_attempts': max_attempts}
+        return func
+
+    return decorate(func) if func else decorate
+
+
+def task_name(func):
+    """Return the name a task is stored under"""
+    return f'{func.__module__}.{func.__name__}'
+
+
+def enqueue(func, *, user_id=None, priority=None, delay=None, max_attempts=None, **kwargs):
+    """Queue a call of a task with JSON serializable keyword arguments, returning the job"""
+    options = func.job_options
+    job = Job.objects.create(
+        task=task_name(func),
+        kwargs=kwargs,
+        user_id=user_id,
+        priority=options['priority'] if priority is None else priority,
+        max_attempts=max_attempts or options['max_attempts'] or settings.JOB_MAX_ATTEMPTS,
+        run_at=timezone.now() + (delay or timedelta()),
+    )
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_notify(%s, %s)', [CHANNEL, ''])
+    return job
+
+
+def retry_delay(attempts):
+    """Return how long to wait before another attempt, doubling from JOB_RETRY_DELAY with jitter"""
+    delay = min(settings.JOB_RETRY_DELAY * 2 ** (attempts - 1), settings.JOB_MAX_RETRY_DELAY)
+    return timedelta(seconds=delay * random.uniform(0.5, 1))
+
+
+def claim(worker, limit=1):
+    """Lock up to limit jobs that are due for a worker and return them"""
+    with transaction.atomic():
+        ids = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status=Job.QUEUED, run_at__lte=timezone.now())
+            .order_by('-priority', 'run_at', 'id')
+            .values_list('id', flat=True)[:limit]
+        )
+        Job.objects.filter(id__in=ids).update(
+            status=Job.RUNNING, worker=worker, locked_at=timezone.now(), attempts=F('attempts') + 1,
+        )
+    return list(Job.objects.filter(id__in=ids).order_by('-priority', 'run_at', 'id'))
+
+
+def heartbeat(worker, job_ids):
+    """Renew the lease of the jobs a worker is still running, returning how many it still holds"""
+    return Job.objects.filter(id__in=job_ids, status=Job.RUNNING, worker=worker).update(locked_at=timezone.now())
+
+
+def requeue_expired():
+    """
+    Queue again the jobs whose worker has held them past the lease, failing
+    those out of attempts, and return how many there were
+    """
+    expired = Job.objects.filter(
+        status=Job.RUNNING, locked_at__lt=timezone.now() - timedelta(seconds=settings.JOB_LEASE_SECONDS),
+    )
+    failed = expired.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, error='Lease expired.', finished_at=timezone.now(), locked_at=None,
+    )
+    return failed + expired.update(status=Job.QUEUED, run_at=timezone.now(), locked_at=None)
+
+
+def _finish(job, **fields):
+    """Record the outcome of a job unless its lease expired and another worker took it over"""
+    Job.objects.filter(id=job.id, status=Job.RUNNING, worker=job.worker, attempts=job.attempts).update(
+        locked_at=None, **fields,
+    )
+
+
+def execute(job_id):
+    """Run a claimed job and record its result, or schedule a retry"""
+    job = Job.objects.get(id=job_id)
+    try:
+        func = import_string(job.task)
+        if not hasattr(func, 'job_options'):
+            raise ImportError(f'{job.task} is not a task.')
+        result = func(**job.kwargs)
+    except Exception as exc:
+        logger.exception('Job %s (%s) failed on attempt %s', job.id, job.task, job.attempts)
+        error = f'{type(exc).__name__}: {exc}'
+        if job.attempts < job.max_attempts:
+            _finish(job, status=Job.QUEUED, error=error, run_at=timezone.now() + retry_delay(job.attempts))
+        else:
+            _finish(job, status=Job.FAILED, error=error, finished_at=timezone.now())
+    else:
+        _finish(job, status=Job.SUCCEEDED, result=result, error='', finished_at=timezone.now())
+
+
+def execute_in_pool(job_id):
+    """Run a job on a worker pool thread or process, closing its database connection afterwards"""
+    try:
+        execute(job_id)
+    except Exception:
+        logger.exception('Could not run job %s', job_id)
+    finally:
+        close_old_connections()
+
+
+def wait_for_jobs(timeout):
+    """Wait up to timeout seconds for a job to be queued, listening on the default connection"""
+    connection.ensure_connection()
+    with connection.cursor() as cursor:
+        cursor.execute(f'LISTEN {CHANNEL}')
+    raw = connection.connection
+    if not raw.notifies and select.select([raw], [], [], timeout)[0]:
+        raw.poll()
+    raw.notifies.clear()
+
+
+def run_pending(worker='inline'):
+    """Run every job that is due in this thread, returning how many ran"""
+    count = 0
+    while True:
+        jobs = claim(worker)
+        if not jobs:
+            return count
+        execute(jobs[0].id)
+        count += 1
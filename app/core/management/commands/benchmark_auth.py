@@ -0,0 +1,57 @@
+"""Django command to benchmark authenticating API requests"""
+import statistics
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIRequestFactory
+
+from core import authentication, tokens
+
+BENCHMARK_EMAIL = 'benchmark-auth@example.com'
+
+
+class Command(BaseCommand):
+    """Time each authentication class verifying the token of a request"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=2000, help='Timed runs per class')
+
+    def _time(self, func, repeat):
+        """Return the median and worst run time of a function in microseconds"""
+        func()
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - start) * 1e6)
+        return statistics.median(timings), max(timings)
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        get_user_model().objects.filter(email=BENCHMARK_EMAIL).delete()
+        user = get_user_model().objects.create_user(email=BENCHMARK_EMAIL, password=None)
+        try:
+            factory = APIRequestFactory()
+            opaque = factory.get('/', HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+            signed = factory.get('/', HTTP_AUTHORIZATION=f'Bearer {tokens.issue(user)["access"]}')
+            cached = authentication.CachedTokenAuthentication()
+
+            def shared_cache():
+                authentication.local_cache.clear()
+                return cached.authenticate(opaque)
+
+            runs = {
+                'TokenAuthentication': lambda: TokenAuthentication().authenticate(opaque),
+                'cached, shared cache': shared_cache,
+                'cached, local LRU': lambda: cached.authenticate(opaque),
+                'signed token': lambda: authentication.SignedTokenAuthentication().authenticate(signed),
+            }
+            self.stdout.write(f'{"authentication":>22} {"median us":>10} {"max us":>10}')
+            for name, run in runs.items():
+                median, worst = self._time(run, options['repeat'])
+                self.stdout.write(f'{name:>22} {median:>10.1f} {worst:>10.1f}')
+        finally:
+            user.delete()
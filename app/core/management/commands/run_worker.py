@@ -0,0 +1,71 @@
+"""Django command to run background jobs"""
+import multiprocessing
+import os
+import signal
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core import jobs
+
+
+class Command(BaseCommand):
+    """Claim queued jobs and run them on a pool of threads or processes until stopped"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, default=settings.JOB_WORKER_CONCURRENCY,
+                            help='Jobs to run at once')
+        parser.add_argument('--pool', choices=['thread', 'process'], default='thread',
+                            help='Run jobs on threads, or on processes for CPU bound tasks')
+        parser.add_argument('--burst', action='store_true', help='Exit once no job is due')
+
+    def _stop(self, signum, frame):
+        """Stop claiming jobs, letting the running ones finish"""
+        self.stopping = True
+
+    def _pool(self, kind, concurrency):
+        """Return the executor jobs run on"""
+        if kind == 'process':
+            # Spawned processes open their own database connections rather
+            # than sharing the forked socket of this one.
+            return ProcessPoolExecutor(
+                concurrency, mp_context=multiprocessing.get_context('spawn'), initializer=django.setup,
+            )
+        return ThreadPoolExecutor(concurrency, thread_name_prefix='job')
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        name = f'{socket.gethostname()}:{os.getpid()}'
+        concurrency = options['concurrency']
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        self.stdout.write(f'Worker {name} running {concurrency} jobs at once on a {options["pool"]} pool')
+        # Future of each running job to the job's id.
+        running = {}
+        beat = time.monotonic()
+        with self._pool(options['pool'], concurrency) as pool:
+            while not self.stopping:
+                running = {future: job_id for future, job_id in running.items() if not future.done()}
+                if time.monotonic() - beat >= settings.JOB_HEARTBEAT_SECONDS:
+                    # Also requeue here, as a busy worker never reaches the idle branch.
+                    jobs.heartbeat(name, list(running.values()))
+                    jobs.requeue_expired()
+                    beat = time.monotonic()
+                claimed = jobs.claim(name, concurrency - len(running)) if len(running) < concurrency else []
+                running.update((pool.submit(jobs.execute_in_pool, job.id), job.id) for job in claimed)
+                if claimed:
+                    continue
+                if len(running) == concurrency or (options['burst'] and running):
+                    wait(running, timeout=settings.JOB_HEARTBEAT_SECONDS, return_when=FIRST_COMPLETED)
+                elif options['burst']:
+                    break
+                elif jobs.requeue_expired() == 0:
+                    jobs.wait_for_jobs(min(settings.JOB_POLL_SECONDS, settings.JOB_HEARTBEAT_SECONDS))
+        connection.close()
+        self.stdout.write(self.style.SUCCESS(f'Worker {name} stopped.'))
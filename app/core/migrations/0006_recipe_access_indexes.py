@@ -0,0 +1,48 @@
+# Generated by Django 3.2.25 on 2026-10-18 11:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_recipe_image'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', 'name'], name='ingredient_user_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['user', '-id'], name='recipe_user_id_desc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', 'name'], name='tag_user_name_idx'),
+        ),
+        # Replace the single-column FK indexes on the through tables with
+        # (related_id, recipe_id) so reverse lookups are index-only scans.
+        migrations.RunSQL(
+            [
+                'CREATE INDEX recipe_tags_tag_recipe_idx ON core_recipe_tags (tag_id, recipe_id);',
+                'DROP INDEX core_recipe_tags_tag_id_10c0ffea;',
+            ],
+            reverse_sql=[
+                'CREATE INDEX core_recipe_tags_tag_id_10c0ffea ON core_recipe_tags (tag_id);',
+                'DROP INDEX recipe_tags_tag_recipe_idx;',
+            ],
+        ),
+        migrations.RunSQL(
+            [
+                'CREATE INDEX recipe_ingredients_ingredient_recipe_idx '
+                'ON core_recipe_ingredients (ingredient_id, recipe_id);',
+                'DROP INDEX core_recipe_ingredients_ingredient_id_a8fec9ee;',
+            ],
+            reverse_sql=[
+                'CREATE INDEX core_recipe_ingredients_ingredient_id_a8fec9ee ON core_recipe_ingredients (ingredient_id);',
+                'DROP INDEX recipe_ingredients_ingredient_recipe_idx;',
+            ],
+        ),
+    ]
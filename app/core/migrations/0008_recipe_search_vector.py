@@ -0,0 +1,50 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:00
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_recipe_updated_at'),
+    ]
+
+    operations = [
+        # Filled in by the trigger below on every insert and on updates that
+        # touch the title or description.
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='recipe_search_vector_idx'),
+        ),
+        migrations.RunSQL(
+            [
+                """
+                CREATE FUNCTION core_recipe_search_vector_update() RETURNS trigger AS $$
+                BEGIN
+                    NEW.search_vector :=
+                        setweight(to_tsvector('english', coalesce(NEW.title, '')), 'A') ||
+                        setweight(to_tsvector('english', coalesce(NEW.description, '')), 'B');
+                    RETURN NEW;
+                END
+                $$ LANGUAGE plpgsql;
+                """,
+                """
+                CREATE TRIGGER core_recipe_search_vector_trigger
+                BEFORE INSERT OR UPDATE OF title, description ON core_recipe
+                FOR EACH ROW EXECUTE FUNCTION core_recipe_search_vector_update();
+                """,
+                'UPDATE core_recipe SET title = title;',
+            ],
+            reverse_sql=[
+                'DROP TRIGGER core_recipe_search_vector_trigger ON core_recipe;',
+                'DROP FUNCTION core_recipe_search_vector_update();',
+            ],
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:00
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_recipe_search_vector'),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        # Per user scoping comes from combining these with the (user, name)
+        # btree indexes in a bitmap AND, so btree_gin is not needed.
+        migrations.AddIndex(
+            model_name='tag',
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=['name'], name='tag_name_trgm_idx', opclasses=['gin_trgm_ops']
+            ),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=['name'], name='ingredient_name_trgm_idx', opclasses=['gin_trgm_ops']
+            ),
+        ),
+    ]
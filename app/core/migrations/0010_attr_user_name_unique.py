@@ -0,0 +1,54 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:46
+
+from django.db import migrations, models
+
+
+def merge_duplicates_sql(table, column):
+    """
+    Return the statements that move the recipes of duplicate names to the
+    oldest object with the name, then delete the duplicates
+    """
+    duplicates = (
+        f'SELECT id, min(id) OVER (PARTITION BY user_id, name) AS keep_id FROM core_{table}'
+    )
+    return [
+        f'INSERT INTO core_recipe_{table}s (recipe_id, {column}) '
+        f'SELECT link.recipe_id, duplicate.keep_id FROM core_recipe_{table}s link '
+        f'JOIN ({duplicates}) duplicate ON duplicate.id = link.{column} '
+        'WHERE duplicate.id <> duplicate.keep_id ON CONFLICT DO NOTHING;',
+        f'DELETE FROM core_recipe_{table}s WHERE {column} IN '
+        f'(SELECT id FROM ({duplicates}) duplicate WHERE id <> keep_id);',
+        f'DELETE FROM core_{table} WHERE id IN (SELECT id FROM ({duplicates}) duplicate WHERE id <> keep_id);',
+        # Run the deferred foreign key checks now, as ALTER TABLE refuses
+        # tables with pending trigger events.
+        'SET CONSTRAINTS ALL IMMEDIATE;',
+    ]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_attr_name_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL(merge_duplicates_sql('tag', 'tag_id'), reverse_sql=migrations.RunSQL.noop),
+        migrations.RunSQL(merge_duplicates_sql('ingredient', 'ingredient_id'), reverse_sql=migrations.RunSQL.noop),
+        # The unique constraints index (user, name), replacing the plain indexes.
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='ingredient_user_name_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(fields=('user', 'name'), name='tag_user_name_uniq'),
+        ),
+        migrations.RemoveIndex(
+            model_name='ingredient',
+            name='ingredient_user_name_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='tag',
+            name='tag_user_name_idx',
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 3.2.25 on 2026-10-18 12:56
+
+from django.db import migrations, models
+
+
+def count_links_sql(table, column):
+    """Return the statement that sets the recipe counts from the through table"""
+    return (
+        f'UPDATE core_{table} SET recipe_count = link.count FROM '
+        f'(SELECT {column}, count(*) AS count FROM core_recipe_{table}s GROUP BY {column}) link '
+        f'WHERE core_{table}.id = link.{column};'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_attr_user_name_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunSQL(count_links_sql('tag', 'tag_id'), reverse_sql=migrations.RunSQL.noop),
+        migrations.RunSQL(count_links_sql('ingredient', 'ingredient_id'), reverse_sql=migrations.RunSQL.noop),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', '-recipe_count', '-name'], name='ingredient_user_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', '-recipe_count', '-name'], name='tag_user_count_idx'),
+        ),
+    ]
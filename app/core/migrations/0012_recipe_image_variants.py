@@ -0,0 +1,23 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_attr_recipe_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_variants',
+            field=models.JSONField(default=dict, editable=False),
+        ),
+        # Keep rows inserted with SQL valid too.
+        migrations.RunSQL(
+            "ALTER TABLE core_recipe ALTER COLUMN image_variants SET DEFAULT '{}'::jsonb;",
+            reverse_sql='ALTER TABLE core_recipe ALTER COLUMN image_variants DROP DEFAULT;',
+        ),
+    ]
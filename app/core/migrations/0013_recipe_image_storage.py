@@ -0,0 +1,19 @@
+# Generated by Django 3.2.25 on 2026-10-18 13:45
+
+import core.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_recipe_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipe',
+            name='image',
+            field=models.ImageField(null=True, storage=core.models.recipe_image_storage, upload_to=core.models.recipe_image_file_path),
+        ),
+    ]
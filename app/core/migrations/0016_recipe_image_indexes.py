@@ -0,0 +1,24 @@
+# Generated by Django 3.2.25 on 2026-10-18 15:00
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_user_token_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['image'], name='recipe_image_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=['image_variants'], name='recipe_image_variants_idx', opclasses=['jsonb_path_ops']
+            ),
+        ),
+    ]
@@ -1,9 +1,13 @@
 import os
 import uuid
 
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
 from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
 
 
 def recipe_image_file_path(instance, filename):
@@ -13,6 +17,11 @@ def recipe_image_file_path(instance, filename):
     return os.path.join('uploads', 'recipe', filename)
 
 
+def recipe_image_storage():
+    """Return the storage for recipe images, set by RECIPE_IMAGE_STORAGE"""
+    return import_string(settings.RECIPE_IMAGE_STORAGE)()
+
+
 class UserManager(BaseUserManager):
     """Manager for user."""
 
@@ -40,6 +49,8 @@ class User(AbstractBaseUser, PermissionsMixin):
     name = models.CharField(max_length=255)
     is_active = models.BooleanField(default=True)
     is_staff = models.BooleanField(default=False)
+    # Signed tokens carry the version they were issued for, see core.tokens.
+    token_version = models.PositiveIntegerField(default=0, editable=False)
 
     objects = UserManager()
 
@@ -56,7 +67,21 @@ class Recipe(models.Model):
     link = models.CharField(max_length=255, blank=True)
     tags = models.ManyToManyField('Tag')
     ingredients = models.ManyToManyField('Ingredient')
-    image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    image = models.ImageField(null=True, upload_to=recipe_image_file_path, storage=recipe_image_storage)
+    # Variant name to storage name, filled in by recipe.images as each is ready.
+    image_variants = models.JSONField(default=dict, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+    # Maintained by a database trigger from title and description.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', '-id'], name='recipe_user_id_desc_idx'),
+            GinIndex(fields=['search_vector'], name='recipe_search_vector_idx'),
+            # Media requests find the recipe of a file by its name.
+            models.Index(fields=['image'], name='recipe_image_idx'),
+            GinIndex(fields=['image_variants'], name='recipe_image_variants_idx', opclasses=['jsonb_path_ops']),
+        ]
 
     def __str__(self):
         return self.title
@@ -66,6 +91,17 @@ class Tag(models.Model):
     """Tag for filtering recipes."""
     name = models.CharField(max_length=255)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    # Number of linked recipes, kept up to date by recipe.counts.
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'name'], name='tag_user_name_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-recipe_count', '-name'], name='tag_user_count_idx'),
+            GinIndex(fields=['name'], name='tag_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ]
 
     def __str__(self):
         return self.name
@@ -75,6 +111,55 @@ class Ingredient(models.Model):
     """Ingredient for recipe."""
     name = models.CharField(max_length=255)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    # Number of linked recipes, kept up to date by recipe.counts.
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'name'], name='ingredient_user_name_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-recipe_count', '-name'], name='ingredient_user_count_idx'),
+            GinIndex(fields=['name'], name='ingredient_name_trgm_idx', opclasses=['gin_trgm_ops']),
+        ]
 
     def __str__(self):
         return self.name
+
+
+class Job(models.Model):
+    """Background job, run by the run_worker command through core.jobs."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(QUEUED, 'Queued'), (RUNNING, 'Running'), (SUCCEEDED, 'Succeeded'), (FAILED, 'Failed')]
+
+    # Dotted path of a function decorated with core.jobs.task.
+    task = models.CharField(max_length=255)
+    kwargs = models.JSONField(default=dict)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.CASCADE)
+    # Higher priorities run first.
+    priority = models.SmallIntegerField(default=0)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=1)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    worker = models.CharField(max_length=255, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['-priority', 'run_at', 'id'], name='job_queued_idx', condition=models.Q(status='queued'),
+            ),
+            models.Index(fields=['locked_at'], name='job_running_idx', condition=models.Q(status='running')),
+            models.Index(fields=['user', '-id'], name='job_user_id_desc_idx'),
+        ]
+
+    def __str__(self):
+        return f'{self.task} ({self.status})'
@@ -0,0 +1,29 @@
+"""
+Signal handlers for the core app
+"""
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from core import authentication, tokens
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_deleted_token(sender, instance, **kwargs):
+    """Stop accepting a deleted token from the cache"""
+    authentication.invalidate(instance.key)
+
+
+@receiver(post_save, sender=get_user_model())
+def invalidate_saved_user(sender, instance, created, **kwargs):
+    """Drop the cached user of a changed user's tokens, which may have been deactivated or given a new password"""
+    if not created:
+        authentication.invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=get_user_model())
+def revoke_signed_tokens(sender, instance, created, raw=False, **kwargs):
+    """Revoke the signed tokens of a user given a new password or deactivated"""
+    if not created and not raw and (instance._password is not None or not instance.is_active):
+        tokens.revoke(instance)
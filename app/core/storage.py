@@ -0,0 +1,100 @@
+"""
+Content addressed file storage.
+
+Files are named by the SHA-256 of their content under a nested shard
+layout, e.g. uploads/recipe/ab/cd/abcd...ef.jpg, so identical uploads are
+stored once and no directory grows past a few hundred entries. Since a
+file may be shared by any number of references, delete() leaves it in
+place; unreferenced files are removed by a garbage collector with
+purge(). Saving a file that already exists refreshes its modification
+time, so a collector that skips recently modified files never removes a
+file that is about to be referenced.
+"""
+import hashlib
+import os
+import posixpath
+import re
+import uuid
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+TEMPORARY_NAME = re.compile(r'[0-9a-f]{64}(\.[a-z0-9]+)?\.[0-9a-f]{32}\.tmp')
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage that names files by content hash and dedupes them"""
+    shard_depth = 2
+    shard_width = 2
+
+    def _shards(self, hexdigest):
+        """Return the directories a file with a digest is stored under"""
+        return [hexdigest[i * self.shard_width:(i + 1) * self.shard_width] for i in range(self.shard_depth)]
+
+    def _base_directory(self, name):
+        """Return the directory of a name without its shard directories, if it has any"""
+        parts = name.split('/')[:-1]
+        shard = re.compile(f'[0-9a-f]{{{self.shard_width}}}')
+        if len(parts) >= self.shard_depth and all(shard.fullmatch(part) for part in parts[-self.shard_depth:]):
+            parts = parts[:-self.shard_depth]
+        return '/'.join(parts)
+
+    def is_content_name(self, name):
+        """Return whether a name is in the content addressed layout"""
+        parts = name.split('/')
+        digest, ext = posixpath.splitext(parts[-1])
+        return (
+            re.fullmatch(r'[0-9a-f]{64}', digest) is not None and re.fullmatch(r'(\.[a-z0-9]+)?', ext) is not None
+            and parts[-1 - self.shard_depth:-1] == self._shards(digest)
+        )
+
+    def content_name(self, name, content):
+        """Return the content addressed name of a file saved under a name"""
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        hexdigest = digest.hexdigest()
+        extension = posixpath.splitext(name)[1].lower()
+        return posixpath.join(self._base_directory(name), *self._shards(hexdigest), hexdigest + extension)
+
+    def save(self, name, content, max_length=None):
+        """Store a file under its content name unless an identical one is already stored"""
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.content_name(name, content)
+        try:
+            os.utime(self.path(name))
+            return name
+        except FileNotFoundError:
+            pass
+        # Write under a unique name first, so concurrent saves of the same
+        # content never expose a partly written file.
+        temporary = self._save(f'{name}.{uuid.uuid4().hex}.tmp', content)
+        os.replace(self.path(temporary), self.path(name))
+        return name
+
+    def delete(self, name):
+        """Leave the file in place, as other references may share it"""
+
+    def purge(self, name):
+        """Remove a file, whether or not anything still refers to it"""
+        super().delete(name)
+
+    def blobs(self, directory=''):
+        """
+        Yield the name, size and modification time of each content addressed
+        or leftover temporary file under a directory
+        """
+        root = self.path(directory)
+        for path, _, files in os.walk(root):
+            for filename in files:
+                name = posixpath.join(directory, *os.path.relpath(os.path.join(path, filename), root).split(os.sep))
+                if self.is_content_name(name) or TEMPORARY_NAME.fullmatch(filename):
+                    stat = os.stat(os.path.join(path, filename))
+                    yield name, stat.st_size, stat.st_mtime
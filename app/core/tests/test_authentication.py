@@ -0,0 +1,163 @@
+"""
+Tests for the cached token authentication
+"""
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient, APIRequestFactory
+
+from core import authentication, tokens
+
+ME_URL = reverse('user:me')
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """Test tokens are looked up once and revoked right away"""
+
+    def setUp(self):
+        authentication.local_cache.clear()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com', password='testpass123', name='Name',
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_lookup_cached(self):
+        """Test the token query only runs for the first request"""
+        self.client.get(ME_URL)
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['email'], 'user@example.com')
+
+    def test_shared_cache_used_by_other_processes(self):
+        """Test a process without a local entry uses the shared cache"""
+        self.client.get(ME_URL)
+        authentication.local_cache.clear()
+
+        with self.assertNumQueries(0):
+            res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['name'], 'Name')
+
+    def test_password_hash_not_cached(self):
+        """Test the cached user does not hold the password hash"""
+        self.client.get(ME_URL)
+
+        created, values = authentication.local_cache.get(authentication._digest(self.token.key))
+
+        self.assertNotIn(self.user.password, values)
+
+    def test_token_deleted(self):
+        """Test a deleted token is refused at once"""
+        self.client.get(ME_URL)
+
+        self.token.delete()
+
+        self.assertEqual(self.client.get(ME_URL).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_user_deactivated(self):
+        """Test the tokens of a deactivated user are refused at once"""
+        self.client.get(ME_URL)
+
+        self.user.is_active = False
+        self.user.save()
+
+        self.assertEqual(self.client.get(ME_URL).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change(self):
+        """Test a password change, through the API too, drops the cached user"""
+        self.client.get(ME_URL)
+
+        self.client.patch(ME_URL, {'password': 'newpass123', 'name': 'New'})
+        res = self.client.get(ME_URL)
+
+        self.assertEqual(res.data['name'], 'New')
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('newpass123'))
+        self.assertIsNone(authentication.local_cache.get(authentication._digest(self.token.key)))
+
+    def test_lookup_racing_revocation_not_cached(self):
+        """Test a user read before a revocation is not cached after it"""
+        original = authentication.TokenAuthentication.authenticate_credentials
+
+        def revoked_while_reading(auth, key):
+            result = original(auth, key)
+            authentication.invalidate(key)
+            return result
+
+        with patch.object(authentication.TokenAuthentication, 'authenticate_credentials', revoked_while_reading):
+            self.client.get(ME_URL)
+
+        self.assertIsNone(authentication.local_cache.get(authentication._digest(self.token.key)))
+
+    def test_invalid_token(self):
+        """Test an unknown token is refused"""
+        self.client.credentials(HTTP_AUTHORIZATION='Token unknown')
+
+        self.assertEqual(self.client.get(ME_URL).status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class LocalCacheTests(TestCase):
+    """Test the per-process LRU"""
+
+    def test_bounded_least_recently_used(self):
+        """Test the least recently used entry is dropped past the size"""
+        cache = authentication.LocalCache(2)
+        cache.set('a', 1, 60)
+        cache.set('b', 2, 60)
+        cache.get('a')
+
+        cache.set('c', 3, 60)
+
+        self.assertEqual((cache.get('a'), cache.get('b'), cache.get('c')), (1, None, 3))
+        self.assertEqual(len(cache), 2)
+
+    def test_expired(self):
+        """Test an entry is dropped once its time to live has passed"""
+        cache = authentication.LocalCache(2)
+        cache.set('a', 1, 0)
+
+        self.assertIsNone(cache.get('a'))
+
+
+class SignedTokenAuthenticationTests(TestCase):
+    """Test signed access tokens are verified without queries"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='testpass123')
+        self.access = tokens.issue(self.user)['access']
+
+    def test_no_queries(self):
+        """Test a valid token authenticates its user without any query"""
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {self.access}')
+
+        with self.assertNumQueries(0):
+            user, token = authentication.SignedTokenAuthentication().authenticate(request)
+
+        self.assertEqual((user.pk, token), (self.user.pk, self.access))
+
+    def test_other_scheme_ignored(self):
+        """Test opaque tokens are left to the other authentication classes"""
+        request = APIRequestFactory().get('/', HTTP_AUTHORIZATION='Token abc')
+
+        self.assertIsNone(authentication.SignedTokenAuthentication().authenticate(request))
+
+    def test_view_with_access_token(self):
+        """Test views accept access tokens and refuse refresh tokens"""
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access}')
+
+        res = client.get(ME_URL)
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {tokens.issue(self.user)["refresh"]}')
+        refused = client.get(ME_URL)
+
+        self.assertEqual(res.data['email'], 'user@example.com')
+        self.assertEqual(refused.status_code, status.HTTP_401_UNAUTHORIZED)
@@ -1,13 +1,21 @@
 """
 Test custom django management commands.
 """
+from datetime import timedelta
+from io import StringIO
 from unittest.mock import patch
 
 from psycopg2 import OperationalError as Psycopg2Error
 
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from core import jobs
+from core.models import Job
+from core.tests.test_jobs import add, outlive_lease, pause
 
 
 @patch('core.management.commands.wait_for_db.Command.check')
@@ -30,3 +38,53 @@ class CommandsTests(SimpleTestCase):
         call_command('wait_for_db')
         self.assertEqual(patched_check.call_count, 6)
         patched_check.assert_called_with(databases=['default'])
+
+
+class RunWorkerCommandTests(TransactionTestCase):
+    """Test the worker command"""
+
+    def test_burst_runs_due_jobs(self):
+        """Test a burst runs every due job on the pool and exits"""
+        queued = [jobs.enqueue(add, a=i, b=1) for i in range(5)]
+
+        call_command('run_worker', '--burst', '--concurrency', '2', stdout=StringIO())
+
+        self.assertEqual(
+            list(Job.objects.filter(id__in=[job.id for job in queued]).order_by('id').values_list('status', 'result')),
+            [(Job.SUCCEEDED, i + 1) for i in range(5)],
+        )
+
+    @override_settings(JOB_LEASE_SECONDS=1, JOB_HEARTBEAT_SECONDS=0.2)
+    def test_heartbeat_keeps_long_job(self):
+        """Test a job running longer than the lease is not run again while its worker is alive"""
+        job = jobs.enqueue(outlive_lease, seconds=2)
+
+        call_command('run_worker', '--burst', '--concurrency', '1', stdout=StringIO())
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result, job.attempts), (Job.SUCCEEDED, 0, 1))
+
+    @override_settings(JOB_LEASE_SECONDS=1, JOB_HEARTBEAT_SECONDS=0.2)
+    def test_busy_worker_requeues_expired(self):
+        """Test a worker that is never idle still requeues the jobs of a dead worker"""
+        orphan = jobs.enqueue(add, a=1, b=2)
+        jobs.claim('dead')
+        Job.objects.filter(id=orphan.id).update(locked_at=timezone.now() - timedelta(minutes=1))
+        jobs.enqueue(pause, seconds=1)
+
+        call_command('run_worker', '--burst', '--concurrency', '1', stdout=StringIO())
+
+        orphan.refresh_from_db()
+        self.assertEqual((orphan.status, orphan.result, orphan.attempts), (Job.SUCCEEDED, 3, 2))
+
+
+class BenchmarkAuthCommandTests(TestCase):
+    """Test the authentication benchmark"""
+
+    def test_benchmark_auth(self):
+        """Test the benchmark reports a timing per authentication class and removes its user"""
+        out = StringIO()
+        call_command('benchmark_auth', repeat=2, stdout=out)
+
+        self.assertEqual(len(out.getvalue().splitlines()), 5)
+        self.assertFalse(get_user_model().objects.filter(email='benchmark-auth@example.com').exists())
@@ -0,0 +1,143 @@
+"""
+Tests for the background job queue
+"""
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from core import jobs
+from core.models import Job
+
+
+@jobs.task
+def add(a, b):
+    """Return the sum of two numbers"""
+    return a + b
+
+
+@jobs.task(priority=5, max_attempts=2)
+def fail():
+    """Fail every time"""
+    raise ValueError('Boom.')
+
+
+@jobs.task
+def outlive_lease(seconds):
+    """Run for longer than the lease, then requeue expired jobs as another worker would"""
+    time.sleep(seconds)
+    return jobs.requeue_expired()
+
+
+@jobs.task
+def pause(seconds):
+    """Keep a worker busy for a while"""
+    time.sleep(seconds)
+
+
+def not_a_task():
+    """Plain function that must not be run by name"""
+
+
+class JobQueueTests(TestCase):
+    """Test queueing, claiming and running jobs"""
+
+    def test_enqueue_defaults(self):
+        """Test a job takes the priority and attempts of its task"""
+        user = get_user_model().objects.create_user(email='user@example.com', password='testpass123')
+
+        job = jobs.enqueue(fail, user_id=user.id)
+        other = jobs.enqueue(add, a=1, b=2)
+
+        self.assertEqual(job.task, 'core.tests.test_jobs.fail')
+        self.assertEqual((job.priority, job.max_attempts, job.user), (5, 2, user))
+        self.assertEqual((other.kwargs, other.priority, other.max_attempts), ({'a': 1, 'b': 2}, 0, 5))
+
+    def test_claim_order(self):
+        """Test jobs are claimed by priority then due time, skipping those not due yet"""
+        later = jobs.enqueue(add, a=1, b=1)
+        urgent = jobs.enqueue(add, priority=9, a=1, b=2)
+        jobs.enqueue(add, priority=20, delay=timedelta(hours=1), a=1, b=3)
+
+        claimed = jobs.claim('worker', limit=5)
+
+        self.assertEqual([job.id for job in claimed], [urgent.id, later.id])
+        self.assertEqual({(job.status, job.worker, job.attempts) for job in claimed}, {(Job.RUNNING, 'worker', 1)})
+        self.assertEqual(jobs.claim('other'), [])
+
+    def test_success_records_result(self):
+        """Test a job that returns records its result"""
+        job = jobs.enqueue(add, a=2, b=3)
+
+        self.assertEqual(jobs.run_pending(), 1)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result, job.locked_at), (Job.SUCCEEDED, 5, None))
+        self.assertIsNotNone(job.finished_at)
+
+    @override_settings(JOB_RETRY_DELAY=60)
+    def test_failure_retried_with_backoff(self):
+        """Test a failed job is queued again for later, then fails once out of attempts"""
+        job = jobs.enqueue(fail)
+
+        with self.assertLogs('core.jobs', 'ERROR'):
+            jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.error), (Job.QUEUED, 1, 'ValueError: Boom.'))
+        self.assertGreater(job.run_at, timezone.now() + timedelta(seconds=29))
+
+        Job.objects.filter(id=job.id).update(run_at=timezone.now())
+        with self.assertLogs('core.jobs', 'ERROR'):
+            jobs.run_pending()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+
+    @override_settings(JOB_RETRY_DELAY=10, JOB_MAX_RETRY_DELAY=60)
+    def test_retry_delay(self):
+        """Test retries wait twice as long each time up to the maximum"""
+        self.assertLessEqual(jobs.retry_delay(1), timedelta(seconds=10))
+        self.assertGreaterEqual(jobs.retry_delay(3), timedelta(seconds=20))
+        self.assertLessEqual(jobs.retry_delay(10), timedelta(seconds=60))
+
+    def test_only_tasks_run(self):
+        """Test a job naming a function that is not a task fails"""
+        job = Job.objects.create(task='core.tests.test_jobs.not_a_task', max_attempts=1)
+
+        with self.assertLogs('core.jobs', 'ERROR'):
+            jobs.run_pending()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.FAILED)
+
+    @override_settings(JOB_LEASE_SECONDS=60)
+    def test_expired_lease(self):
+        """Test a job held past its lease is queued again and its old worker's result is ignored"""
+        job = jobs.enqueue(add, a=1, b=2)
+        jobs.claim('crashed')
+        Job.objects.filter(id=job.id).update(locked_at=timezone.now() - timedelta(minutes=2))
+
+        self.assertEqual(jobs.requeue_expired(), 1)
+        reclaimed = jobs.claim('worker')[0]
+        stale = Job.objects.get(id=job.id)
+        stale.worker, stale.attempts = 'crashed', 1
+        jobs._finish(stale, status=Job.FAILED)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker, job.attempts), (Job.RUNNING, 'worker', 2))
+        self.assertEqual(reclaimed.id, job.id)
+
+    @override_settings(JOB_LEASE_SECONDS=60)
+    def test_heartbeat_renews_lease(self):
+        """Test a heartbeat keeps the worker's own running jobs from expiring"""
+        job = jobs.enqueue(add, a=1, b=2)
+        other = jobs.enqueue(add, a=3, b=4)
+        jobs.claim('worker')
+        jobs.claim('other')
+        Job.objects.update(locked_at=timezone.now() - timedelta(minutes=2))
+
+        self.assertEqual(jobs.heartbeat('worker', [job.id, other.id]), 1)
+        self.assertEqual(jobs.requeue_expired(), 1)
+        self.assertEqual(Job.objects.get(id=job.id).status, Job.RUNNING)
+        self.assertEqual(Job.objects.get(id=other.id).status, Job.QUEUED)
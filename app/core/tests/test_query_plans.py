@@ -0,0 +1,146 @@
+"""
+Test the hot recipe API queries are served from indexes.
+"""
+import random
+import re
+import string
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+from recipe import counts
+
+POWER_USER_RECIPES = 5000
+POWER_USER_ATTRS = 500
+# Autocomplete is meant for users with thousands of ingredients.
+POWER_USER_PANTRY = 10000
+OTHER_USERS = 40
+OTHER_USER_RECIPES = 100
+OTHER_USER_ATTRS = 20
+
+RECIPE_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+INGREDIENTS_URL = reverse('recipe:ingredient-list')
+INGREDIENTS_AUTOCOMPLETE_URL = reverse('recipe:ingredient-autocomplete')
+IMAGE_NAME = 'uploads/recipe/{i}.jpg'
+
+
+class QueryPlanTests(TestCase):
+    """Run EXPLAIN on the list endpoint queries over a seeded dataset"""
+
+    @classmethod
+    def _seed_user(cls, email, recipe_count, attr_count):
+        """Create a user with recipes that each have one tag and one ingredient"""
+        user = get_user_model().objects.create(email=email)
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                user=user, title=f'Recipe {i}', time_minutes=10, price=Decimal('5.00'),
+                image=IMAGE_NAME.format(i=f'{email}-{i}'),
+                image_variants={'thumbnail': IMAGE_NAME.format(i=f'{email}-{i}_thumbnail')},
+            )
+            for i in range(recipe_count)
+        )
+        tags = Tag.objects.bulk_create(Tag(user=user, name=f'Tag {i}') for i in range(attr_count))
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(user=user, name=f'Ingredient {i}') for i in range(attr_count)
+        )
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe=recipe, tag=tags[i % attr_count]) for i, recipe in enumerate(recipes)
+        )
+        Recipe.ingredients.through.objects.bulk_create(
+            Recipe.ingredients.through(recipe=recipe, ingredient=ingredients[i % attr_count])
+            for i, recipe in enumerate(recipes)
+        )
+        return user, tags
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.tags = cls._seed_user('power@example.com', POWER_USER_RECIPES, POWER_USER_ATTRS)
+        for i in range(OTHER_USERS):
+            cls._seed_user(f'user{i}@example.com', OTHER_USER_RECIPES, OTHER_USER_ATTRS)
+        rng = random.Random(0)
+        Ingredient.objects.bulk_create(
+            Ingredient(user=cls.user, name=''.join(rng.choices(string.ascii_lowercase, k=8)))
+            for i in range(POWER_USER_PANTRY)
+        )
+        for field_name in ('tags', 'ingredients'):
+            counts.repair(Recipe._meta.get_field(field_name))
+        with connection.cursor() as cursor:
+            # GIN indexes only get the statistics the planner costs them with
+            # when built or vacuumed, and VACUUM cannot run in a transaction.
+            cursor.execute('REINDEX INDEX ingredient_name_trgm_idx')
+            cursor.execute('REINDEX INDEX recipe_image_variants_idx')
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _explain_first_query(self, url, table, params=None):
+        """Return the query plan of the first SELECT from a table run by a request"""
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(url, params)
+        with connection.cursor() as cursor:
+            sql = next(
+                query['sql'] for query in ctx.captured_queries
+                if query['sql'].startswith('SELECT') and f'FROM "{table}"' in query['sql']
+            )
+            cursor.execute(f'EXPLAIN {sql}')
+            return '\n'.join(row[0] for row in cursor.fetchall())
+
+    def assertIndexedPlan(self, plan):
+        """Assert a plan neither scans a whole table nor sorts"""
+        self.assertNotIn('Seq Scan', plan)
+        self.assertIsNone(re.search(r'\bSort\b', plan), plan)
+
+    def test_recipe_list_plan(self):
+        """Test listing recipes is an index scan in id order"""
+        self.assertIndexedPlan(self._explain_first_query(RECIPE_URL, 'core_recipe'))
+
+    def test_recipe_next_page_plan(self):
+        """Test following a recipe cursor is an index scan in id order"""
+        res = self.client.get(RECIPE_URL, {'page_size': 10})
+
+        self.assertIndexedPlan(self._explain_first_query(res.data['next'], 'core_recipe'))
+
+    def test_recipe_filter_plan(self):
+        """Test filtering recipes by tag probes the reverse through index"""
+        tag_ids = ','.join(str(tag.id) for tag in self.tags[:3])
+        plan = self._explain_first_query(RECIPE_URL, 'core_recipe', {'tags': tag_ids})
+
+        self.assertNotIn('Seq Scan', plan)
+        self.assertIn('recipe_tags_tag_recipe_idx', plan)
+
+    def test_tag_list_plan(self):
+        """Test listing tags is an index scan in name order"""
+        self.assertIndexedPlan(self._explain_first_query(TAGS_URL, 'core_tag'))
+
+    def test_tag_list_by_count_plan(self):
+        """Test listing the most used tags first is an index scan in count order"""
+        self.assertIndexedPlan(self._explain_first_query(TAGS_URL, 'core_tag', {'ordering': '-recipe_count'}))
+
+    def test_ingredient_list_plan(self):
+        """Test listing ingredients is an index scan in name order"""
+        self.assertIndexedPlan(self._explain_first_query(INGREDIENTS_URL, 'core_ingredient'))
+
+    def test_ingredient_autocomplete_plan(self):
+        """Test autocomplete probes the trigram index on names"""
+        plan = self._explain_first_query(INGREDIENTS_AUTOCOMPLETE_URL, 'core_ingredient', {'q': 'ingred'})
+
+        self.assertNotIn('Seq Scan', plan)
+        self.assertIn('ingredient_name_trgm_idx', plan, plan)
+
+    def test_media_plan(self):
+        """Test finding the recipe of an image or variant probes the image indexes"""
+        name = IMAGE_NAME.format(i='power@example.com-42_thumbnail')
+        plan = self._explain_first_query(reverse('media', args=[name]), 'core_recipe')
+
+        self.assertNotIn('Seq Scan', plan)
+        self.assertIn('recipe_image_idx', plan)
+        self.assertIn('recipe_image_variants_idx', plan)
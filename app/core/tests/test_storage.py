@@ -0,0 +1,81 @@
+"""
+Tests for the content addressed storage
+"""
+import hashlib
+import os
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase
+
+from core.storage import ContentAddressedStorage
+
+
+class ContentAddressedStorageTests(SimpleTestCase):
+    """Test files are named by content and shared"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.storage = ContentAddressedStorage(location=self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_sharded_content_name(self):
+        """Test a file is named by its hash under two levels of shards"""
+        digest = hashlib.sha256(b'image').hexdigest()
+
+        name = self.storage.save('uploads/recipe/random.JPG', ContentFile(b'image'))
+
+        self.assertEqual(name, f'uploads/recipe/{digest[:2]}/{digest[2:4]}/{digest}.jpg')
+        self.assertTrue(self.storage.is_content_name(name))
+        with self.storage.open(name) as stored:
+            self.assertEqual(stored.read(), b'image')
+
+    def test_identical_content_stored_once(self):
+        """Test saving identical content twice returns the same name"""
+        first = self.storage.save('uploads/recipe/a.jpg', ContentFile(b'image'))
+        second = self.storage.save('uploads/recipe/b.jpg', ContentFile(b'image'))
+        other = self.storage.save('uploads/recipe/c.jpg', ContentFile(b'other'))
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertEqual(len(list(self.storage.blobs())), 2)
+
+    def test_saving_again_refreshes_modified_time(self):
+        """Test reusing a stored file marks it as recently used"""
+        name = self.storage.save('uploads/recipe/a.jpg', ContentFile(b'image'))
+        os.utime(self.storage.path(name), (0, 0))
+
+        self.storage.save('uploads/recipe/b.jpg', ContentFile(b'image'))
+
+        self.assertGreater(os.path.getmtime(self.storage.path(name)), 0)
+
+    def test_name_derived_from_content_name(self):
+        """Test a name based on a stored file stays in the same base directory"""
+        name = self.storage.save('uploads/recipe/a.jpg', ContentFile(b'image'))
+
+        variant = self.storage.save(name.replace('.jpg', '_thumbnail.webp'), ContentFile(b'small'))
+
+        self.assertTrue(variant.startswith('uploads/recipe/'))
+        self.assertTrue(variant.endswith('.webp'))
+        self.assertEqual(variant.count('/'), 4)
+
+    def test_delete_keeps_file_and_purge_removes_it(self):
+        """Test delete leaves shared files in place for the garbage collector"""
+        name = self.storage.save('uploads/recipe/a.jpg', ContentFile(b'image'))
+
+        self.storage.delete(name)
+        self.assertTrue(self.storage.exists(name))
+        self.storage.purge(name)
+
+        self.assertFalse(self.storage.exists(name))
+
+    def test_blobs_skip_other_files(self):
+        """Test only content addressed and leftover temporary files are listed"""
+        name = self.storage.save('uploads/recipe/a.jpg', ContentFile(b'image'))
+        temporary = f'{name}.{"0" * 32}.tmp'
+        self.storage._save(temporary, ContentFile(b'ima'))
+        self.storage._save('uploads/recipe/legacy.jpg', ContentFile(b'legacy'))
+
+        self.assertEqual(sorted(blob[0] for blob in self.storage.blobs()), [name, temporary])
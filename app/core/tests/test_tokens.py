@@ -0,0 +1,73 @@
+"""
+Tests for the signed access and refresh tokens
+"""
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+
+from core import tokens
+
+
+class SignedTokenTests(TestCase):
+    """Test signing, verifying and revoking tokens"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='testpass123')
+
+    def test_round_trip(self):
+        """Test a token gives back the user id and version it was signed for"""
+        token = tokens.sign(tokens.ACCESS, 42, 3, 60)
+
+        self.assertEqual(tokens.verify(tokens.ACCESS, token), (42, 3))
+
+    def test_invalid_tokens(self):
+        """Test tampered, malformed and other kinds of tokens are refused"""
+        token = tokens.sign(tokens.ACCESS, 42, 3, 60)
+        forged = token.replace('42.', '43.', 1)
+
+        for kind, value in ((tokens.ACCESS, forged), (tokens.ACCESS, 'garbage'), (tokens.REFRESH, token)):
+            with self.assertRaises(tokens.InvalidToken):
+                tokens.verify(kind, value)
+
+    def test_expired(self):
+        """Test a token is refused once it expires"""
+        token = tokens.sign(tokens.ACCESS, 42, 3, 60)
+
+        with patch('time.time', return_value=10 ** 10), self.assertRaises(tokens.InvalidToken):
+            tokens.verify(tokens.ACCESS, token)
+
+    @override_settings(AUTH_ACCESS_TOKEN_LIFETIME=30)
+    def test_refresh(self):
+        """Test a refresh token is exchanged for new tokens until the user revokes them"""
+        issued = tokens.issue(self.user)
+
+        refreshed = tokens.refresh(issued['refresh'])
+        tokens.revoke(self.user)
+
+        self.assertEqual(refreshed['expires_in'], 30)
+        self.assertEqual(tokens.verify(tokens.ACCESS, refreshed['access']), (self.user.id, 0))
+        with self.assertRaises(tokens.InvalidToken):
+            tokens.refresh(refreshed['refresh'])
+
+    def test_password_change_and_deactivation_revoke(self):
+        """Test a new password or deactivation revokes the refresh tokens"""
+        for change in ('password', 'deactivate'):
+            refresh = tokens.issue(self.user)['refresh']
+            if change == 'password':
+                self.user.set_password('newpass123')
+            else:
+                self.user.is_active = False
+            self.user.save()
+
+            with self.assertRaises(tokens.InvalidToken):
+                tokens.refresh(refresh)
+            self.user.refresh_from_db()
+
+    def test_profile_change_keeps_tokens(self):
+        """Test saving a user otherwise leaves the tokens valid"""
+        refresh = tokens.issue(self.user)['refresh']
+        self.user.name = 'New'
+        self.user.save()
+
+        self.assertIn('access', tokens.refresh(refresh))
@@ -0,0 +1,68 @@
+"""
+Stateless signed access and refresh tokens.
+
+A token is "<user id>.<token version>.<expiry>" signed with an HMAC-SHA256
+keyed by SECRET_KEY, with a different salt for each kind so a refresh
+token is never accepted as an access token. Access tokens are verified
+without touching the database, so they are short lived. Refresh tokens
+are checked against the user's current token_version, and bumping the
+version revokes every token issued before. Outstanding access tokens
+still work until they expire, AUTH_ACCESS_TOKEN_LIFETIME at most.
+"""
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core import signing
+from django.db.models import F
+
+ACCESS = 'access'
+REFRESH = 'refresh'
+
+
+class InvalidToken(Exception):
+    """The token is malformed, forged, of the wrong kind or expired"""
+
+
+def _signer(kind):
+    """Return the signer of a kind of token"""
+    return signing.Signer(salt=f'core.tokens.{kind}', algorithm='sha256')
+
+
+def sign(kind, user_id, version, lifetime):
+    """Return a signed token of a kind for a user, expiring after lifetime seconds"""
+    return _signer(kind).sign(f'{user_id}.{version}.{int(time.time()) + lifetime}')
+
+
+def verify(kind, token):
+    """Return the user id and token version of a token, raising InvalidToken unless it is valid"""
+    try:
+        user_id, version, expires = map(int, _signer(kind).unsign(token).split('.'))
+    except (signing.BadSignature, ValueError):
+        raise InvalidToken
+    if expires <= time.time():
+        raise InvalidToken
+    return user_id, version
+
+
+def issue(user):
+    """Return a new access and refresh token for a user"""
+    return {
+        'access': sign(ACCESS, user.pk, user.token_version, settings.AUTH_ACCESS_TOKEN_LIFETIME),
+        'refresh': sign(REFRESH, user.pk, user.token_version, settings.AUTH_REFRESH_TOKEN_LIFETIME),
+        'expires_in': settings.AUTH_ACCESS_TOKEN_LIFETIME,
+    }
+
+
+def refresh(token):
+    """Return new tokens for a refresh token whose user is active and has not revoked it"""
+    user_id, version = verify(REFRESH, token)
+    user = get_user_model().objects.filter(pk=user_id, token_version=version, is_active=True).first()
+    if user is None:
+        raise InvalidToken
+    return issue(user)
+
+
+def revoke(user):
+    """Invalidate every signed token issued to a user so far"""
+    get_user_model().objects.filter(pk=user.pk).update(token_version=F('token_version') + 1)
@@ -0,0 +1,16 @@
+"""Serializers for the job API View"""
+from rest_framework import serializers
+
+from core.models import Job
+
+
+class JobSerializer(serializers.ModelSerializer):
+    """Serializer for the status of a background job"""
+
+    class Meta:
+        model = Job
+        fields = [
+            'id', 'task', 'status', 'priority', 'attempts', 'max_attempts', 'run_at', 'created_at', 'finished_at',
+            'result', 'error',
+        ]
+        read_only_fields = fields
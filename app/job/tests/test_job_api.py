@@ -0,0 +1,60 @@
+"""
+Tests for the job API
+"""
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Job
+
+JOBS_URL = reverse('job:job-list')
+
+
+def detail_url(job_id):
+    """Create and return a job detail URL"""
+    return reverse('job:job-detail', args=[job_id])
+
+
+class PublicJobApiTests(TestCase):
+    """Test unauthenticated API requests"""
+
+    def test_auth_required(self):
+        """Test auth is required to view jobs"""
+        res = APIClient().get(JOBS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class PrivateJobApiTests(TestCase):
+    """Test authenticated API requests"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='testpass123')
+        self.client.force_authenticate(self.user)
+
+    def test_list_own_jobs(self):
+        """Test only the user's jobs are listed, newest first and filtered by status"""
+        other = get_user_model().objects.create_user(email='other@example.com', password='testpass123')
+        done = Job.objects.create(task='a', user=self.user, status=Job.SUCCEEDED, result={'rows': 3})
+        queued = Job.objects.create(task='b', user=self.user)
+        Job.objects.create(task='c', user=other)
+
+        res = self.client.get(JOBS_URL)
+        filtered = self.client.get(JOBS_URL, {'status': Job.SUCCEEDED})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([job['id'] for job in res.data['results']], [queued.id, done.id])
+        self.assertEqual([job['result'] for job in filtered.data['results']], [{'rows': 3}])
+
+    def test_retrieve_job(self):
+        """Test a job's status can be retrieved by its owner only"""
+        job = Job.objects.create(task='a', user=self.user, status=Job.FAILED, error='ValueError: Boom.')
+        other = Job.objects.create(task='b')
+
+        res = self.client.get(detail_url(job.id))
+
+        self.assertEqual((res.data['status'], res.data['error']), (Job.FAILED, 'ValueError: Boom.'))
+        self.assertEqual(self.client.get(detail_url(other.id)).status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,39 @@
+"""Views for the job API"""
+from drf_spectacular.utils import extend_schema_view, extend_schema, OpenApiParameter, OpenApiTypes
+from rest_framework import permissions, viewsets
+from rest_framework.pagination import CursorPagination
+
+from core.authentication import CachedTokenAuthentication, SignedTokenAuthentication
+from core.models import Job
+from job.serializers import JobSerializer
+
+
+class JobCursorPagination(CursorPagination):
+    """Page through jobs newest first"""
+    ordering = '-id'
+    page_size = 50
+
+
+@extend_schema_view(
+    list=extend_schema(
+        parameters=[
+            OpenApiParameter('status', OpenApiTypes.STR, enum=[status for status, _ in Job.STATUS_CHOICES],
+                             description='Only list jobs with this status'),
+        ]
+    )
+)
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    """View the status of the authenticated user's background jobs"""
+    serializer_class = JobSerializer
+    queryset = Job.objects.all()
+    authentication_classes = [CachedTokenAuthentication, SignedTokenAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+    pagination_class = JobCursorPagination
+
+    def get_queryset(self):
+        """Retrieve the jobs of the authenticated user"""
+        queryset = self.queryset.filter(user=self.request.user)
+        status = self.request.query_params.get('status')
+        if status:
+            queryset = queryset.filter(status=status)
+        return queryset
@@ -0,0 +1,196 @@
+"""
+Batch writes on the recipe endpoint.
+
+Items are validated one by one with the same serializer as single
+writes, then written together in one transaction with the set-based
+functions of recipe.bulk. In atomic mode nothing is written unless every
+item can be, in best effort mode the valid items are written and the
+others reported. Either way the response has a result per item.
+"""
+from django.db import transaction
+from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiTypes
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+
+from core.models import Recipe
+from recipe import bulk, cache
+from recipe.fastpath import RowValidator
+
+MODES = ('atomic', 'best_effort')
+MODE_PARAMETER = OpenApiParameter(
+    'mode',
+    OpenApiTypes.STR, enum=list(MODES),
+    description='Write nothing if an item fails (atomic, default) or write the valid items (best_effort)'
+)
+
+
+def _failure(index, code, errors, pk=None):
+    """Return the result of an item that was not written"""
+    result = {'index': index, 'status': code, 'errors': errors}
+    if pk is not None:
+        result['id'] = pk
+    return result
+
+
+class BatchMixin:
+    """
+    Accept a list on create and add batch PATCH and DELETE on the list route
+    """
+    batch_serializer_class = None
+    max_batch_size = 500
+
+    def get_batch_mode(self):
+        """Return the mode query param"""
+        mode = self.request.query_params.get('mode', 'atomic')
+        if mode not in MODES:
+            raise ValidationError({'detail': f'mode must be one of {", ".join(MODES)}.'})
+        return mode
+
+    def _check_batch_size(self, items):
+        """Refuse empty and oversized batches"""
+        if not items:
+            raise ValidationError({'detail': 'Expected at least one item.'})
+        if len(items) > self.max_batch_size:
+            raise ValidationError({'detail': f'Expected at most {self.max_batch_size} items.'})
+
+    def _validate_items(self, items, results, partial=False):
+        """
+        Return the index and validated data of the valid items without a
+        result yet, recording the errors of the others in results
+        """
+        serializer = self.batch_serializer_class(partial=partial, context=self.get_serializer_context())
+        validator = RowValidator.for_serializer(serializer)
+        valid = []
+        for index, data in enumerate(items):
+            if results[index] is not None:
+                continue
+            validated = validator.validate(data) if validator else None
+            if validated is None:
+                try:
+                    validated = serializer.run_validation(data)
+                except ValidationError as exc:
+                    results[index] = _failure(index, status.HTTP_400_BAD_REQUEST, exc.detail)
+                    continue
+            valid.append((index, validated))
+        return valid
+
+    def _lock_recipes(self, ids):
+        """Return the user's recipes with the given IDs by ID, locked for the transaction"""
+        recipes = Recipe.objects.filter(user=self.request.user, id__in=ids).defer('search_vector')
+        return {recipe.id: recipe for recipe in recipes.select_for_update()}
+
+    def _reject(self, results, mode):
+        """
+        Return the error response of an atomic batch with a failed item, after
+        marking the items that would otherwise have been written, or None
+        """
+        if mode == 'atomic' and any(result is not None for result in results):
+            for index, result in enumerate(results):
+                if result is None:
+                    results[index] = _failure(index, status.HTTP_424_FAILED_DEPENDENCY,
+                                              {'detail': ['Not written because another item failed.']})
+            return Response({'results': results}, status=status.HTTP_400_BAD_REQUEST)
+        return None
+
+    def _response(self, results, success_status, written):
+        """Return the per item results once the valid items are written"""
+        if written:
+            # Bulk writes send no signals, so invalidate the cached lists here.
+            cache.bump_generation(self.request.user.id)
+        failed = any(result['status'] >= 400 for result in results)
+        return Response({'results': results}, status=status.HTTP_207_MULTI_STATUS if failed else success_status)
+
+    def create(self, request, *args, **kwargs):
+        """Create a recipe, or every recipe of a list"""
+        if not isinstance(request.data, list):
+            return super().create(request, *args, **kwargs)
+        mode = self.get_batch_mode()
+        items = request.data
+        self._check_batch_size(items)
+        results = [None] * len(items)
+        valid = self._validate_items(items, results)
+        rejected = self._reject(results, mode)
+        if rejected is not None:
+            return rejected
+
+        with transaction.atomic():
+            recipes = bulk.create_recipes(request.user, [data for _, data in valid])
+        for (index, _), recipe in zip(valid, recipes):
+            results[index] = {'index': index, 'status': status.HTTP_201_CREATED, 'id': recipe.id}
+        return self._response(results, status.HTTP_201_CREATED, bool(recipes))
+
+    @extend_schema(parameters=[MODE_PARAMETER], request=OpenApiTypes.OBJECT, responses={200: OpenApiTypes.OBJECT})
+    @action(methods=['patch'], detail=False, url_path='batch', url_name='batch')
+    def batch_update(self, request):
+        """Apply a list of partial updates, each identified by its id"""
+        mode = self.get_batch_mode()
+        items = request.data
+        if not isinstance(items, list):
+            raise ValidationError({'detail': 'Expected a list of items.'})
+        self._check_batch_size(items)
+        results = [None] * len(items)
+        ids = {}
+        seen = set()
+        for index, data in enumerate(items):
+            pk = data.get('id') if isinstance(data, dict) else None
+            if type(pk) is not int:
+                results[index] = _failure(index, status.HTTP_400_BAD_REQUEST, {'id': ['A valid integer is required.']})
+            elif pk in seen:
+                results[index] = _failure(index, status.HTTP_400_BAD_REQUEST, {'id': ['Duplicate id in batch.']}, pk)
+            else:
+                ids[index] = pk
+                seen.add(pk)
+        valid = self._validate_items(items, results, partial=True)
+
+        with transaction.atomic():
+            recipes = self._lock_recipes([ids[index] for index, _ in valid])
+            for index, _ in valid:
+                if ids[index] not in recipes:
+                    results[index] = _failure(index, status.HTTP_404_NOT_FOUND, {'detail': ['Not found.']}, ids[index])
+            rejected = self._reject(results, mode)
+            if rejected is not None:
+                return rejected
+            valid = [(index, data) for index, data in valid if ids[index] in recipes]
+            bulk.update_recipes(request.user, [recipes[ids[index]] for index, _ in valid],
+                                [data for _, data in valid])
+        for index, _ in valid:
+            results[index] = {'index': index, 'status': status.HTTP_200_OK, 'id': ids[index]}
+        return self._response(results, status.HTTP_200_OK, bool(valid))
+
+    @extend_schema(
+        parameters=[
+            MODE_PARAMETER,
+            OpenApiParameter('ids', OpenApiTypes.STR, description='Comma separated list of recipe IDs to delete'),
+        ],
+        responses={200: OpenApiTypes.OBJECT},
+    )
+    @batch_update.mapping.delete
+    def batch_destroy(self, request):
+        """Delete the recipes in the ids query param"""
+        mode = self.get_batch_mode()
+        ids = []
+        for value in filter(None, request.query_params.get('ids', '').split(',')):
+            try:
+                pk = int(value)
+            except ValueError:
+                raise ValidationError({'detail': f'Expected a comma separated list of IDs, got {value!r}.'})
+            if pk not in ids:
+                ids.append(pk)
+        self._check_batch_size(ids)
+        results = [None] * len(ids)
+
+        with transaction.atomic():
+            recipes = self._lock_recipes(ids)
+            for index, pk in enumerate(ids):
+                if pk not in recipes:
+                    results[index] = _failure(index, status.HTTP_404_NOT_FOUND, {'detail': ['Not found.']}, pk)
+            rejected = self._reject(results, mode)
+            if rejected is not None:
+                return rejected
+            bulk.delete_recipes(request.user, list(recipes))
+        for index, pk in enumerate(ids):
+            if pk in recipes:
+                results[index] = {'index': index, 'status': status.HTTP_204_NO_CONTENT, 'id': pk}
+        return self._response(results, status.HTTP_200_OK, bool(recipes))
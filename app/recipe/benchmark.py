@@ -0,0 +1,126 @@
+"""
+Helpers for the recipe benchmark commands
+"""
+import random
+import statistics
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from core.models import Recipe, Tag, Ingredient
+from recipe import bulk, counts
+from recipe.fastpath import RowSerializer
+
+WORDS = (
+    'apple banana basil bean beef bread broccoli butter cabbage carrot cheese chicken chili chocolate '
+    'cinnamon coconut corn cream cucumber curry egg fennel fish garlic ginger honey kale lamb leek lemon '
+    'lentil lime mango mint mushroom noodle oat olive onion orange paprika pasta pea peach pear pepper '
+    'pork potato prawn pumpkin radish rice salmon sausage spinach squash steak sugar thyme tofu tomato '
+    'tuna turkey vanilla walnut yogurt zucchini baked braised creamy crispy fried grilled roasted smoked '
+    'spicy steamed stewed sweet tangy quick easy classic rustic summer winter weeknight'
+).split()
+NEEDLE = 'saffron'
+
+
+def seed_user(email):
+    """Return a fresh benchmark user, removing any left over from an earlier run"""
+    for user in get_user_model().objects.filter(email=email):
+        drop_user(user)
+    return get_user_model().objects.create_user(email=email, password=None)
+
+
+def drop_user(user):
+    """Delete a benchmark user without adjusting the counts of tags and ingredients deleted with it"""
+    with counts.adjusted_in_bulk():
+        user.delete()
+
+
+def seed_recipes(user, count, start=0, batch_size=5000, needles=0):
+    """
+    Bulk create recipes with random titles and descriptions; the first
+    `needles` of them mention a word that appears nowhere else
+    """
+    rng = random.Random(start)
+    for offset in range(start, start + count, batch_size):
+        recipes = []
+        for i in range(offset, min(offset + batch_size, start + count)):
+            title = ' '.join(rng.choices(WORDS, k=3))
+            if i - start < needles:
+                title = f'{title} {NEEDLE}'
+            recipes.append(Recipe(
+                user=user,
+                title=title.capitalize(),
+                description=' '.join(rng.choices(WORDS, k=12)),
+                time_minutes=rng.randint(5, 180),
+                price=Decimal(rng.randint(100, 9999)) / 100,
+            ))
+        Recipe.objects.bulk_create(recipes)
+    with connection.cursor() as cursor:
+        cursor.execute('ANALYZE core_recipe')
+
+
+def seed_attributes(user, per_recipe=3, pool=50):
+    """Link each recipe of a user to a few tags and ingredients out of a pool"""
+    rng = random.Random(pool)
+    tags = Tag.objects.bulk_create(Tag(user=user, name=word) for word in WORDS[:pool])
+    ingredients = Ingredient.objects.bulk_create(Ingredient(user=user, name=word) for word in WORDS[-pool:])
+    recipe_ids = list(Recipe.objects.filter(user=user).values_list('id', flat=True))
+    for field_name, related in (('tags', tags), ('ingredients', ingredients)):
+        bulk.insert_links(
+            Recipe._meta.get_field(field_name),
+            [(recipe_id, obj.id) for recipe_id in recipe_ids for obj in rng.sample(related, per_recipe)],
+        )
+
+
+def request_host():
+    """Return a host name the settings accept requests for"""
+    return next((host.lstrip('.') for host in settings.ALLOWED_HOSTS if host != '*'), 'localhost')
+
+
+def _recipe_view(user, params, viewset=None, action='list'):
+    """Return a recipe viewset set up for an action the way a request would"""
+    from recipe.views import RecipeViewSet
+
+    viewset = viewset or RecipeViewSet
+    request = Request(APIRequestFactory().get('/', params, HTTP_HOST=request_host()))
+    request.user = user
+    return viewset(request=request, action=action, args=(), kwargs={}, format_kwarg=None)
+
+
+def list_recipes_page(user, params, viewset=None, action='list'):
+    """Run a recipe viewset action the way a request would and return the rendered data"""
+    view = _recipe_view(user, params, viewset, action)
+    page = view.paginate_queryset(view.filter_queryset(view.get_queryset()))
+    return view.get_serializer(page, many=True).data
+
+
+def run_action(user, params, action):
+    """Run a recipe viewset list route action the way a request would and return its response data"""
+    view = _recipe_view(user, params, action=action)
+    return getattr(view, action)(view.request).data
+
+
+def list_all_recipes(user, params, fast):
+    """Serialize every recipe matching a list request with the serializer or the fast path"""
+    view = _recipe_view(user, params)
+    queryset = view.filter_queryset(view.get_queryset())
+    if fast:
+        rows = RowSerializer.for_serializer(view.get_serializer())
+        return rows.to_representation(rows.values(queryset))
+    return view.get_serializer(queryset, many=True).data
+
+
+def time_call(func, repeat):
+    """Return the median and worst run time of a function in milliseconds"""
+    func()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), max(timings)
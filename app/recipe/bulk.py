@@ -0,0 +1,172 @@
+"""
+Set-based writes of recipes with their tags and ingredients.
+
+Each function writes any number of recipes with a fixed number of
+queries: a lookup and an insert each for tag and ingredient names, one
+statement for the recipes and one per through table. Creates, updates
+and deletes send no model signals, so callers invalidate the cached lists
+themselves.
+"""
+from collections import Counter
+
+from django.db import connection
+from django.utils import timezone
+
+from core.models import Recipe, Tag, Ingredient
+from recipe import counts
+
+RELATED_MODELS = {'tags': Tag, 'ingredients': Ingredient}
+
+
+def _insert_names(model, user, names):
+    """
+    Insert the given names for a user in one statement, skipping names that
+    already exist, and return the name and ID of each inserted row
+    """
+    meta = model._meta
+    quote = connection.ops.quote_name
+    user_column, name_column, count_column = (
+        quote(meta.get_field(name).column) for name in ('user', 'name', 'recipe_count')
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(meta.db_table)} ({user_column}, {name_column}, {count_column}) '
+            'SELECT %s, unnest(%s::varchar[]), 0 '
+            f'ON CONFLICT ({user_column}, {name_column}) DO NOTHING '
+            f'RETURNING {name_column}, {quote(meta.pk.column)}',
+            [user.pk, sorted(names)],
+        )
+        return cursor.fetchall()
+
+
+def resolve_names(model, user, names):
+    """
+    Return a name to ID map of the user's tags or ingredients with the
+    given names, creating the missing ones in one insert
+    """
+    names = set(names)
+    ids = dict(model.objects.filter(user=user, name__in=names).values_list('name', 'id'))
+    missing = names.difference(ids)
+    if missing:
+        ids.update(_insert_names(model, user, missing))
+        missing = names.difference(ids)
+        if missing:
+            # Created by a concurrent transaction since the lookup above.
+            ids.update(model.objects.filter(user=user, name__in=missing).values_list('name', 'id'))
+    return ids
+
+
+def _through_table(field):
+    """Return the quoted through table and recipe and related columns of a recipe M2M field"""
+    through = field.remote_field.through._meta
+    quote = connection.ops.quote_name
+    columns = (through.get_field(name).column for name in (field.m2m_field_name(), field.m2m_reverse_field_name()))
+    return quote(through.db_table), *map(quote, columns)
+
+
+def insert_links(field, links):
+    """Insert (recipe ID, related ID) rows into a through table with a single statement"""
+    if not links:
+        return
+    table, recipe_column, related_column = _through_table(field)
+    recipe_ids, related_ids = zip(*links)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {table} ({recipe_column}, {related_column}) '
+            'SELECT * FROM unnest(%s::bigint[], %s::bigint[])',
+            [list(recipe_ids), list(related_ids)],
+        )
+    counts.adjust(field.related_model, Counter(related_ids))
+
+
+def replace_links(field, recipe_ids, links):
+    """
+    Make the given (recipe ID, related ID) rows the only links of the given
+    recipes, deleting and inserting only the rows that differ
+    """
+    table, recipe_column, related_column = _through_table(field)
+    link_recipe_ids, related_ids = (list(column) for column in zip(*links)) if links else ([], [])
+    deltas = Counter()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE {recipe_column} = ANY(%s) AND ({recipe_column}, {related_column}) '
+            f'NOT IN (SELECT * FROM unnest(%s::bigint[], %s::bigint[])) RETURNING {related_column}',
+            [list(recipe_ids), link_recipe_ids, related_ids],
+        )
+        deltas.subtract(row[0] for row in cursor.fetchall())
+        if links:
+            cursor.execute(
+                f'INSERT INTO {table} ({recipe_column}, {related_column}) '
+                f'SELECT * FROM unnest(%s::bigint[], %s::bigint[]) ON CONFLICT DO NOTHING RETURNING {related_column}',
+                [link_recipe_ids, related_ids],
+            )
+            deltas.update(row[0] for row in cursor.fetchall())
+    counts.adjust(field.related_model, deltas)
+
+
+def link_related(user, recipes, items, replace=False):
+    """
+    Link each recipe to the tags and ingredients named in its validated
+    data, for the relations present in the data. With replace, links to
+    anything else are removed.
+    """
+    for field_name, model in RELATED_MODELS.items():
+        pairs = [(recipe, data[field_name]) for recipe, data in zip(recipes, items) if field_name in data]
+        if not pairs:
+            continue
+        ids = resolve_names(model, user, {item['name'] for _, related in pairs for item in related})
+        links = [
+            (recipe.id, related_id)
+            for recipe, related in pairs
+            for related_id in {ids[item['name']] for item in related}
+        ]
+        field = Recipe._meta.get_field(field_name)
+        if replace:
+            replace_links(field, [recipe.id for recipe, _ in pairs], links)
+        else:
+            insert_links(field, links)
+
+
+def _columns(data):
+    """Return the validated data without the relations"""
+    return {key: value for key, value in data.items() if key not in RELATED_MODELS}
+
+
+def create_recipes(user, items):
+    """Create recipes from validated data and return them"""
+    recipes = Recipe.objects.bulk_create(Recipe(user=user, **_columns(data)) for data in items)
+    link_related(user, recipes, items)
+    return recipes
+
+
+def update_recipes(user, recipes, items):
+    """
+    Apply partial validated data to the given recipes, replacing the tags
+    and ingredients of the recipes whose data includes them
+    """
+    now = timezone.now()
+    fields = {'updated_at'}
+    for recipe, data in zip(recipes, items):
+        for key, value in _columns(data).items():
+            setattr(recipe, key, value)
+            fields.add(key)
+        recipe.updated_at = now
+    Recipe.objects.bulk_update(recipes, sorted(fields))
+    link_related(user, recipes, items, replace=True)
+
+
+def delete_recipes(user, ids):
+    """Delete the user's recipes with the given IDs"""
+    recipe_table = connection.ops.quote_name(Recipe._meta.db_table)
+    with connection.cursor() as cursor:
+        for field_name in RELATED_MODELS:
+            field = Recipe._meta.get_field(field_name)
+            table, recipe_column, related_column = _through_table(field)
+            cursor.execute(
+                f'DELETE FROM {table} link USING {recipe_table} recipe WHERE link.{recipe_column} = recipe.id '
+                f'AND recipe.user_id = %s AND recipe.id = ANY(%s) RETURNING link.{related_column}',
+                [user.pk, list(ids)],
+            )
+            removed = Counter(row[0] for row in cursor.fetchall())
+            counts.adjust(field.related_model, {pk: -n for pk, n in removed.items()})
+        cursor.execute(f'DELETE FROM {recipe_table} WHERE user_id = %s AND id = ANY(%s)', [user.pk, list(ids)])
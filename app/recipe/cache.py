@@ -0,0 +1,128 @@
+"""
+Per-user response cache for the recipe API.
+
+Every user has a generation number that is part of the key of each cached
+response. Writes bump the generation, so old entries are simply never
+looked up again and expire on their own. A write inside a transaction
+bumps it again once the transaction commits, as a request reading in the
+meantime still sees the old rows and may cache them under the new number.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import connection, transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+GENERATION_KEY = 'recipe:generation:{user_id}'
+MODIFIED_KEY = 'recipe:modified:{user_id}'
+RESPONSE_KEY = 'recipe:response:{user_id}:{generation}:{digest}'
+STATS_KEY = 'recipe:cache:{name}'
+
+
+def _cache():
+    """Return the cache backend used for recipe responses"""
+    return caches[settings.RECIPE_CACHE_ALIAS]
+
+
+def get_generation(user_id):
+    """Return the current cache generation of a user"""
+    cache = _cache()
+    key = GENERATION_KEY.format(user_id=user_id)
+    generation = cache.get(key)
+    if generation is None:
+        # Start from the clock rather than 1 so a generation that was evicted
+        # never comes back with a number already used for cached responses.
+        cache.add(key, time.time_ns(), timeout=None)
+        generation = cache.get(key)
+    return generation
+
+
+def bump_generation(user_id):
+    """Invalidate every cached response of a user, now and once the current transaction commits"""
+    _bump(user_id)
+    if connection.in_atomic_block:
+        transaction.on_commit(lambda: _bump(user_id))
+
+
+def _bump(user_id):
+    """Move a user to a new cache generation"""
+    cache = _cache()
+    key = GENERATION_KEY.format(user_id=user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+    cache.set(MODIFIED_KEY.format(user_id=user_id), int(time.time()), timeout=None)
+
+
+def get_modified(user_id):
+    """Return when the data of a user last changed as a timestamp, if known"""
+    return _cache().get(MODIFIED_KEY.format(user_id=user_id))
+
+
+def request_digest(request, *extra):
+    """Return a digest of the request path and normalized query params"""
+    query = sorted((name, values) for name, values in request.query_params.lists())
+    return hashlib.md5(repr((request.path, query) + extra).encode()).hexdigest()
+
+
+def response_key(request):
+    """Return the cache key of a response for the request user, path and query params"""
+    user_id = request.user.pk
+    return RESPONSE_KEY.format(user_id=user_id, generation=get_generation(user_id), digest=request_digest(request))
+
+
+def get_response_data(key):
+    """Return cached response data, counting the hit or miss"""
+    data = _cache().get(key)
+    _count('hits' if data is not None else 'misses')
+    return data
+
+
+def set_response_data(key, data):
+    """Store response data in the cache"""
+    _cache().set(key, data, timeout=settings.RECIPE_CACHE_TIMEOUT)
+
+
+def _count(name):
+    """Increment a cache statistics counter"""
+    cache = _cache()
+    key = STATS_KEY.format(name=name)
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 1, timeout=None)
+
+
+def get_stats():
+    """Return the response cache hit and miss counters"""
+    cache = _cache()
+    return {name: cache.get(STATS_KEY.format(name=name), 0) for name in ('hits', 'misses')}
+
+
+def reset_stats():
+    """Reset the response cache hit and miss counters"""
+    _cache().delete_many([STATS_KEY.format(name=name) for name in ('hits', 'misses')])
+
+
+class CachedListMixin:
+    """
+    Serve list responses from the per-user response cache
+    """
+
+    def list(self, request, *args, **kwargs):
+        """Return the cached list response, or build and cache it"""
+        key = response_key(request)
+        data = get_response_data(key)
+        if data is not None:
+            return Response(data, headers={'X-Cache': 'HIT'})
+
+        response = super().list(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            set_response_data(key, response.data)
+        response['X-Cache'] = 'MISS'
+        return response
@@ -0,0 +1,112 @@
+"""
+Conditional request support for the recipe API.
+
+Validators are computed without running the list query or serializing
+anything: list ETags come from the per-user cache generation and detail
+ETags from the recipe's updated_at column. A conditional update or delete
+locks the row while checking its version, until the write commits.
+"""
+from contextlib import nullcontext
+
+from django.db import transaction
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+from rest_framework.permissions import SAFE_METHODS
+
+from recipe import cache
+
+PRECONDITION_HEADERS = ('HTTP_IF_MATCH', 'HTTP_IF_NONE_MATCH', 'HTTP_IF_MODIFIED_SINCE', 'HTTP_IF_UNMODIFIED_SINCE')
+
+
+class ConditionalListMixin:
+    """
+    Emit ETag and Last-Modified headers on lists and answer If-None-Match
+    and If-Modified-Since without building the response
+    """
+
+    def _etag(self, request, version):
+        """Return a strong ETag for a version of the requested representation"""
+        variant = cache.request_digest(request, request.accepted_renderer.format)[:12]
+        return quote_etag(f'{version}.{variant}')
+
+    def _add_validators(self, response, etag, last_modified):
+        """Set the ETag and Last-Modified headers on a successful response"""
+        if response.status_code in (200, 304):
+            if etag:
+                response['ETag'] = etag
+            if last_modified:
+                response['Last-Modified'] = http_date(last_modified)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        """List objects, unless the client's copy is current"""
+        user_id = request.user.pk
+        etag = self._etag(request, f'{user_id}.{cache.get_generation(user_id)}')
+        last_modified = cache.get_modified(user_id)
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().list(request, *args, **kwargs)
+        return self._add_validators(response, etag, last_modified)
+
+
+class ConditionalRequestMixin(ConditionalListMixin):
+    """
+    Also emit validators on object endpoints, and refuse updates and deletes
+    whose If-Match no longer matches the stored version
+    """
+    version_field = 'updated_at'
+
+    def _version_validators(self, request, version):
+        """Return the ETag and Last-Modified of an object version"""
+        if version is None:
+            return None, None
+        pk = self.kwargs[self.lookup_field]
+        return self._etag(request, f'{pk}.{int(version.timestamp() * 1e6)}'), int(version.timestamp())
+
+    def _stored_version(self, request, lock=False):
+        """Return the stored version of the requested object with a single indexed lookup"""
+        try:
+            queryset = self.queryset.filter(user=request.user, pk=self.kwargs[self.lookup_field])
+        except (TypeError, ValueError):
+            return None
+        if lock:
+            queryset = queryset.select_for_update()
+        return queryset.values_list(self.version_field, flat=True).first()
+
+    def get_object(self):
+        """Keep the object so the response validators can be read from it"""
+        self._conditional_object = super().get_object()
+        return self._conditional_object
+
+    def _conditional(self, handler, request, *args, **kwargs):
+        """Return a 304 or 412 response if a precondition applies, or run the handler"""
+        conditional = any(header in request.META for header in PRECONDITION_HEADERS)
+        write = request.method not in SAFE_METHODS
+        # Without the lock a concurrent write could land between the check
+        # and this write, which would then overwrite it.
+        with transaction.atomic() if conditional and write else nullcontext():
+            version = self._stored_version(request, lock=write) if conditional else None
+            # A missing object is left to the handler, which answers 404.
+            if version is not None:
+                etag, last_modified = self._version_validators(request, version)
+                response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+                if response is not None:
+                    return self._add_validators(response, etag, last_modified)
+            response = handler(request, *args, **kwargs)
+        obj = getattr(self, '_conditional_object', None)
+        if obj is not None:
+            version = getattr(obj, self.version_field)
+            self._add_validators(response, *self._version_validators(request, version))
+        return response
+
+    def retrieve(self, request, *args, **kwargs):
+        """Retrieve an object, unless the client's copy is current"""
+        return self._conditional(super().retrieve, request, *args, **kwargs)
+
+    def update(self, request, *args, **kwargs):
+        """Update an object, unless the client's copy is stale"""
+        return self._conditional(super().update, request, *args, **kwargs)
+
+    def destroy(self, request, *args, **kwargs):
+        """Delete an object, unless the client's copy is stale"""
+        return self._conditional(super().destroy, request, *args, **kwargs)
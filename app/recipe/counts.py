@@ -0,0 +1,83 @@
+"""
+Denormalized recipe counts of tags and ingredients.
+
+recipe_count is changed in the same transaction as the links it counts.
+The signal handlers in recipe.signals cover links written through the ORM
+and recipe deletes; recipe.bulk adjusts the counts of the links it writes
+with SQL. repair() recomputes the counts from the through tables, and can
+run while the site is live.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import connection, transaction
+
+_adjusted_in_bulk = ContextVar('recipe_counts_adjusted_in_bulk', default=False)
+
+
+@contextmanager
+def adjusted_in_bulk():
+    """Skip the per recipe delete handler for deletes whose counts are adjusted in bulk"""
+    token = _adjusted_in_bulk.set(True)
+    try:
+        yield
+    finally:
+        _adjusted_in_bulk.reset(token)
+
+
+def is_adjusted_in_bulk():
+    """Return whether the counts of the current deletes are adjusted in bulk"""
+    return _adjusted_in_bulk.get()
+
+
+def adjust(model, deltas):
+    """Add a delta to the recipe count of each tag or ingredient ID in one statement"""
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    table = connection.ops.quote_name(model._meta.db_table)
+    ids = sorted(deltas)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {table} SET recipe_count = recipe_count + delta.value '
+            f'FROM unnest(%s::bigint[], %s::integer[]) AS delta (id, value) WHERE {table}.id = delta.id',
+            [ids, [deltas[pk] for pk in ids]],
+        )
+
+
+def _count_sql(field):
+    """Return the related table of a recipe M2M field and a query of the actual counts"""
+    model = field.related_model
+    through = field.remote_field.through._meta
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    related_column = quote(through.get_field(field.m2m_reverse_field_name()).column)
+    actual = (
+        f'SELECT related.id, count(link.{related_column}) AS count FROM {table} related '
+        f'LEFT JOIN {quote(through.db_table)} link ON link.{related_column} = related.id GROUP BY related.id'
+    )
+    return table, actual
+
+
+def repair(field, fix=True):
+    """
+    Return the IDs of the tags or ingredients of a recipe M2M field whose
+    count differs from their number of links, correcting them with fix
+    """
+    table, actual = _count_sql(field)
+    with transaction.atomic(), connection.cursor() as cursor:
+        if fix:
+            # Writers change a count in the transaction that changes its links,
+            # so holding off their count updates until this commits means the
+            # recount sees every link whose count change it overwrites.
+            cursor.execute(f'LOCK TABLE {table} IN SHARE ROW EXCLUSIVE MODE')
+            cursor.execute(
+                f'UPDATE {table} SET recipe_count = actual.count FROM ({actual}) actual '
+                f'WHERE {table}.id = actual.id AND {table}.recipe_count <> actual.count RETURNING {table}.id'
+            )
+        else:
+            cursor.execute(
+                f'SELECT {table}.id FROM {table} JOIN ({actual}) actual '
+                f'ON {table}.id = actual.id WHERE {table}.recipe_count <> actual.count'
+            )
+        return sorted(row[0] for row in cursor.fetchall())
@@ -0,0 +1,45 @@
+"""
+Streaming export of recipe libraries.
+
+Rows are read from a server-side cursor and rendered a chunk at a time,
+so memory use stays flat however many recipes are exported.
+"""
+import json
+from itertools import islice
+
+from rest_framework.utils.encoders import JSONEncoder
+
+CONTENT_TYPES = {
+    'json': 'application/json',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+def _dumps(item):
+    """Return the compact JSON of an item, as the JSON renderer would write it"""
+    return json.dumps(item, cls=JSONEncoder, ensure_ascii=False, separators=(',', ':'))
+
+
+def serialized_chunks(rows, queryset, chunk_size):
+    """Yield lists of serialized objects read from a values() queryset"""
+    iterator = queryset.iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield rows.to_representation(chunk)
+
+
+def stream(rows, queryset, output, chunk_size):
+    """Yield the encoded export as NDJSON lines or as a single JSON array"""
+    if output == 'ndjson':
+        for data in serialized_chunks(rows, queryset, chunk_size):
+            yield ''.join(f'{_dumps(item)}\n' for item in data).encode()
+        return
+
+    yield b'['
+    separator = ''
+    for data in serialized_chunks(rows, queryset, chunk_size):
+        yield (separator + ','.join(_dumps(item) for item in data)).encode()
+        separator = ','
+    yield b']'
@@ -0,0 +1,122 @@
+"""
+Facet counts over a filtered set of recipes.
+
+The matching recipes are selected once into a materialized CTE; the
+number of them, the tag and ingredient counts and the histogram buckets
+are all grouped from it in the same statement. Without a filter the tag
+and ingredient counts are the denormalized recipe counts instead.
+"""
+from django.db import connection
+from django.db.models import F
+
+from core.models import Recipe
+
+HISTOGRAM_FIELDS = ('price', 'time_minutes')
+
+
+def stored_counts(field_name, user):
+    """Return the user's tags or ingredients used by any recipe with their stored recipe count"""
+    model = Recipe._meta.get_field(field_name).related_model
+    rows = model.objects.filter(user=user, recipe_count__gt=0).values('id', 'name', count=F('recipe_count'))
+    return list(rows.order_by('-count', 'name'))
+
+
+def _related_sql(field_name):
+    """Return a grouped query of the links of a recipe M2M field from the matching recipes"""
+    field = Recipe._meta.get_field(field_name)
+    through = field.remote_field.through._meta
+    quote = connection.ops.quote_name
+    recipe_column, related_column = (
+        quote(through.get_field(name).column) for name in (field.m2m_field_name(), field.m2m_reverse_field_name())
+    )
+    related = field.related_model._meta
+    return (
+        f'SELECT %s, link.{related_column}, related.{quote(related.get_field("name").column)}, count(*), '
+        f'NULL::numeric, NULL::numeric FROM {quote(through.db_table)} link '
+        f'JOIN matched ON matched.id = link.{recipe_column} '
+        f'JOIN {quote(related.db_table)} related ON related.{quote(related.pk.column)} = link.{related_column} '
+        f'GROUP BY 2, 3'
+    )
+
+
+def _histograms_sql(count):
+    """
+    Return a query of the histogram buckets of the first count columns of
+    the matching recipes, grouping them all in one pass with grouping sets
+    """
+    indexes = range(count)
+    # width_bucket() refuses equal bounds and puts the highest value in an
+    # extra bucket past the end.
+    buckets = ', '.join(
+        f'CASE WHEN low{i} = high{i} THEN 1 '
+        f'ELSE LEAST(width_bucket(c{i}::float8, low{i}::float8, high{i}::float8, %s), %s) END AS b{i}, '
+        f'low{i}::numeric AS low{i}, high{i}::numeric AS high{i}'
+        for i in indexes
+    )
+    facet = ' '.join(f'WHEN GROUPING(b{i}) = 0 THEN %s' for i in indexes)
+    bucket, low, high = (', '.join(f'{column}{i}' for i in indexes) for column in ('b', 'low', 'high'))
+    sets = ', '.join(f'(b{i}, low{i}, high{i})' for i in indexes)
+    return (
+        f'SELECT CASE {facet} END, COALESCE({bucket}), NULL, count(*), COALESCE({low}), COALESCE({high}) '
+        f'FROM (SELECT {buckets} FROM matched CROSS JOIN bounds) bucketed GROUP BY GROUPING SETS ({sets})'
+    )
+
+
+def facet_counts(recipes, related_fields, histogram_fields, buckets):
+    """
+    Return the number of the given recipes, the counts of their related
+    objects for each M2M field and the histogram of each column, split
+    into equal width buckets between its lowest and highest value
+    """
+    if not related_fields and not histogram_fields:
+        return recipes.count(), {}, {}
+    recipes_sql, params = recipes.values_list('id', *histogram_fields).order_by().query.sql_with_params()
+    columns = ''.join(f', c{index}' for index in range(len(histogram_fields)))
+    bounds = ''.join(
+        f', min(c{index}) AS low{index}, max(c{index}) AS high{index}' for index in range(len(histogram_fields))
+    )
+    queries = ['SELECT %s, NULL::bigint, NULL, count, NULL::numeric, NULL::numeric FROM bounds']
+    params = [*params, '']
+    if histogram_fields:
+        queries.append(_histograms_sql(len(histogram_fields)))
+        params += [*histogram_fields, *[buckets] * 2 * len(histogram_fields)]
+    for name in related_fields:
+        queries.append(_related_sql(name))
+        params.append(name)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'WITH matched (id{columns}) AS MATERIALIZED ({recipes_sql}), '
+            f'bounds AS (SELECT count(*) AS count{bounds} FROM matched) '
+            f'{" UNION ALL ".join(queries)} ORDER BY 1, 4 DESC, 3',
+            params,
+        )
+        rows = cursor.fetchall()
+
+    count = 0
+    related = {name: [] for name in related_fields}
+    found = {name: {} for name in histogram_fields}
+    for facet, key, name, value, low, high in rows:
+        if not facet:
+            count = value
+        elif facet in related:
+            related[facet].append({'id': key, 'name': name, 'count': value})
+        else:
+            found[facet][key] = (value, low, high)
+    return count, related, {name: _histogram(name, found[name], buckets) for name in histogram_fields}
+
+
+def _histogram(field_name, found, buckets):
+    """Return the buckets of a column from its map of bucket number to count and bounds"""
+    if not found:
+        return []
+    field = Recipe._meta.get_field(field_name)
+    _, low, high = next(iter(found.values()))
+    low, high = field.to_python(low), field.to_python(high)
+    if low == high:
+        return [{'start': low, 'end': high, 'count': found[1][0]}]
+    width = (high - low) / buckets
+    return [
+        {'start': low + width * index, 'end': high if index == buckets - 1 else low + width * (index + 1),
+         'count': found.get(index + 1, (0,))[0]}
+        for index in range(buckets)
+    ]
@@ -0,0 +1,250 @@
+"""
+Fast paths around the recipe serializers.
+
+Large lists spend most of their time in the serializer field machinery
+rather than the database. The list action instead renders values() rows
+with plain dicts, and bulk imports validate plain JSON objects, each using
+a plan compiled once from the bound serializer fields so the results are
+the same as the serializer's.
+"""
+from django.core.exceptions import FieldDoesNotExist, ValidationError as DjangoValidationError
+from rest_framework import serializers
+from rest_framework.fields import empty
+from rest_framework.relations import ManyRelatedField, PrimaryKeyRelatedField
+from rest_framework.response import Response
+
+# Fields whose to_representation returns database values unchanged
+PLAIN_FIELDS = (serializers.IntegerField, serializers.CharField, serializers.BooleanField)
+# Fields whose to_representation is called per value
+CONVERTED_FIELDS = (serializers.DecimalField, serializers.FloatField)
+# Modules of the validators RowValidator runs itself
+STOCK_VALIDATOR_MODULES = ('django.core.validators', 'rest_framework.validators')
+
+
+def _column_converter(model, field):
+    """Return the converter of a field backed by a model column, or raise LookupError"""
+    if not isinstance(field, PLAIN_FIELDS + CONVERTED_FIELDS):
+        raise LookupError(field.field_name)
+    try:
+        model_field = model._meta.get_field(field.source)
+    except FieldDoesNotExist:
+        raise LookupError(field.field_name)
+    if not model_field.concrete or model_field.is_relation:
+        raise LookupError(field.field_name)
+    if isinstance(field, PLAIN_FIELDS):
+        return None
+    return field.to_representation
+
+
+class RowSerializer:
+    """
+    Render values() rows the way a serializer renders model instances
+    """
+
+    def __init__(self, model, columns, relations):
+        self.model = model
+        self.columns = columns
+        self.relations = relations
+
+    @classmethod
+    def for_serializer(cls, serializer):
+        """
+        Compile the fields of a bound model serializer, or return None when
+        a field can only be rendered from a model instance or a relation
+        comes before a column
+        """
+        model = serializer.Meta.model
+        columns, relations = [], []
+        try:
+            for name, field in serializer.fields.items():
+                if isinstance(field, serializers.ListSerializer):
+                    child = cls.for_serializer(field.child)
+                    if child is None or child.relations:
+                        return None
+                    relations.append((name, model._meta.get_field(field.source), child))
+                elif isinstance(field, ManyRelatedField) and isinstance(field.child_relation, PrimaryKeyRelatedField):
+                    relations.append((name, model._meta.get_field(field.source), None))
+                elif relations:
+                    return None
+                else:
+                    columns.append((name, field.source, _column_converter(model, field)))
+        except LookupError:
+            return None
+        return cls(model, columns, relations)
+
+    def values(self, queryset):
+        """Return the queryset as rows holding the serialized columns and annotations"""
+        names = {source for _, source, _ in self.columns}
+        names.add(self.model._meta.pk.attname)
+        names.update(queryset.query.annotations)
+        return queryset.prefetch_related(None).values(*names)
+
+    def _fetch_related(self, field, child, pks):
+        """Return the related rows of each object, in related primary key order"""
+        source = f'{field.m2m_field_name()}_id'
+        target = field.m2m_reverse_field_name()
+        links = field.remote_field.through.objects.filter(**{f'{source}__in': pks}).order_by(f'{target}_id')
+        grouped = {}
+        if child is None:
+            for pk, related_pk in links.values_list(source, f'{target}_id'):
+                grouped.setdefault(pk, []).append(related_pk)
+            return grouped
+        names = [f'{target}__{column}' for _, column, _ in child.columns]
+        for pk, *values in links.values_list(source, *names):
+            grouped.setdefault(pk, []).append(child.to_dict(values))
+        return grouped
+
+    def to_dict(self, values):
+        """Return the serialized dict of a row given as a sequence in column order"""
+        return {
+            name: value if convert is None or value is None else convert(value)
+            for (name, _, convert), value in zip(self.columns, values)
+        }
+
+    def to_representation(self, rows):
+        """Return the serialized list of the given rows"""
+        rows = list(rows)
+        pk_name = self.model._meta.pk.attname
+        related = [
+            (name, self._fetch_related(field, child, [row[pk_name] for row in rows]))
+            for name, field, child in self.relations
+        ]
+        data = []
+        for row in rows:
+            item = self.to_dict([row[source] for _, source, _ in self.columns])
+            for name, grouped in related:
+                item[name] = grouped.get(row[pk_name], [])
+            data.append(item)
+        return data
+
+
+class RowValidator:
+    """
+    Validate JSON objects the way a serializer would, for values that already
+    have their internal type. validate() returns None for anything else, so
+    that the serializer can decide and report its own errors.
+    """
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    @classmethod
+    def for_serializer(cls, serializer):
+        """
+        Compile the writable fields of a bound serializer, or return None if it
+        has validation of its own, such as validate_<field> methods or custom
+        field validators
+        """
+        if serializer.validators or type(serializer).validate is not serializers.Serializer.validate:
+            return None
+        fields = []
+        for name, field in serializer.fields.items():
+            if field.read_only:
+                continue
+            if field.default is not empty or field.source == '*':
+                return None
+            if hasattr(serializer, f'validate_{name}'):
+                return None
+            if any(getattr(validator, '__module__', None) not in STOCK_VALIDATOR_MODULES
+                   or getattr(validator, 'requires_context', False) for validator in field.validators):
+                return None
+            if isinstance(field, serializers.ListSerializer):
+                child = cls.for_serializer(field.child)
+                if child is None:
+                    return None
+                check = child._check_list(field)
+            elif type(field) in (serializers.CharField, serializers.IntegerField, serializers.DecimalField):
+                check = getattr(cls, f'_check_{type(field).__name__}')(field)
+            else:
+                return None
+            fields.append((name, field.source, field.required and not serializer.partial, check))
+        return cls(fields)
+
+    @staticmethod
+    def _check_CharField(field):
+        """Return the check of a string field"""
+        def check(value):
+            if type(value) is not str:
+                raise ValueError
+            if field.trim_whitespace:
+                value = value.strip()
+            if not value:
+                if not field.allow_blank:
+                    raise ValueError
+                return ''
+            for validator in field.validators:
+                validator(value)
+            return value
+        return check
+
+    @staticmethod
+    def _check_IntegerField(field):
+        """Return the check of an integer field"""
+        def check(value):
+            if type(value) is not int:
+                raise ValueError
+            for validator in field.validators:
+                validator(value)
+            return value
+        return check
+
+    @staticmethod
+    def _check_DecimalField(field):
+        """Return the check of a decimal field"""
+        def check(value):
+            if type(value) not in (str, int):
+                raise ValueError
+            value = field.to_internal_value(value)
+            for validator in field.validators:
+                validator(value)
+            return value
+        return check
+
+    def _check_list(self, field):
+        """Return the check of a list of nested objects"""
+        def check(value):
+            if type(value) is not list or (not value and not field.allow_empty):
+                raise ValueError
+            items = [self.validate(item) for item in value]
+            if None in items:
+                raise ValueError
+            return items
+        return check
+
+    def validate(self, data):
+        """Return the validated data of an object, or None if the serializer has to decide"""
+        if type(data) is not dict:
+            return None
+        validated = {}
+        try:
+            for name, source, required, check in self.fields:
+                if name not in data:
+                    if required:
+                        return None
+                    continue
+                value = data[name]
+                if value is None:
+                    return None
+                validated[source] = check(value)
+        except (ValueError, DjangoValidationError, serializers.ValidationError):
+            return None
+        return validated
+
+
+class FastListMixin:
+    """
+    List from values() rows when the list serializer can be compiled
+    """
+    fast_list = True
+
+    def list(self, request, *args, **kwargs):
+        """List objects without building model instances or serializer fields per row"""
+        rows = RowSerializer.for_serializer(self.get_serializer()) if self.fast_list else None
+        if rows is None:
+            return super().list(request, *args, **kwargs)
+
+        queryset = rows.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is None:
+            return Response(rows.to_representation(queryset))
+        return self.get_paginated_response(rows.to_representation(page))
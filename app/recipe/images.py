@@ -0,0 +1,115 @@
+"""
+Resized variants of recipe images.
+
+An upload only stores the original and queues a job. A worker then
+generates the variants, smallest first, and records each one in
+Recipe.image_variants as soon as it is written, so clients can show a
+thumbnail before the larger sizes are done. Pillow releases the GIL while
+decoding, resizing and encoding, so workers with a thread pool run
+several of these jobs in parallel.
+"""
+import io
+import json
+import os
+
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.db.models import F, Func, JSONField, Value
+from django.db.models.functions import Cast
+from django.utils import timezone
+from PIL import Image, ImageOps, features
+
+from core import jobs
+from core.models import Recipe
+from recipe import cache
+
+# Name: (longest side in pixels, format), in the order they are generated.
+VARIANTS = {
+    'thumbnail': (200, 'JPEG'),
+    'thumbnail_webp': (200, 'WEBP'),
+    'medium': (800, 'JPEG'),
+    'medium_webp': (800, 'WEBP'),
+}
+EXTENSIONS = {'JPEG': '.jpg', 'WEBP': '.webp'}
+
+
+def available_variants():
+    """Return the variants this Pillow build can encode"""
+    return {
+        name: (size, image_format) for name, (size, image_format) in VARIANTS.items()
+        if image_format != 'WEBP' or features.check('webp')
+    }
+
+
+def variant_name(image_name, variant):
+    """Return the storage name of a variant of an image"""
+    root, _ = os.path.splitext(image_name)
+    return f'{root}_{variant}{EXTENSIONS[VARIANTS[variant][1]]}'
+
+
+def schedule_variants(recipe, stale=()):
+    """
+    Queue a job generating the variants of a recipe's image and deleting the
+    stale files of the image it replaced
+    """
+    return jobs.enqueue(
+        generate_variants, user_id=recipe.user_id,
+        recipe_id=recipe.pk, image_name=recipe.image.name, stale=list(stale),
+    )
+
+
+def _resize(image, size, image_format):
+    """Return an image scaled down to fit a square of size pixels, encoded in a format"""
+    variant = image.copy()
+    variant.thumbnail((size, size), Image.LANCZOS)
+    if image_format == 'JPEG' and variant.mode != 'RGB':
+        variant = variant.convert('RGB')
+    buffer = io.BytesIO()
+    variant.save(buffer, format=image_format, quality=85, optimize=image_format == 'JPEG')
+    return buffer.getvalue()
+
+
+@jobs.task(priority=10)
+def generate_variants(recipe_id, image_name, stale=()):
+    """
+    Write each variant of an image and record it on the recipe, unless the
+    recipe has been given another image in the meantime
+    """
+    storage = Recipe._meta.get_field('image').storage
+    for name in stale:
+        storage.delete(name)
+    variants = available_variants()
+    with storage.open(image_name) as original:
+        image = Image.open(original)
+        # Let the JPEG decoder scale down by up to 8x while decoding.
+        image.draft('RGB', (max(size for size, _ in variants.values()),) * 2)
+        image = ImageOps.exif_transpose(image)
+        for variant, (size, image_format) in variants.items():
+            name = storage.save(variant_name(image_name, variant), ContentFile(_resize(image, size, image_format)))
+            if not _record_variant(recipe_id, image_name, variant, name):
+                storage.delete(name)
+                return
+
+
+def _record_variant(recipe_id, image_name, variant, name):
+    """Add a variant to image_variants if the recipe still has the image, returning whether it did"""
+    added = Func(
+        F('image_variants'), Cast(Value(json.dumps({variant: name})), JSONField()),
+        arg_joiner=' || ', template='(%(expressions)s)', output_field=JSONField(),
+    )
+    updated = Recipe.objects.filter(pk=recipe_id, image=image_name).update(
+        image_variants=added, updated_at=timezone.now(),
+    )
+    if updated:
+        cache.bump_generation(Recipe.objects.values_list('user_id', flat=True).get(pk=recipe_id))
+    return bool(updated)
+
+
+def referenced_names():
+    """Return the storage names of every recipe image and image variant"""
+    names = set(Recipe.objects.filter(image__isnull=False).exclude(image='').values_list('image', flat=True).iterator())
+    table = connection.ops.quote_name(Recipe._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT variant.value FROM {table}, jsonb_each_text({table}.image_variants) AS variant')
+        names.update(name for name, in cursor)
+    return names
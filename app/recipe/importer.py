@@ -0,0 +1,76 @@
+"""
+Bulk import of recipes from NDJSON.
+
+Lines are validated a chunk at a time with the export serializer, so an
+export can be imported again as is. Each chunk is then written with a
+fixed number of queries whatever its size, see recipe.bulk.
+"""
+import json
+from itertools import islice
+from operator import itemgetter
+
+from django.db import transaction
+from rest_framework.exceptions import ValidationError
+
+from recipe import bulk, cache
+from recipe.fastpath import RowValidator
+from recipe.serializers import RecipeExportSerializer
+
+CHUNK_SIZE = 1000
+
+
+def _parse_lines(lines, errors):
+    """Yield the line number and object of each JSON line, recording the invalid ones"""
+    for line_number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError as exc:
+            errors.append({'line': line_number, 'errors': {'detail': [f'Invalid JSON: {exc}']}})
+            continue
+        if not isinstance(data, dict):
+            errors.append({'line': line_number, 'errors': {'detail': ['Expected a JSON object.']}})
+            continue
+        yield line_number, data
+
+
+def _validate_chunk(chunk, errors):
+    """Return the validated data of the valid lines of a chunk, recording the errors of the others"""
+    serializer = RecipeExportSerializer()
+    validator = RowValidator.for_serializer(serializer)
+    valid = []
+    for line_number, data in chunk:
+        validated = validator.validate(data) if validator else None
+        if validated is None:
+            try:
+                validated = serializer.run_validation(data)
+            except ValidationError as exc:
+                errors.append({'line': line_number, 'errors': exc.detail})
+                continue
+        valid.append(validated)
+    return valid
+
+
+def import_recipes(user, lines, chunk_size=CHUNK_SIZE):
+    """
+    Import recipes for a user from NDJSON lines and return the number
+    created with the errors of each rejected line
+    """
+    errors = []
+    created = 0
+    parsed = _parse_lines(lines, errors)
+    try:
+        while True:
+            chunk = list(islice(parsed, chunk_size))
+            if not chunk:
+                break
+            valid = _validate_chunk(chunk, errors)
+            if valid:
+                with transaction.atomic():
+                    created += len(bulk.create_recipes(user, valid))
+    finally:
+        # Bulk inserts send no signals, so invalidate the cached lists here.
+        if created:
+            cache.bump_generation(user.id)
+    return {'created': created, 'errors': sorted(errors, key=itemgetter('line'))}
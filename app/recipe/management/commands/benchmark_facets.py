@@ -0,0 +1,39 @@
+"""Django command to benchmark recipe facet counts"""
+
+from django.core.management.base import BaseCommand
+
+from recipe import benchmark, cache
+
+BENCHMARK_EMAIL = 'benchmark-facets@example.com'
+
+
+class Command(BaseCommand):
+    """Seed recipes with tags and ingredients and time uncached facet requests"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size', type=int, default=50000, help='Recipes to seed')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per filter')
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        user = benchmark.seed_user(BENCHMARK_EMAIL)
+        try:
+            benchmark.seed_recipes(user, options['size'])
+            benchmark.seed_attributes(user)
+            tag_ids = list(user.tag_set.order_by('id').values_list('id', flat=True)[:2])
+            filters = {
+                'none': {},
+                'one tag': {'tags': tag_ids[0]},
+                'all tags': {'tags': ','.join(map(str, tag_ids)), 'match': 'all'},
+            }
+            self.stdout.write(f'{"filter":>10} {"histograms":>11} {"median ms":>10} {"max ms":>10}')
+            for name, params in filters.items():
+                for histogram in ('', 'price,time_minutes'):
+                    def run():
+                        cache.bump_generation(user.id)
+                        return benchmark.run_action(user, {**params, 'histogram': histogram}, 'facets')
+
+                    median, worst = benchmark.time_call(run, options['repeat'])
+                    self.stdout.write(f'{name:>10} {bool(histogram)!s:>11} {median:>10.2f} {worst:>10.2f}')
+        finally:
+            benchmark.drop_user(user)
@@ -0,0 +1,37 @@
+"""Django command to compare the serializer and fast list paths"""
+
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from recipe import benchmark
+
+BENCHMARK_EMAIL = 'benchmark-list@example.com'
+
+
+class Command(BaseCommand):
+    """Seed recipes with tags and ingredients and time listing all of them both ways"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='100,1000,10000', help='Comma separated recipe counts to measure at')
+        parser.add_argument('--repeat', type=int, default=10, help='Timed runs per path')
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        sizes = sorted(int(size) for size in options['sizes'].split(','))
+        self.stdout.write(
+            f'{"recipes":>10} {"serializer ms":>14} {"fast path ms":>13} {"speedup":>8} {"identical":>10}'
+        )
+        for size in sizes:
+            user = benchmark.seed_user(BENCHMARK_EMAIL)
+            try:
+                benchmark.seed_recipes(user, size)
+                benchmark.seed_attributes(user)
+                slow, _ = benchmark.time_call(lambda: benchmark.list_all_recipes(user, {}, fast=False),
+                                              options['repeat'])
+                fast, _ = benchmark.time_call(lambda: benchmark.list_all_recipes(user, {}, fast=True),
+                                              options['repeat'])
+                identical = (JSONRenderer().render(benchmark.list_all_recipes(user, {}, fast=False))
+                             == JSONRenderer().render(benchmark.list_all_recipes(user, {}, fast=True)))
+                self.stdout.write(f'{size:>10} {slow:>14.2f} {fast:>13.2f} {slow / fast:>7.1f}x {identical!s:>10}')
+            finally:
+                benchmark.drop_user(user)
@@ -0,0 +1,62 @@
+"""Django command to benchmark serving recipe images"""
+import os
+import time
+from decimal import Decimal
+
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.urls import reverse
+from rest_framework.authtoken.models import Token
+
+from core.models import Recipe
+from recipe import benchmark
+
+BENCHMARK_EMAIL = 'benchmark-media@example.com'
+
+
+class Command(BaseCommand):
+    """Store an image and time requests for it through the whole request stack of one worker"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kib', type=int, default=512, help='Size of the image in KiB')
+        parser.add_argument('--seconds', type=float, default=3, help='Time spent on each mode')
+
+    def _throughput(self, client, url, seconds, **headers):
+        """Return the requests and bytes per second of repeated requests"""
+        requests = sent = 0
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            response = client.get(url, **headers)
+            assert response.status_code in (200, 206), response.status_code
+            if response.streaming:
+                sent += sum(len(chunk) for chunk in response.streaming_content)
+            response.close()
+            requests += 1
+        elapsed = time.perf_counter() - start
+        return requests / elapsed, sent / elapsed
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        user = benchmark.seed_user(BENCHMARK_EMAIL)
+        recipe = Recipe.objects.create(user=user, title='Benchmark', time_minutes=5, price=Decimal('1'))
+        recipe.image.save('image.jpg', ContentFile(os.urandom(options['kib'] * 1024)))
+        try:
+            client = Client(
+                HTTP_HOST=benchmark.request_host(),
+                HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}',
+            )
+            url = reverse('media', args=[recipe.image.name])
+            modes = {
+                'streamed': (None, {}),
+                'range 64KiB': (None, {'HTTP_RANGE': 'bytes=0-65535'}),
+                'x-accel': ('X-Accel-Redirect', {}),
+            }
+            self.stdout.write(f'{"mode":>12} {"req/s":>10} {"MiB/s":>10}')
+            for mode, (header, headers) in modes.items():
+                with override_settings(RECIPE_MEDIA_SENDFILE_HEADER=header):
+                    rate, sent = self._throughput(client, url, options['seconds'], **headers)
+                self.stdout.write(f'{mode:>12} {rate:>10.1f} {sent / 2 ** 20:>10.1f}')
+        finally:
+            recipe.image.delete()
+            benchmark.drop_user(user)
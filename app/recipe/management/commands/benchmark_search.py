@@ -0,0 +1,41 @@
+"""Django command to benchmark recipe full text search as the data grows"""
+
+from django.core.management.base import BaseCommand
+
+from recipe import benchmark
+
+BENCHMARK_EMAIL = 'benchmark-search@example.com'
+
+
+class Command(BaseCommand):
+    """Seed recipes in steps and time ranked searches at each size"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10000,100000,1000000',
+                            help='Comma separated recipe counts to measure at')
+        parser.add_argument('--repeat', type=int, default=20, help='Timed runs per query')
+        parser.add_argument('--keep', action='store_true', help='Keep the seeded recipes afterwards')
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        sizes = sorted(int(size) for size in options['sizes'].split(','))
+        user = benchmark.seed_user(BENCHMARK_EMAIL)
+        queries = {
+            'rare': benchmark.NEEDLE,
+            'common': benchmark.WORDS[0],
+            'phrase': f'"{benchmark.WORDS[1]} {benchmark.WORDS[2]}"',
+        }
+        self.stdout.write(f'{"recipes":>10} {"query":>8} {"median ms":>10} {"max ms":>10}')
+        seeded = 0
+        try:
+            for size in sizes:
+                benchmark.seed_recipes(user, size - seeded, start=seeded, needles=20)
+                seeded = size
+                for name, search in queries.items():
+                    median, worst = benchmark.time_call(
+                        lambda: benchmark.list_recipes_page(user, {'search': search}), options['repeat']
+                    )
+                    self.stdout.write(f'{size:>10} {name:>8} {median:>10.2f} {worst:>10.2f}')
+        finally:
+            if not options['keep']:
+                benchmark.drop_user(user)
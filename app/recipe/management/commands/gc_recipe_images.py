@@ -0,0 +1,45 @@
+"""Django command to delete recipe image files that nothing refers to"""
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.models import Recipe
+from core.storage import ContentAddressedStorage
+from recipe import images
+
+
+class Command(BaseCommand):
+    """Delete content addressed image files no recipe image or variant refers to"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-age', type=float, default=24,
+                            help='Only delete files not written or reused for this many hours')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be deleted')
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        storage = Recipe._meta.get_field('image').storage
+        if not isinstance(storage, ContentAddressedStorage):
+            raise CommandError('RECIPE_IMAGE_STORAGE is not a content addressed storage.')
+        cutoff = time.time() - options['min_age'] * 3600
+        # References are read before the files are listed. A file that gets
+        # referenced afterwards has just been written or reused, so its
+        # modification time keeps it until the next run.
+        referenced = images.referenced_names()
+        kept = deleted = freed = 0
+        for name, size, modified in storage.blobs():
+            if name in referenced or modified > cutoff:
+                kept += 1
+                continue
+            if not options['dry_run']:
+                try:
+                    if os.stat(storage.path(name)).st_mtime > cutoff:
+                        kept += 1
+                        continue
+                    storage.purge(name)
+                except FileNotFoundError:
+                    continue
+            deleted += 1
+            freed += size
+        self.stdout.write(f'kept={kept} deleted={deleted} freed_bytes={freed}')
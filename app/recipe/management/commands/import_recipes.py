@@ -0,0 +1,39 @@
+"""Django command to bulk import recipes from an NDJSON file"""
+import sys
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from recipe import importer
+
+
+class Command(BaseCommand):
+    """Import recipes for a user from NDJSON, one recipe per line in the export format"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('email', help='Email of the user to import the recipes for')
+        parser.add_argument('path', help='NDJSON file to read, or - for standard input')
+        parser.add_argument('--chunk-size', type=int, default=importer.CHUNK_SIZE,
+                            help='Lines validated and written together')
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        try:
+            user = get_user_model().objects.get(email=options['email'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'No user with email {options["email"]!r}.')
+
+        start = time.perf_counter()
+        if options['path'] == '-':
+            result = importer.import_recipes(user, sys.stdin, options['chunk_size'])
+        else:
+            with open(options['path'], encoding='utf-8') as lines:
+                result = importer.import_recipes(user, lines, options['chunk_size'])
+        elapsed = time.perf_counter() - start
+
+        for error in result['errors']:
+            self.stderr.write(f'line {error["line"]}: {error["errors"]}')
+        rate = result['created'] / elapsed if elapsed else 0
+        self.stdout.write(f'created={result["created"]} errors={len(result["errors"])} '
+                          f'seconds={elapsed:.2f} recipes_per_second={rate:.0f}')
@@ -0,0 +1,66 @@
+"""Django command to move existing recipe images into the content addressed layout"""
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from core.models import Recipe
+from core.storage import ContentAddressedStorage
+from recipe import cache
+
+
+class Command(BaseCommand):
+    """
+    Copy each recipe image and variant to its content addressed name and
+    point the recipe at the copies, while the API keeps serving
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Recipes read per query')
+        parser.add_argument('--keep-old', action='store_true', help='Keep the files under their old names')
+
+    def _store(self, storage, name):
+        """Store a copy of a file under its content name and return that name"""
+        if storage.is_content_name(name):
+            return name
+        with storage.open(name) as content:
+            return storage.save(name, content)
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        storage = Recipe._meta.get_field('image').storage
+        if not isinstance(storage, ContentAddressedStorage):
+            raise CommandError('RECIPE_IMAGE_STORAGE is not a content addressed storage.')
+        migrated = changed = missing = 0
+        last_id = 0
+        recipes = Recipe.objects.filter(image__isnull=False).exclude(image='').order_by('id')
+        while True:
+            batch = recipes.filter(id__gt=last_id).values_list('id', 'user_id', 'image', 'image_variants')
+            rows = list(batch[:options['batch_size']])
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            for recipe_id, user_id, image, variants in rows:
+                names = [image, *variants.values()]
+                if all(storage.is_content_name(name) for name in names):
+                    continue
+                try:
+                    renamed = {name: self._store(storage, name) for name in names}
+                except FileNotFoundError:
+                    missing += 1
+                    continue
+                # Only swap if the recipe was not given another image meanwhile;
+                # copies left unreferenced are removed by gc_recipe_images.
+                updated = Recipe.objects.filter(id=recipe_id, image=image, image_variants=variants).update(
+                    image=renamed[image],
+                    image_variants={variant: renamed[name] for variant, name in variants.items()},
+                    updated_at=timezone.now(),
+                )
+                if not updated:
+                    changed += 1
+                    continue
+                migrated += 1
+                cache.bump_generation(user_id)
+                if not options['keep_old']:
+                    for old, new in renamed.items():
+                        if old != new:
+                            storage.purge(old)
+        self.stdout.write(f'migrated={migrated} changed={changed} missing={missing}')
@@ -0,0 +1,21 @@
+"""Django command to show the recipe response cache statistics"""
+
+from django.core.management.base import BaseCommand
+
+from recipe import cache
+
+
+class Command(BaseCommand):
+    """Django command to show and reset the response cache hit and miss counters"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the counters after showing them')
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        stats = cache.get_stats()
+        total = stats['hits'] + stats['misses']
+        ratio = stats['hits'] / total if total else 0
+        self.stdout.write(f'hits={stats["hits"]} misses={stats["misses"]} hit_ratio={ratio:.2%}')
+        if options['reset']:
+            cache.reset_stats()
@@ -0,0 +1,30 @@
+"""Django command to verify and repair the recipe counts of tags and ingredients"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from core.models import Recipe
+from recipe import cache, counts
+
+
+class Command(BaseCommand):
+    """Recount the recipes of every tag and ingredient and fix the counts that drifted"""
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only report wrong counts, exiting with an error if there are any')
+
+    def handle(self, *args, **options):
+        """Entry point for command"""
+        wrong = 0
+        for field_name in ('tags', 'ingredients'):
+            field = Recipe._meta.get_field(field_name)
+            with transaction.atomic():
+                ids = counts.repair(field, fix=not options['check'])
+                users = field.related_model.objects.filter(id__in=ids).values_list('user_id', flat=True).distinct()
+                if not options['check']:
+                    for user_id in users:
+                        cache.bump_generation(user_id)
+            wrong += len(ids)
+            self.stdout.write(f'{field_name}: wrong={len(ids)}')
+        if options['check'] and wrong:
+            raise CommandError(f'{wrong} wrong recipe counts.')
@@ -0,0 +1,135 @@
+"""
+Delivery of recipe image files.
+
+Image names never change once written, as uploads get a unique or content
+addressed name, so responses are cacheable for good and validated by an
+ETag derived from the name. Once a request is authorised the transfer is
+handed to the front proxy when RECIPE_MEDIA_SENDFILE_HEADER is set,
+otherwise the file is streamed by a FileResponse, which WSGI servers with
+wsgi.file_wrapper send with sendfile().
+"""
+import hashlib
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse
+from django.utils.cache import get_conditional_response, quote_etag
+
+RANGE = re.compile(r'bytes=(\d*)-(\d*)')
+
+
+class RangeNotSatisfiable(Exception):
+    """The requested range has no bytes in the file"""
+
+
+class FileRange:
+    """
+    A file object limited to a byte range. The underlying file is left at
+    the start of the range, so servers that send the file descriptor with
+    sendfile() for Content-Length bytes send only the range.
+    """
+
+    def __init__(self, file, start, length):
+        self.file = file
+        self.remaining = length
+        file.seek(start)
+
+    def read(self, size=-1):
+        """Read up to size bytes without going past the end of the range"""
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        """Return the descriptor of the underlying file"""
+        return self.file.fileno()
+
+    def close(self):
+        """Close the underlying file"""
+        self.file.close()
+
+
+def parse_range(header, size):
+    """
+    Return the first and last byte of a single byte range header, or None
+    to send the whole file for a missing, malformed or multiple range
+    """
+    match = RANGE.fullmatch(header.replace(' ', '')) if header else None
+    if match is None or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        if int(last) == 0:
+            raise RangeNotSatisfiable
+        return max(size - int(last), 0), size - 1
+    if int(first) >= size:
+        raise RangeNotSatisfiable
+    if last and int(last) < int(first):
+        return None
+    return int(first), min(int(last), size - 1) if last else size - 1
+
+
+def etag(name):
+    """Return the ETag of a stored file, which never changes for a name"""
+    return quote_etag(hashlib.sha256(name.encode()).hexdigest()[:32])
+
+
+def _cache_headers(response, tag):
+    """Mark a response as cacheable by the client for as long as allowed"""
+    response['ETag'] = tag
+    response['Cache-Control'] = f'private, max-age={settings.RECIPE_MEDIA_MAX_AGE}, immutable'
+    return response
+
+
+def _offloaded(storage, name, content_type):
+    """Return an empty response telling the front proxy which file to send"""
+    response = HttpResponse(content_type=content_type)
+    if settings.RECIPE_MEDIA_SENDFILE_HEADER == 'X-Accel-Redirect':
+        response['X-Accel-Redirect'] = settings.RECIPE_MEDIA_ACCEL_PREFIX + quote(name)
+    else:
+        response[settings.RECIPE_MEDIA_SENDFILE_HEADER] = storage.path(name)
+    return response
+
+
+def _streamed(request, storage, name, content_type, tag):
+    """Return a response streaming the file, or the requested range of it"""
+    try:
+        file = open(storage.path(name), 'rb')
+    except FileNotFoundError:
+        raise Http404
+    size = os.fstat(file.fileno()).st_size
+    if_range = request.META.get('HTTP_IF_RANGE')
+    try:
+        byte_range = parse_range(request.META.get('HTTP_RANGE'), size) if if_range in (None, tag) else None
+    except RangeNotSatisfiable:
+        file.close()
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    first, last = byte_range or (0, size - 1)
+    response = FileResponse(FileRange(file, first, last - first + 1), content_type=content_type)
+    response['Content-Length'] = last - first + 1
+    response['Accept-Ranges'] = 'bytes'
+    if byte_range:
+        response.status_code = 206
+        response['Content-Range'] = f'bytes {first}-{last}/{size}'
+    return response
+
+
+def serve(request, storage, name):
+    """Return the response for an authorised request for a stored file"""
+    tag = etag(name)
+    response = get_conditional_response(request, etag=tag)
+    if response is not None:
+        return _cache_headers(response, tag)
+    content_type = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+    if settings.RECIPE_MEDIA_SENDFILE_HEADER:
+        response = _offloaded(storage, name, content_type)
+    else:
+        response = _streamed(request, storage, name, content_type, tag)
+    return _cache_headers(response, tag) if response.status_code != 416 else response
@@ -0,0 +1,100 @@
+"""
+Pagination for the recipe API
+"""
+import json
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, _reverse_ordering
+
+
+class RecipeCursorPagination(CursorPagination):
+    """
+    Keyset pagination over recipes, newest first.
+
+    The cursor holds the value of every ordering field of the row it points
+    at, and a page starts after that row compared on all of them, so rows
+    tied on the first field are paged through without an OFFSET. Orderings
+    must end with a field that is unique among the rows paged.
+    """
+    ordering = '-id'
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 500
+
+    def get_ordering(self, request, queryset, view):
+        """
+        Use the ordering the view picked for this request, if any
+        """
+        get_cursor_ordering = getattr(view, 'get_cursor_ordering', None)
+        ordering = get_cursor_ordering() if get_cursor_ordering else None
+        return ordering or super().get_ordering(request, queryset, view)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Return the page of rows after the cursor position in the ordering"""
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        offset, reverse, current_position = self.cursor or (0, False, None)
+
+        ordering = _reverse_ordering(self.ordering) if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if current_position is not None:
+            queryset = queryset.filter(self._after(ordering, current_position))
+
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = results[:self.page_size]
+        has_following_position = len(results) > len(self.page)
+        following_position = (
+            self._get_position_from_instance(results[-1], self.ordering) if has_following_position else None
+        )
+
+        if reverse:
+            self.page.reverse()
+            self.has_next = current_position is not None or offset > 0
+            self.has_previous = has_following_position
+            self.next_position = current_position
+            self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = current_position is not None or offset > 0
+            self.next_position = following_position
+            self.previous_position = current_position
+
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def _after(self, ordering, position):
+        """Return the filter of the rows that come after a position in an ordering"""
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+
+        after = Q()
+        ties = {}
+        for field, value in zip(ordering, values):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            after |= Q(**ties, **{f'{name}__{lookup}': value})
+            ties[name] = value
+        return after
+
+    def _get_position_from_instance(self, instance, ordering):
+        """Return the values of every ordering field of a row, encoded for a cursor"""
+        names = [field.lstrip('-') for field in ordering]
+        if isinstance(instance, dict):
+            return json.dumps([instance[name] for name in names])
+        return json.dumps([getattr(instance, name) for name in names])
+
+
+class RecipeAttrCursorPagination(RecipeCursorPagination):
+    """Keyset pagination over tags and ingredients by name"""
+    ordering = '-name'
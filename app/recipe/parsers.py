@@ -0,0 +1,36 @@
+"""
+Parsers for the recipe API
+"""
+import codecs
+
+from django.conf import settings
+from rest_framework.parsers import BaseParser, MultiPartParser
+
+from recipe.uploads import ImageUploadHandler
+
+
+class NDJSONParser(BaseParser):
+    """
+    Parse newline delimited JSON lazily, returning an iterator over the
+    lines of the body so large uploads are never held in memory at once
+    """
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """Return an iterator over the decoded lines of the stream"""
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', settings.DEFAULT_CHARSET)
+        return codecs.getreader(encoding)(stream)
+
+
+class ImageUploadParser(MultiPartParser):
+    """
+    Parse a multipart image upload, streaming the file through
+    ImageUploadHandler so oversized images are refused early
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        """Parse the form with the image upload handler in place of the default ones"""
+        request = parser_context['request']
+        request.upload_handlers = [ImageUploadHandler(request)]
+        return super().parse(stream, media_type, parser_context)
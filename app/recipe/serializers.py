@@ -1,9 +1,13 @@
 """
 Serializer for recipe API
 """
+from django.db import transaction
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema_field
 from rest_framework import serializers
 
 from core.models import Recipe, Tag, Ingredient
+from recipe import bulk, images
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -20,7 +24,43 @@ class TagSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class IngredientDetailSerializer(IngredientSerializer):
+    """Serializer for ingredients with their number of recipes"""
+
+    class Meta(IngredientSerializer.Meta):
+        fields = IngredientSerializer.Meta.fields + ['recipe_count']
+        read_only_fields = ('id', 'recipe_count')
+
+
+class TagDetailSerializer(TagSerializer):
+    """Serializer for tags with their number of recipes"""
+
+    class Meta(TagSerializer.Meta):
+        fields = TagSerializer.Meta.fields + ['recipe_count']
+        read_only_fields = ['id', 'recipe_count']
+
+
+class SparseFieldsMixin:
+    """
+    Serialize only the fieldset in the sparse_fields context entry.
+    Requested relations that are not expanded are rendered as lists of IDs.
+    """
+
+    def get_fields(self):
+        fields = super().get_fields()
+        sparse_fields = self.context.get('sparse_fields')
+        if sparse_fields is None:
+            return fields
+        requested, expand = sparse_fields
+        for name, field in list(fields.items()):
+            if name not in requested:
+                del fields[name]
+            elif isinstance(field, serializers.ListSerializer) and name not in expand:
+                fields[name] = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+        return fields
+
+
+class RecipeSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     """
     Serializer for recipe objects
     """
@@ -32,60 +72,101 @@ class RecipeSerializer(serializers.ModelSerializer):
         fields = ['id', 'title', 'time_minutes', 'price', 'link', 'tags', 'ingredients']
         read_only_fields = ('id',)
 
-    def _get_or_create_tags(self, tags, recipe):
-        """Gets or creates tags for a recipe"""
-        auth_user = self.context['request'].user
-        for tag in tags:
-            tag_obj, created = Tag.objects.get_or_create(user=auth_user, **tag)
-            recipe.tags.add(tag_obj)
-
-    def _get_or_create_ingredients(self, ingredients, recipe):
-        """Gets or creates ingredients for a recipe"""
-        auth_user = self.context['request'].user
-        for ingredient in ingredients:
-            ingredient_obj, created = Ingredient.objects.get_or_create(user=auth_user, **ingredient)
-            recipe.ingredients.add(ingredient_obj)
+    def _add_related(self, recipe, field_name, items):
+        """Add the tags or ingredients of a payload to a recipe, creating missing names in bulk"""
+        model = Recipe._meta.get_field(field_name).related_model
+        ids = bulk.resolve_names(model, self.context['request'].user, {item['name'] for item in items})
+        if ids:
+            getattr(recipe, field_name).add(*ids.values())
 
     def create(self, validated_data):
         """Creates a recipe"""
         tags = validated_data.pop('tags', [])
         ingredients = validated_data.pop('ingredients', [])
         recipe = Recipe.objects.create(**validated_data)
-        self._get_or_create_tags(tags, recipe)
-        self._get_or_create_ingredients(ingredients, recipe)
+        self._add_related(recipe, 'tags', tags)
+        self._add_related(recipe, 'ingredients', ingredients)
         return recipe
 
+    def _set_related(self, recipe, field_name, items):
+        """
+        Link a recipe to exactly the tags or ingredients of a payload, adding
+        and removing only the links that differ, and return whether any did
+        """
+        model = Recipe._meta.get_field(field_name).related_model
+        ids = set(bulk.resolve_names(model, self.context['request'].user, {item['name'] for item in items}).values())
+        manager = getattr(recipe, field_name)
+        current = {obj.pk for obj in manager.all()}
+        if current - ids:
+            manager.remove(*(current - ids))
+        if ids - current:
+            manager.add(*(ids - current))
+        return current != ids
+
     def update(self, instance, validated_data):
-        """Updates a recipe"""
-        tags = validated_data.pop('tags', None)
-        ingredients = validated_data.pop('ingredients', None)
-        if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(tags, instance)
+        """Updates a recipe, writing only the columns and links that changed"""
+        related = {name: validated_data.pop(name) for name in ('tags', 'ingredients') if name in validated_data}
+        changed = [attr for attr, value in validated_data.items() if getattr(instance, attr) != value]
+        for attr in changed:
+            setattr(instance, attr, validated_data[attr])
+
+        with transaction.atomic():
+            links_changed = [self._set_related(instance, name, items) for name, items in related.items()]
+            if changed:
+                instance.save(update_fields=[*changed, 'updated_at'])
+            elif any(links_changed):
+                # The m2m_changed handlers already bumped updated_at.
+                instance.refresh_from_db(fields=['updated_at'])
+        return instance
 
-        if ingredients is not None:
-            instance.ingredients.clear()
-            self._get_or_create_ingredients(ingredients, instance)
 
-        for attr, value in validated_data.items():
-            setattr(instance, attr, value)
+@extend_schema_field(OpenApiTypes.OBJECT)
+class ImageVariantsField(serializers.Field):
+    """Read only map of variant name to URL for the image variants generated so far"""
 
-        instance.save()
-        return instance
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        storage = Recipe._meta.get_field('image').storage
+        request = self.context.get('request')
+        urls = {variant: storage.url(name) for variant, name in value.items()}
+        if request is not None:
+            urls = {variant: request.build_absolute_uri(url) for variant, url in urls.items()}
+        return urls
 
 
 class RecipeDetailSerializer(RecipeSerializer):
     """Serializer for recipe detail"""
+    image_variants = ImageVariantsField()
+
+    class Meta(RecipeSerializer.Meta):
+        fields = RecipeSerializer.Meta.fields + ['description', 'image', 'image_variants']
+
+
+class RecipeExportSerializer(RecipeSerializer):
+    """Serializer for exported recipes"""
 
     class Meta(RecipeSerializer.Meta):
-        fields = RecipeSerializer.Meta.fields + ['description', 'image']
+        fields = ['id', 'title', 'description', 'time_minutes', 'price', 'link', 'tags', 'ingredients']
 
 
 class RecipeImageSerializer(serializers.ModelSerializer):
     """Serializer for recipe images"""
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Recipe
-        fields = ['id', 'image']
+        fields = ['id', 'image', 'image_variants']
         read_only_fields = ['id']
         extra_kwargs = {'image': {'required': True}}
+
+    def update(self, instance, validated_data):
+        """Store the original image and queue the generation of its variants"""
+        stale = list(instance.image_variants.values())
+        instance.image_variants = {}
+        with transaction.atomic():
+            instance = super().update(instance, validated_data)
+            images.schedule_variants(instance, stale)
+        return instance
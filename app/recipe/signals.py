@@ -0,0 +1,95 @@
+"""
+Signal handlers for the recipe app
+"""
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.models import Recipe, Tag, Ingredient
+from recipe import cache, counts
+
+RECIPE_FIELDS = {
+    Tag: 'tags',
+    Ingredient: 'ingredients',
+    Recipe.tags.through: 'tags',
+    Recipe.ingredients.through: 'ingredients',
+}
+
+
+def _touch_recipes(**filters):
+    """Bump updated_at of recipes whose nested tags or ingredients changed"""
+    Recipe.objects.filter(**filters).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_cached_responses(sender, instance, **kwargs):
+    """Invalidate the cached responses of the owner of a changed object"""
+    cache.bump_generation(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def invalidate_cached_responses_on_m2m(sender, instance, action, **kwargs):
+    """Invalidate the cached responses when recipe tags or ingredients change"""
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        cache.bump_generation(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def touch_recipes_on_m2m(sender, instance, action, reverse, pk_set, **kwargs):
+    """Mark recipes modified when tags or ingredients are added or removed"""
+    if not reverse and (action == 'post_clear' or action in ('post_add', 'post_remove') and pk_set):
+        _touch_recipes(pk=instance.pk)
+    elif reverse and action in ('post_add', 'post_remove') and pk_set:
+        _touch_recipes(pk__in=pk_set)
+    elif reverse and action == 'pre_clear':
+        _touch_recipes(**{RECIPE_FIELDS[sender]: instance})
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def touch_recipes_on_attr_change(sender, instance, created=False, **kwargs):
+    """Mark recipes modified when one of their tags or ingredients is renamed or deleted"""
+    if not created:
+        _touch_recipes(**{RECIPE_FIELDS[sender]: instance})
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def update_recipe_counts(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """Keep the recipe counts of tags and ingredients in step with their links"""
+    if reverse:
+        attr = type(instance).objects.filter(pk=instance.pk)
+        if action == 'post_add' and pk_set:
+            attr.update(recipe_count=F('recipe_count') + len(pk_set))
+        elif action == 'pre_remove' and pk_set:
+            related_name = Recipe._meta.get_field(RECIPE_FIELDS[sender]).m2m_reverse_field_name()
+            links = sender.objects.filter(**{related_name: instance, 'recipe_id__in': pk_set})
+            attr.update(recipe_count=F('recipe_count') - links.count())
+        elif action == 'post_clear':
+            attr.update(recipe_count=0)
+    elif action == 'post_add' and pk_set:
+        model.objects.filter(pk__in=pk_set).update(recipe_count=F('recipe_count') + 1)
+    elif action == 'pre_remove' and pk_set:
+        # pk_set holds every ID passed to remove(), linked or not.
+        model.objects.filter(pk__in=pk_set, recipe=instance).update(recipe_count=F('recipe_count') - 1)
+    elif action == 'pre_clear':
+        model.objects.filter(recipe=instance).update(recipe_count=F('recipe_count') - 1)
+
+
+@receiver(pre_delete, sender=Recipe)
+def update_recipe_counts_on_delete(sender, instance, **kwargs):
+    """Remove a deleted recipe from the counts of its tags and ingredients"""
+    if counts.is_adjusted_in_bulk():
+        return
+    for model in (Tag, Ingredient):
+        model.objects.filter(recipe=instance).update(recipe_count=F('recipe_count') - 1)
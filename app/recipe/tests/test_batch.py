@@ -0,0 +1,179 @@
+"""
+Tests for batch writes on the recipe API
+"""
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+
+RECIPE_URL = reverse('recipe:recipe-list')
+BATCH_URL = reverse('recipe:recipe-batch')
+
+
+def create_recipe(user, **params):
+    """Create and return a recipe"""
+    defaults = {'title': 'Sample recipe', 'time_minutes': 10, 'price': Decimal('5.25')} | params
+    return Recipe.objects.create(user=user, **defaults)
+
+
+def recipe_payload(title='Bean stew', **params):
+    """Return the payload of a new recipe"""
+    return {'title': title, 'time_minutes': 30, 'price': '4.50', 'tags': [{'name': 'Vegan'}]} | params
+
+
+class RecipeBatchTests(TestCase):
+    """Test batch create, update and delete"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='testpass123')
+        self.client.force_authenticate(self.user)
+
+    def test_batch_create(self):
+        """Test posting a list creates every recipe with its tags"""
+        res = self.client.post(RECIPE_URL, [recipe_payload('Bean stew'), recipe_payload('Soup')], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipes = Recipe.objects.filter(user=self.user)
+        self.assertEqual([result['id'] for result in res.data['results']],
+                         list(recipes.order_by('id').values_list('id', flat=True)))
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(recipes.filter(tags__name='Vegan').count(), 2)
+
+    def test_batch_create_atomic(self):
+        """Test nothing is created when an item of an atomic batch is invalid"""
+        res = self.client.post(RECIPE_URL, [recipe_payload(), recipe_payload(price='abc')], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([result['status'] for result in res.data['results']], [424, 400])
+        self.assertIn('price', res.data['results'][1]['errors'])
+        self.assertFalse(Recipe.objects.exists())
+
+    def test_batch_create_best_effort(self):
+        """Test the valid items of a best effort batch are created"""
+        url = f'{RECIPE_URL}?mode=best_effort'
+        res = self.client.post(url, [recipe_payload(title=''), recipe_payload('Soup')], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual([result['status'] for result in res.data['results']], [400, 201])
+        self.assertEqual(list(Recipe.objects.values_list('title', flat=True)), ['Soup'])
+
+    def test_batch_create_query_count_independent_of_size(self):
+        """Test a batch is written with a fixed number of queries"""
+        def count_queries(size, prefix):
+            payload = [recipe_payload(f'{prefix} {i}', tags=[{'name': f'{prefix} tag {i}'}]) for i in range(size)]
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.post(RECIPE_URL, payload, format='json')
+            return len(ctx.captured_queries)
+
+        self.assertEqual(count_queries(2, 'few'), count_queries(20, 'many'))
+
+    def test_batch_update(self):
+        """Test patching a list updates each recipe and replaces the tags given"""
+        stew = create_recipe(self.user, title='Stew')
+        soup = create_recipe(self.user, title='Soup')
+        soup.tags.add(Tag.objects.create(user=self.user, name='Old'))
+        modified = Recipe.objects.get(id=soup.id).updated_at
+        payload = [{'id': stew.id, 'time_minutes': 45}, {'id': soup.id, 'title': 'Pea soup', 'tags': [{'name': 'New'}]}]
+
+        res = self.client.patch(BATCH_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        stew.refresh_from_db()
+        soup.refresh_from_db()
+        self.assertEqual((stew.title, stew.time_minutes), ('Stew', 45))
+        self.assertEqual(soup.title, 'Pea soup')
+        self.assertEqual(list(soup.tags.values_list('name', flat=True)), ['New'])
+        self.assertGreater(soup.updated_at, modified)
+
+    def test_batch_update_keeps_unchanged_links(self):
+        """Test replacing the tags of recipes only writes the links that differ"""
+        recipe = create_recipe(self.user)
+        recipe.tags.add(*(Tag.objects.create(user=self.user, name=name) for name in ('Vegan', 'Old')))
+        links = Recipe.tags.through.objects.filter(recipe=recipe)
+        kept = links.get(tag__name='Vegan').id
+
+        self.client.patch(BATCH_URL, [{'id': recipe.id, 'tags': [{'name': 'Vegan'}, {'name': 'New'}]}], format='json')
+
+        self.assertEqual(sorted(links.values_list('tag__name', flat=True)), ['New', 'Vegan'])
+        self.assertEqual(links.get(tag__name='Vegan').id, kept)
+
+    def test_batch_update_atomic(self):
+        """Test nothing is updated when an item refers to another user's recipe"""
+        recipe = create_recipe(self.user, title='Stew')
+        other_user = get_user_model().objects.create_user(email='other@example.com', password='testpass123')
+        other_recipe = create_recipe(other_user)
+
+        res = self.client.patch(BATCH_URL, [{'id': recipe.id, 'title': 'New'}, {'id': other_recipe.id}], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([result['status'] for result in res.data['results']], [424, 404])
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.title, 'Stew')
+
+    def test_batch_update_invalidates_cache(self):
+        """Test a batch update shows up in a previously cached list"""
+        recipe = create_recipe(self.user, title='Stew')
+        self.client.get(RECIPE_URL)
+
+        self.client.patch(BATCH_URL, [{'id': recipe.id, 'title': 'Curry'}], format='json')
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['results'][0]['title'], 'Curry')
+
+    def test_batch_delete(self):
+        """Test deleting by ID list in best effort mode reports missing IDs"""
+        recipes = [create_recipe(self.user) for _ in range(3)]
+        ids = f'{recipes[0].id},{recipes[2].id},999999'
+
+        res = self.client.delete(f'{BATCH_URL}?ids={ids}&mode=best_effort')
+
+        self.assertEqual(res.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual([result['status'] for result in res.data['results']], [204, 204, 404])
+        self.assertEqual(list(Recipe.objects.values_list('id', flat=True)), [recipes[1].id])
+
+    def test_batch_delete_query_count_independent_of_size(self):
+        """Test a batch is deleted with a fixed number of queries and one cache invalidation"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+
+        def count_queries(size):
+            recipes = [create_recipe(self.user) for _ in range(size)]
+            for recipe in recipes:
+                recipe.tags.add(tag)
+            ids = ','.join(str(recipe.id) for recipe in recipes)
+            with patch('recipe.cache.bump_generation') as bump, CaptureQueriesContext(connection) as ctx:
+                self.client.delete(f'{BATCH_URL}?ids={ids}')
+            self.assertEqual(bump.call_count, 1)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(count_queries(2), count_queries(20))
+        self.assertFalse(Recipe.objects.exists())
+        tag.refresh_from_db()
+        self.assertEqual(tag.recipe_count, 0)
+
+    def test_batch_delete_atomic(self):
+        """Test nothing is deleted when an ID of an atomic batch is missing"""
+        recipe = create_recipe(self.user)
+
+        res = self.client.delete(f'{BATCH_URL}?ids={recipe.id},999999')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertTrue(Recipe.objects.filter(id=recipe.id).exists())
+
+    def test_batch_invalid_mode(self):
+        """Test an unknown mode returns a 400"""
+        res = self.client.post(f'{RECIPE_URL}?mode=some', [recipe_payload()], format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Recipe.objects.exists())
@@ -0,0 +1,153 @@
+"""
+Tests for the recipe API response cache
+"""
+import tempfile
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache as default_cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+from recipe import cache
+
+RECIPE_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def create_recipe(user, **params):
+    """Create and return a recipe"""
+    defaults = {'title': 'Sample recipe', 'time_minutes': 10, 'price': Decimal('5.25')} | params
+    return Recipe.objects.create(user=user, **defaults)
+
+
+def create_user(**params):
+    """Create and return a user"""
+    return get_user_model().objects.create_user(**params)
+
+
+class ResponseCacheTests(TestCase):
+    """Test caching of list responses"""
+
+    def setUp(self):
+        default_cache.clear()
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='testpass123')
+        self.client.force_authenticate(self.user)
+
+    def test_repeated_list_is_cached(self):
+        """Test listing twice serves the second response from the cache"""
+        create_recipe(user=self.user)
+
+        res1 = self.client.get(RECIPE_URL)
+        with self.assertNumQueries(0):
+            res2 = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res1['X-Cache'], 'MISS')
+        self.assertEqual(res2['X-Cache'], 'HIT')
+        self.assertEqual(res1.data, res2.data)
+        self.assertEqual(cache.get_stats(), {'hits': 1, 'misses': 1})
+
+    def test_query_params_are_normalized(self):
+        """Test query params in a different order share a cache entry"""
+        self.client.get(RECIPE_URL, {'page_size': 5, 'match': 'any'})
+        res = self.client.get(f'{RECIPE_URL}?match=any&page_size=5')
+
+        self.assertEqual(res['X-Cache'], 'HIT')
+
+    def test_create_invalidates_cache(self):
+        """Test creating a recipe invalidates the cached list"""
+        self.client.get(RECIPE_URL)
+        self.client.post(RECIPE_URL, {'title': 'Soup', 'time_minutes': 5, 'price': '2.00'})
+
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_m2m_change_invalidates_cache(self):
+        """Test adding a tag to a recipe invalidates the cached lists"""
+        recipe = create_recipe(user=self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.client.get(RECIPE_URL)
+
+        recipe.tags.add(tag)
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['results'][0]['tags'], [{'id': tag.id, 'name': tag.name}])
+
+    def test_tag_delete_invalidates_cache(self):
+        """Test deleting a tag invalidates the cached tag list"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.client.get(TAGS_URL)
+
+        tag.delete()
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.data['results'], [])
+
+    def test_generation_bumped_again_on_commit(self):
+        """Test a list cached before a write commits is not served after the commit"""
+        with self.captureOnCommitCallbacks() as callbacks:
+            create_recipe(user=self.user)
+            # Stands in for a concurrent request, which would cache the
+            # list without the uncommitted recipe.
+            cached = self.client.get(RECIPE_URL)
+
+        for callback in callbacks:
+            callback()
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(cached['X-Cache'], 'MISS')
+        self.assertEqual(res['X-Cache'], 'MISS')
+
+    def test_cache_is_per_user(self):
+        """Test users never receive each other's cached responses"""
+        other_user = create_user(email='other@example.com', password='testpass123')
+        create_recipe(user=other_user)
+        other_client = APIClient()
+        other_client.force_authenticate(other_user)
+        other_client.get(RECIPE_URL)
+
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(res.data['results'], [])
+
+    def test_file_based_cache(self):
+        """Test the response cache works with the file based backend"""
+        with tempfile.TemporaryDirectory() as cache_dir:
+            caches = {'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                                  'LOCATION': cache_dir}}
+            with override_settings(CACHES=caches):
+                create_recipe(user=self.user)
+                self.client.get(RECIPE_URL)
+                res = self.client.get(RECIPE_URL)
+                self.assertEqual(res['X-Cache'], 'HIT')
+
+                create_recipe(user=self.user)
+                res = self.client.get(RECIPE_URL)
+                self.assertEqual(res['X-Cache'], 'MISS')
+                self.assertEqual(len(res.data['results']), 2)
+
+    def test_evicted_generation_never_reused(self):
+        """Test losing the generation counter does not resurrect old entries"""
+        generation = cache.get_generation(self.user.id)
+        default_cache.delete(cache.GENERATION_KEY.format(user_id=self.user.id))
+
+        self.assertNotEqual(cache.get_generation(self.user.id), generation)
+
+    def test_stats_command(self):
+        """Test the stats command reports and resets the counters"""
+        self.client.get(RECIPE_URL)
+        self.client.get(RECIPE_URL)
+
+        with tempfile.TemporaryFile('w+') as out:
+            call_command('recipe_cache_stats', '--reset', stdout=out)
+            out.seek(0)
+            self.assertIn('hits=1 misses=1', out.read())
+        self.assertEqual(cache.get_stats(), {'hits': 0, 'misses': 0})
@@ -0,0 +1,118 @@
+"""
+Test the recipe management commands
+"""
+import os
+import tempfile
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+
+from core.models import Recipe
+from core.storage import ContentAddressedStorage
+
+
+class BenchmarkCommandTests(TestCase):
+    """Test the benchmark commands run end to end on small datasets"""
+
+    def test_benchmark_search(self):
+        """Test the search benchmark reports a timing per size and query"""
+        out = StringIO()
+        call_command('benchmark_search', sizes='30,60', repeat=1, stdout=out)
+
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 1 + 2 * 3)
+        self.assertFalse(get_user_model().objects.filter(email='benchmark-search@example.com').exists())
+
+    def test_benchmark_list(self):
+        """Test the list benchmark reports identical output for each size"""
+        out = StringIO()
+        call_command('benchmark_list', sizes='20,40', repeat=1, stdout=out)
+
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 1 + 2)
+        self.assertTrue(all(line.endswith('True') for line in lines[1:]))
+        self.assertFalse(get_user_model().objects.filter(email='benchmark-list@example.com').exists())
+
+    def test_import_recipes(self):
+        """Test the import command reads an NDJSON file for a user"""
+        user = get_user_model().objects.create_user(email='user@example.com', password='testpass123')
+        out, err = StringIO(), StringIO()
+        with tempfile.NamedTemporaryFile('w', suffix='.ndjson') as ndjson:
+            ndjson.write('{"title": "Soup", "time_minutes": 5, "price": "2.00", "tags": [{"name": "Quick"}]}\n')
+            ndjson.write('{"title": "Broken"}\n')
+            ndjson.flush()
+            call_command('import_recipes', user.email, ndjson.name, stdout=out, stderr=err)
+
+        self.assertIn('created=1 errors=1', out.getvalue())
+        self.assertIn('line 2:', err.getvalue())
+        self.assertEqual(user.recipe_set.get().tags.get().name, 'Quick')
+
+
+class ImageStorageCommandTests(TestCase):
+    """Test moving images into the content addressed storage and collecting garbage"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.storage = ContentAddressedStorage(location=self.directory.name)
+        patcher = patch.object(Recipe._meta.get_field('image'), 'storage', self.storage)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.directory.cleanup)
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='testpass123')
+
+    def _create_recipe(self, image=None, **variants):
+        """Create a recipe whose image and variants are stored under the given names"""
+        return Recipe.objects.create(
+            user=self.user, title='Soup', time_minutes=5, price=Decimal('4.50'), image=image, image_variants=variants,
+        )
+
+    def test_migrate(self):
+        """Test identical legacy images end up as one shared file"""
+        legacy = FileSystemStorage(location=self.directory.name)
+        names = [legacy.save(f'uploads/recipe/{i}.jpg', ContentFile(b'image')) for i in range(2)]
+        thumbnail = legacy.save('uploads/recipe/0_thumbnail.jpg', ContentFile(b'small'))
+        first = self._create_recipe(names[0], thumbnail=thumbnail)
+        second = self._create_recipe(names[1])
+        out = StringIO()
+
+        call_command('migrate_recipe_images', stdout=out)
+
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertIn('migrated=2 changed=0 missing=0', out.getvalue())
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(self.storage.is_content_name(first.image_variants['thumbnail']))
+        self.assertFalse(any(legacy.exists(name) for name in names + [thumbnail]))
+        with self.storage.open(first.image_variants['thumbnail']) as stored:
+            self.assertEqual(stored.read(), b'small')
+
+    def test_gc(self):
+        """Test only old files without references are deleted"""
+        referenced = self.storage.save('uploads/recipe/a.jpg', ContentFile(b'image'))
+        variant = self.storage.save('uploads/recipe/b.jpg', ContentFile(b'small'))
+        orphan = self.storage.save('uploads/recipe/c.jpg', ContentFile(b'orphan'))
+        recent = self.storage.save('uploads/recipe/d.jpg', ContentFile(b'recent'))
+        self._create_recipe(referenced, thumbnail=variant)
+        for name in (referenced, variant, orphan):
+            os.utime(self.storage.path(name), (0, 0))
+        out = StringIO()
+
+        call_command('gc_recipe_images', stdout=out)
+
+        self.assertIn('kept=3 deleted=1', out.getvalue())
+        self.assertEqual([self.storage.exists(name) for name in (referenced, variant, orphan, recent)],
+                         [True, True, False, True])
+
+    def test_requires_content_addressed_storage(self):
+        """Test the commands refuse to run on another storage"""
+        with patch.object(Recipe._meta.get_field('image'), 'storage', FileSystemStorage()):
+            for command in ('gc_recipe_images', 'migrate_recipe_images'):
+                with self.assertRaises(CommandError):
+                    call_command(command, stdout=StringIO())
@@ -0,0 +1,167 @@
+"""
+Tests for conditional requests on the recipe API
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.http import http_date
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag
+
+RECIPE_URL = reverse('recipe:recipe-list')
+
+
+def detail_url(recipe_id):
+    """Return recipe detail URL"""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def create_recipe(user, **params):
+    """Create and return a recipe"""
+    defaults = {'title': 'Sample recipe', 'time_minutes': 10, 'price': Decimal('5.25')} | params
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class ConditionalRequestTests(TestCase):
+    """Test ETag and Last-Modified handling"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='testpass123')
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(user=self.user)
+
+    def test_detail_has_validators(self):
+        """Test retrieving a recipe returns an ETag and Last-Modified"""
+        res = self.client.get(detail_url(self.recipe.id))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertTrue(res['ETag'].startswith('"'))
+        self.assertEqual(res['Last-Modified'], http_date(int(self.recipe.updated_at.timestamp())))
+
+    def test_detail_not_modified(self):
+        """Test a matching If-None-Match returns 304 with a single cheap query"""
+        etag = self.client.get(detail_url(self.recipe.id))['ETag']
+
+        with self.assertNumQueries(1):
+            res = self.client.get(detail_url(self.recipe.id), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], etag)
+
+    def test_detail_if_modified_since(self):
+        """Test If-Modified-Since returns 304 while the recipe is unchanged"""
+        last_modified = self.client.get(detail_url(self.recipe.id))['Last-Modified']
+
+        res = self.client.get(detail_url(self.recipe.id), HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_detail_etag_changes_on_update(self):
+        """Test updating a recipe changes its ETag"""
+        etag = self.client.get(detail_url(self.recipe.id))['ETag']
+        self.client.patch(detail_url(self.recipe.id), {'title': 'New title'})
+
+        res = self.client.get(detail_url(self.recipe.id), HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['title'], 'New title')
+
+    def test_detail_etag_changes_on_tag_changes(self):
+        """Test adding or renaming a tag changes the recipe ETag"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        etag1 = self.client.get(detail_url(self.recipe.id))['ETag']
+
+        self.recipe.tags.add(tag)
+        etag2 = self.client.get(detail_url(self.recipe.id))['ETag']
+        tag.name = 'Vegetarian'
+        tag.save()
+        res = self.client.get(detail_url(self.recipe.id), HTTP_IF_NONE_MATCH=etag2)
+
+        self.assertNotEqual(etag1, etag2)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['tags'][0]['name'], 'Vegetarian')
+
+    def test_update_with_stale_if_match(self):
+        """Test an update with a stale If-Match is refused"""
+        etag = self.client.get(detail_url(self.recipe.id))['ETag']
+        self.client.patch(detail_url(self.recipe.id), {'title': 'First'})
+
+        res = self.client.patch(detail_url(self.recipe.id), {'title': 'Second'}, HTTP_IF_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.title, 'First')
+
+    def test_update_with_current_if_match(self):
+        """Test an update with a current If-Match succeeds and returns the new ETag"""
+        etag = self.client.get(detail_url(self.recipe.id))['ETag']
+
+        res = self.client.patch(detail_url(self.recipe.id), {'title': 'New title'}, HTTP_IF_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+        self.assertEqual(self.client.get(detail_url(self.recipe.id))['ETag'], res['ETag'])
+
+    def test_if_match_locks_until_write(self):
+        """Test the version checked for an If-Match update is locked, but not the one of a GET"""
+        etag = self.client.get(detail_url(self.recipe.id))['ETag']
+
+        with CaptureQueriesContext(connection) as write:
+            self.client.patch(detail_url(self.recipe.id), {'title': 'New title'}, HTTP_IF_MATCH=etag)
+        with CaptureQueriesContext(connection) as read:
+            self.client.get(detail_url(self.recipe.id), HTTP_IF_NONE_MATCH=etag)
+
+        selects = [[q['sql'] for q in ctx.captured_queries if q['sql'].startswith('SELECT')] for ctx in (write, read)]
+        self.assertIn('FOR UPDATE', selects[0][0])
+        self.assertNotIn('FOR UPDATE', selects[1][0])
+
+    def test_invalid_id_with_precondition_not_found(self):
+        """Test a non-numeric id with a precondition header is a 404 rather than an error"""
+        url = reverse('recipe:recipe-detail', args=['abc'])
+
+        res_get = self.client.get(url, HTTP_IF_NONE_MATCH='"x"')
+        res_patch = self.client.patch(url, {'title': 'New title'}, HTTP_IF_MATCH='"x"')
+
+        self.assertEqual(res_get.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(res_patch.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_missing_recipe_with_if_match_not_found(self):
+        """Test an If-Match update of a recipe that does not exist is a 404"""
+        res = self.client.patch(detail_url(self.recipe.id + 1000), {'title': 'New title'}, HTTP_IF_MATCH='"x"')
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_not_modified(self):
+        """Test a matching If-None-Match on the list returns 304 without queries"""
+        etag = self.client.get(RECIPE_URL)['ETag']
+
+        with self.assertNumQueries(0):
+            res = self.client.get(RECIPE_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_list_etag_changes_on_write(self):
+        """Test creating a recipe changes the list ETag"""
+        etag = self.client.get(RECIPE_URL)['ETag']
+        create_recipe(user=self.user)
+
+        res = self.client.get(RECIPE_URL, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(res.data['results']), 2)
+
+    def test_list_etag_depends_on_query(self):
+        """Test different query params get different ETags"""
+        etag1 = self.client.get(RECIPE_URL)['ETag']
+        etag2 = self.client.get(RECIPE_URL, {'page_size': 1})['ETag']
+
+        self.assertNotEqual(etag1, etag2)
@@ -0,0 +1,158 @@
+"""
+Tests for the recipe counts of tags and ingredients
+"""
+import json
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+from recipe import counts
+
+RECIPE_URL = reverse('recipe:recipe-list')
+BATCH_URL = reverse('recipe:recipe-batch')
+IMPORT_URL = reverse('recipe:recipe-import')
+TAGS_URL = reverse('recipe:tag-list')
+INGREDIENTS_URL = reverse('recipe:ingredient-list')
+
+
+def detail_url(recipe_id):
+    """Create and return a recipe detail URL"""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def create_recipe(user, **params):
+    """Create and return a recipe"""
+    defaults = {'title': 'Sample recipe', 'time_minutes': 10, 'price': Decimal('5.25')} | params
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class RecipeCountTests(TestCase):
+    """Test the counts follow every way recipes are linked and unlinked"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='testpass123')
+        self.client.force_authenticate(self.user)
+
+    def assertCountsCorrect(self):
+        """Assert every count matches the number of links"""
+        for field_name in ('tags', 'ingredients'):
+            self.assertEqual(counts.repair(Recipe._meta.get_field(field_name), fix=False), [])
+
+    def _count(self, model, name):
+        """Return the recipe count of one of the user's tags or ingredients"""
+        return model.objects.get(user=self.user, name=name).recipe_count
+
+    def test_counts_follow_api_writes(self):
+        """Test creating, updating and deleting recipes through the API"""
+        payload = {'title': 'Stew', 'time_minutes': 5, 'price': '4.50',
+                   'tags': [{'name': 'Vegan'}, {'name': 'Quick'}], 'ingredients': [{'name': 'Beans'}]}
+        first = self.client.post(RECIPE_URL, payload, format='json').data['id']
+        second = self.client.post(RECIPE_URL, payload, format='json').data['id']
+        self.assertEqual(self._count(Tag, 'Vegan'), 2)
+
+        self.client.patch(detail_url(first), {'tags': [{'name': 'Vegan'}, {'name': 'Slow'}]}, format='json')
+        self.assertEqual((self._count(Tag, 'Quick'), self._count(Tag, 'Slow')), (1, 1))
+
+        self.client.patch(detail_url(second), {'ingredients': []}, format='json')
+        self.client.delete(detail_url(first))
+
+        self.assertEqual((self._count(Tag, 'Vegan'), self._count(Ingredient, 'Beans')), (1, 0))
+        self.assertCountsCorrect()
+
+    def test_counts_follow_orm_writes(self):
+        """Test links written from either side of the relation"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        recipes = [create_recipe(self.user) for _ in range(3)]
+        recipes[0].tags.add(tag)
+        recipes[0].tags.remove(tag, Tag.objects.create(user=self.user, name='Other'))
+        tag.recipe_set.add(*recipes)
+        tag.recipe_set.remove(recipes[0])
+        recipes[1].tags.clear()
+        self.assertEqual(self._count(Tag, 'Vegan'), 1)
+
+        tag.recipe_set.clear()
+
+        self.assertEqual(self._count(Tag, 'Vegan'), 0)
+        self.assertCountsCorrect()
+
+    def test_counts_follow_bulk_writes(self):
+        """Test the import and batch endpoints"""
+        line = json.dumps({'title': 'Soup', 'time_minutes': 5, 'price': '4.50', 'tags': [{'name': 'Vegan'}]})
+        self.client.generic('POST', IMPORT_URL, f'{line}\n{line}\n', content_type='application/x-ndjson')
+        created = self.client.post(RECIPE_URL, [{'title': 'Stew', 'time_minutes': 5, 'price': '4.50',
+                                                 'tags': [{'name': 'Vegan'}]}], format='json')
+        recipe_id = created.data['results'][0]['id']
+        self.assertEqual(self._count(Tag, 'Vegan'), 3)
+
+        self.client.patch(BATCH_URL, [{'id': recipe_id, 'tags': [{'name': 'Quick'}]}], format='json')
+        self.assertEqual((self._count(Tag, 'Vegan'), self._count(Tag, 'Quick')), (2, 1))
+
+        ids = ','.join(str(pk) for pk in Recipe.objects.values_list('id', flat=True))
+        self.client.delete(f'{BATCH_URL}?ids={ids}')
+
+        self.assertEqual((self._count(Tag, 'Vegan'), self._count(Tag, 'Quick')), (0, 0))
+        self.assertCountsCorrect()
+
+    def test_list_by_count(self):
+        """Test the recipe_count field, min_count and ordering by count"""
+        vegan, quick, _ = (Tag.objects.create(user=self.user, name=name) for name in ('Vegan', 'Quick', 'Unused'))
+        for i in range(3):
+            create_recipe(self.user).tags.add(vegan, *([quick] if i else []))
+
+        res = self.client.get(TAGS_URL, {'ordering': '-recipe_count', 'min_count': 1})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([(tag['name'], tag['recipe_count']) for tag in res.data['results']],
+                         [('Vegan', 3), ('Quick', 2)])
+
+    def test_list_invalid_params(self):
+        """Test an unknown ordering or a non-numeric min_count or assigned_only returns a 400"""
+        for params in ({'ordering': 'name'}, {'min_count': 'many'}, {'assigned_only': 'yes'}):
+            res = self.client.get(INGREDIENTS_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RepairRecipeCountsCommandTests(TestCase):
+    """Test the repair_recipe_counts command"""
+
+    def test_repair(self):
+        """Test wrong counts are reported by --check and then corrected"""
+        user = get_user_model().objects.create_user(email='user@example.com', password='testpass123')
+        tag = Tag.objects.create(user=user, name='Vegan')
+        create_recipe(user).tags.add(tag)
+        Tag.objects.filter(id=tag.id).update(recipe_count=7)
+
+        with self.assertRaises(CommandError):
+            call_command('repair_recipe_counts', check=True, stdout=StringIO())
+        out = StringIO()
+        call_command('repair_recipe_counts', stdout=out)
+
+        self.assertIn('tags: wrong=1', out.getvalue())
+        tag.refresh_from_db()
+        self.assertEqual(tag.recipe_count, 1)
+
+    def test_repair_locks_out_count_updates(self):
+        """Test repairing locks the table against concurrent count updates before recounting"""
+        with CaptureQueriesContext(connection) as ctx:
+            counts.repair(Recipe._meta.get_field('tags'))
+        with CaptureQueriesContext(connection) as check:
+            counts.repair(Recipe._meta.get_field('tags'), fix=False)
+
+        statements = [query['sql'] for query in ctx.captured_queries if 'core_tag' in query['sql']]
+        self.assertTrue(statements[0].startswith('LOCK TABLE "core_tag" IN SHARE ROW EXCLUSIVE MODE'))
+        self.assertTrue(statements[1].startswith('UPDATE'))
+        self.assertFalse(any('LOCK' in query['sql'] for query in check.captured_queries))
@@ -0,0 +1,122 @@
+"""
+Tests for the recipe export API
+"""
+import json
+import os
+import unittest
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+
+EXPORT_URL = reverse('recipe:recipe-export')
+LARGE_EXPORT = 100_000
+MEMORY_CEILING = 50 * 1024 * 1024
+STATM_PATH = '/proc/self/statm'
+
+
+def create_recipe(user, **params):
+    """Create and return a recipe"""
+    defaults = {'title': 'Sample recipe', 'time_minutes': 10, 'price': Decimal('5.25')} | params
+    return Recipe.objects.create(user=user, **defaults)
+
+
+def resident_memory():
+    """Return the resident memory of this process in bytes"""
+    with open(STATM_PATH) as statm:
+        return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+class RecipeExportTests(TestCase):
+    """Test streaming a user's recipes"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='testpass123')
+        self.client.force_authenticate(self.user)
+
+    def _export(self, params=None):
+        """Return the response and the streamed body of an export"""
+        res = self.client.get(EXPORT_URL, params)
+        return res, b''.join(res.streaming_content)
+
+    def test_export_json(self):
+        """Test exporting a JSON array of recipes with their tags and ingredients"""
+        recipe = create_recipe(user=self.user, description='Slow cooked')
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+        recipe.ingredients.add(Ingredient.objects.create(user=self.user, name='Beans'))
+        other_user = get_user_model().objects.create_user(email='other@example.com', password='testpass123')
+        create_recipe(user=other_user)
+
+        res, body = self._export()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], 'application/json')
+        self.assertEqual(json.loads(body), [{
+            'id': recipe.id, 'title': 'Sample recipe', 'description': 'Slow cooked', 'time_minutes': 10,
+            'price': '5.25', 'link': '', 'tags': [{'id': recipe.tags.get().id, 'name': 'Vegan'}],
+            'ingredients': [{'id': recipe.ingredients.get().id, 'name': 'Beans'}],
+        }])
+
+    def test_export_ndjson(self):
+        """Test exporting one JSON document per line, across chunks"""
+        for i in range(5):
+            create_recipe(user=self.user, title=f'Recipe {i}')
+
+        res, body = self._export({'output': 'ndjson'})
+        lines = body.decode().splitlines()
+
+        self.assertEqual(res['Content-Type'], 'application/x-ndjson')
+        self.assertEqual([json.loads(line)['title'] for line in lines], [f'Recipe {i}' for i in range(4, -1, -1)])
+
+    def test_export_empty(self):
+        """Test exporting an empty library returns an empty array"""
+        res, body = self._export()
+
+        self.assertEqual(json.loads(body), [])
+
+    def test_export_filtered(self):
+        """Test the list filters apply to the export"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        create_recipe(user=self.user, title='Bean stew').tags.add(tag)
+        create_recipe(user=self.user, title='Steak')
+
+        res, body = self._export({'tags': tag.id})
+
+        self.assertEqual([recipe['title'] for recipe in json.loads(body)], ['Bean stew'])
+
+    def test_export_invalid_output(self):
+        """Test an unknown output format returns a 400"""
+        res = self.client.get(EXPORT_URL, {'output': 'xml'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @unittest.skipUnless(os.path.exists(STATM_PATH), 'needs /proc to read resident memory')
+    def test_export_memory_ceiling(self):
+        """Test exporting a large library stays under a fixed memory ceiling"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "INSERT INTO core_recipe (user_id, title, description, time_minutes, price, link, updated_at) "
+                "SELECT %s, 'Recipe ' || i, '', 10, 5.25, '', now() FROM generate_series(1, %s) AS i",
+                [self.user.id, LARGE_EXPORT],
+            )
+            cursor.execute(
+                'INSERT INTO core_recipe_tags (recipe_id, tag_id) SELECT id, %s FROM core_recipe WHERE user_id = %s',
+                [tag.id, self.user.id],
+            )
+
+        count = 0
+        baseline = peak = resident_memory()
+        for chunk in self.client.get(EXPORT_URL, {'output': 'ndjson'}).streaming_content:
+            count += chunk.count(b'\n')
+            peak = max(peak, resident_memory())
+
+        self.assertEqual(count, LARGE_EXPORT)
+        self.assertLess(peak - baseline, MEMORY_CEILING)
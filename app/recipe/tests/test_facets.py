@@ -0,0 +1,124 @@
+"""
+Tests for the recipe facets API
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+
+FACETS_URL = reverse('recipe:recipe-facets')
+RECIPE_URL = reverse('recipe:recipe-list')
+
+
+def create_recipe(user, **params):
+    """Create and return a recipe"""
+    defaults = {'title': 'Sample recipe', 'time_minutes': 10, 'price': Decimal('5.25')} | params
+    return Recipe.objects.create(user=user, **defaults)
+
+
+class RecipeFacetsTests(TestCase):
+    """Test counting recipes by tag, ingredient and histogram bucket"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='testpass123')
+        self.client.force_authenticate(self.user)
+        self.vegan, self.quick, self.slow = (
+            Tag.objects.create(user=self.user, name=name) for name in ('Vegan', 'Quick', 'Slow')
+        )
+        self.beans = Ingredient.objects.create(user=self.user, name='Beans')
+        for price, minutes, tags in ((2, 5, [self.vegan, self.quick]), (4, 15, [self.vegan, self.quick]),
+                                     (6, 60, [self.vegan, self.slow]), (10, 120, [self.slow])):
+            recipe = create_recipe(self.user, price=Decimal(price), time_minutes=minutes)
+            recipe.tags.add(*tags)
+            recipe.ingredients.add(self.beans)
+        other_user = get_user_model().objects.create_user(email='other@example.com', password='testpass123')
+        create_recipe(other_user).tags.add(Tag.objects.create(user=other_user, name='Vegan'))
+
+    def _names_and_counts(self, items):
+        """Return the name and count of each facet item"""
+        return [(item['name'], item['count']) for item in items]
+
+    def test_unfiltered_facets(self):
+        """Test counts over all of the user's recipes"""
+        res = self.client.get(FACETS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['count'], 4)
+        self.assertEqual(self._names_and_counts(res.data['tags']), [('Vegan', 3), ('Quick', 2), ('Slow', 2)])
+        self.assertEqual(self._names_and_counts(res.data['ingredients']), [('Beans', 4)])
+        self.assertEqual(res.data['histograms'], {})
+
+    def test_filtered_facets(self):
+        """Test counts over the recipes matching the tag filter"""
+        res = self.client.get(FACETS_URL, {'tags': self.vegan.id})
+
+        self.assertEqual(res.data['count'], 3)
+        self.assertEqual(self._names_and_counts(res.data['tags']), [('Vegan', 3), ('Quick', 2), ('Slow', 1)])
+        self.assertEqual(self._names_and_counts(res.data['ingredients']), [('Beans', 3)])
+
+    def test_facets_match_all(self):
+        """Test counts over the recipes with all of the given tags"""
+        res = self.client.get(FACETS_URL, {'tags': f'{self.vegan.id},{self.slow.id}', 'match': 'all'})
+
+        self.assertEqual(self._names_and_counts(res.data['tags']), [('Slow', 1), ('Vegan', 1)])
+
+    def test_histograms(self):
+        """Test price and time histograms in equal width buckets"""
+        res = self.client.get(FACETS_URL, {'histogram': 'price,time_minutes', 'buckets': 2, 'tags': self.vegan.id})
+
+        price = res.data['histograms']['price']
+        self.assertEqual([(bucket['start'], bucket['end'], bucket['count']) for bucket in price],
+                         [(Decimal(2), Decimal(4), 1), (Decimal(4), Decimal(6), 2)])
+        minutes = res.data['histograms']['time_minutes']
+        self.assertEqual([bucket['count'] for bucket in minutes], [2, 1])
+        self.assertEqual((minutes[0]['start'], minutes[-1]['end']), (5, 60))
+
+    def test_histogram_single_value(self):
+        """Test a column with a single value has a single bucket"""
+        Recipe.objects.filter(user=self.user).update(price=Decimal('3.00'))
+
+        res = self.client.get(FACETS_URL, {'histogram': 'price'})
+
+        self.assertEqual(res.data['histograms']['price'], [{'start': Decimal('3.00'), 'end': Decimal('3.00'),
+                                                            'count': 4}])
+
+    def test_invalid_params(self):
+        """Test an unknown histogram column or a bad bucket count returns a 400"""
+        for params in ({'histogram': 'title'}, {'buckets': 0}, {'buckets': 'some'}):
+            res = self.client.get(FACETS_URL, params)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_facets_query_count_independent_of_tags(self):
+        """Test facets are computed with grouped queries"""
+        def count_queries():
+            cache.clear()
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.get(FACETS_URL, {'tags': self.vegan.id, 'histogram': 'price,time_minutes'})
+            return len(ctx.captured_queries)
+
+        few = count_queries()
+        recipe = create_recipe(self.user)
+        recipe.tags.add(self.vegan, *(Tag.objects.create(user=self.user, name=f'Tag {i}') for i in range(10)))
+
+        self.assertEqual(count_queries(), few)
+
+    def test_facets_cached_until_change(self):
+        """Test facets are served from the cache until a recipe changes"""
+        self.client.get(FACETS_URL)
+        hit = self.client.get(FACETS_URL)
+        create_recipe(self.user).tags.add(self.quick)
+        miss = self.client.get(FACETS_URL)
+
+        self.assertEqual((hit['X-Cache'], miss['X-Cache']), ('HIT', 'MISS'))
+        self.assertEqual(self._names_and_counts(miss.data['tags'])[:2], [('Quick', 3), ('Vegan', 3)])
@@ -0,0 +1,115 @@
+"""
+Tests for the recipe image variants
+"""
+import tempfile
+from decimal import Decimal
+from unittest.mock import patch
+
+from PIL import Image
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core import jobs
+from core.models import Recipe
+from core.storage import ContentAddressedStorage
+from recipe import images
+
+
+def image_upload_url(recipe_id):
+    """Create and return a recipe image upload URL"""
+    return reverse('recipe:recipe-upload-image', args=[recipe_id])
+
+
+def detail_url(recipe_id):
+    """Create and return a recipe detail URL"""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class ImageVariantTests(TestCase):
+    """Test generating resized variants of uploaded images"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='testpass123')
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(user=self.user, title='Soup', time_minutes=5, price=Decimal('4.50'))
+        self.storage = Recipe._meta.get_field('image').storage
+
+    def tearDown(self):
+        self.recipe.refresh_from_db()
+        for name in self.recipe.image_variants.values():
+            self.storage.delete(name)
+        self.recipe.image.delete()
+
+    def _upload(self, size=(1600, 800)):
+        """Upload a JPEG image of a size and run the jobs it queued"""
+        with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+            Image.new('RGB', size, 'orange').save(image_file, format='JPEG')
+            image_file.seek(0)
+            res = self.client.post(image_upload_url(self.recipe.id), {'image': image_file}, format='multipart')
+        jobs.run_pending()
+        self.recipe.refresh_from_db()
+        return res
+
+    def test_upload_generates_variants(self):
+        """Test the upload returns the original and each variant is recorded once written"""
+        res = self._upload()
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['image_variants'], {})
+        self.assertTrue(self.user.job_set.filter(task='recipe.images.generate_variants', status='succeeded').exists())
+        self.assertEqual(set(self.recipe.image_variants), set(images.available_variants()))
+        with self.storage.open(self.recipe.image_variants['thumbnail']) as thumbnail:
+            self.assertEqual(Image.open(thumbnail).size, (200, 100))
+        with self.storage.open(self.recipe.image_variants['medium']) as medium:
+            self.assertEqual(Image.open(medium).size, (800, 400))
+
+    def test_detail_lists_variant_urls(self):
+        """Test the recipe detail has an absolute URL for each variant"""
+        self._upload()
+
+        res = self.client.get(detail_url(self.recipe.id))
+
+        thumbnail = res.data['image_variants']['thumbnail']
+        self.assertTrue(thumbnail.startswith('http://testserver/'))
+        self.assertTrue(thumbnail.endswith(self.recipe.image_variants['thumbnail']))
+
+    def test_replacing_image_deletes_old_variants(self):
+        """Test uploading a new image removes the variants of the previous one"""
+        self._upload()
+        old = list(self.recipe.image_variants.values())
+        old_image = self.recipe.image.name
+
+        self._upload(size=(300, 300))
+
+        self.assertTrue(all(not self.storage.exists(name) for name in old))
+        self.assertNotIn(old_image, ''.join(self.recipe.image_variants.values()))
+        self.storage.delete(old_image)
+
+    def test_stale_job_records_nothing(self):
+        """Test variants of an image the recipe no longer has are discarded"""
+        self._upload()
+        current = dict(self.recipe.image_variants)
+        name = self.storage.save('uploads/recipe/stale.jpg', self.recipe.image.file)
+
+        images.generate_variants(self.recipe.id, name)
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_variants, current)
+        self.assertFalse(self.storage.exists(images.variant_name(name, 'thumbnail')))
+        self.storage.delete(name)
+
+    def test_content_addressed_upload(self):
+        """Test identical uploads share their original and variant files"""
+        with tempfile.TemporaryDirectory() as directory:
+            with patch.object(Recipe._meta.get_field('image'), 'storage', ContentAddressedStorage(location=directory)):
+                self._upload()
+                first = (self.recipe.image.name, self.recipe.image_variants)
+                self.recipe = Recipe.objects.create(user=self.user, title='Stew', time_minutes=5, price=Decimal('1'))
+                self._upload()
+
+                self.assertEqual((self.recipe.image.name, self.recipe.image_variants), first)
+                self.assertTrue(self.recipe.image.storage.exists(first[1]['thumbnail']))
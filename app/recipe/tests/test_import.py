@@ -0,0 +1,174 @@
+"""
+Tests for the bulk recipe import
+"""
+import json
+from decimal import Decimal
+from operator import itemgetter
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import serializers, status
+from rest_framework.test import APIClient
+
+from core.models import Recipe, Tag, Ingredient
+from recipe.fastpath import RowValidator
+from recipe.serializers import RecipeExportSerializer
+
+RECIPE_URL = reverse('recipe:recipe-list')
+IMPORT_URL = reverse('recipe:recipe-import')
+EXPORT_URL = reverse('recipe:recipe-export')
+
+
+def recipe_line(title='Bean stew', **params):
+    """Return an NDJSON line for a recipe"""
+    defaults = {'title': title, 'time_minutes': 30, 'price': '4.50',
+                'tags': [{'name': 'Vegan'}], 'ingredients': [{'name': 'Beans'}, {'name': 'Salt'}]}
+    return json.dumps(defaults | params) + '\n'
+
+
+def without_ids(recipe):
+    """Return an exported recipe without its own or its tags' and ingredients' IDs"""
+    return {key: [item['name'] for item in value] if key in ('tags', 'ingredients') else value
+            for key, value in recipe.items() if key != 'id'}
+
+
+class RecipeImportTests(TestCase):
+    """Test importing recipes from NDJSON"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='testpass123')
+        self.client.force_authenticate(self.user)
+
+    def _import(self, body):
+        """Post an NDJSON body to the import endpoint"""
+        return self.client.generic('POST', IMPORT_URL, body, content_type='application/x-ndjson')
+
+    def test_import_recipes(self):
+        """Test importing creates recipes with their tags and ingredients, reusing existing ones"""
+        vegan = Tag.objects.create(user=self.user, name='Vegan')
+
+        res = self._import(recipe_line('Bean stew') + recipe_line('Lentil soup', tags=[{'name': 'Soup'}]))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {'created': 2, 'errors': []})
+        stew = Recipe.objects.get(user=self.user, title='Bean stew')
+        self.assertEqual(list(stew.tags.all()), [vegan])
+        self.assertEqual(sorted(stew.ingredients.values_list('name', flat=True)), ['Beans', 'Salt'])
+        self.assertEqual(Ingredient.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(stew.price, Decimal('4.50'))
+
+    def test_import_reports_line_errors(self):
+        """Test invalid lines are reported by line number while valid lines are imported"""
+        body = recipe_line('Good') + '\n' + '{"title": \n' + recipe_line('', price='abc') + '[1]\n' + recipe_line('Ok')
+
+        res = self._import(body)
+
+        self.assertEqual(res.data['created'], 2)
+        self.assertEqual([error['line'] for error in res.data['errors']], [3, 4, 5])
+        self.assertEqual(set(res.data['errors'][1]['errors']), {'title', 'price'})
+        self.assertEqual(Recipe.objects.filter(user=self.user).count(), 2)
+
+    def test_import_requires_ndjson(self):
+        """Test other content types are refused"""
+        res = self.client.post(IMPORT_URL, {'title': 'Bean stew'}, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+    def test_import_query_count_independent_of_lines(self):
+        """Test a chunk is written with a fixed number of queries"""
+        def count_queries(lines, prefix):
+            body = ''.join(
+                recipe_line(f'Recipe {i}', tags=[{'name': f'{prefix} tag {i}'}], ingredients=[{'name': prefix}])
+                for i in range(lines)
+            )
+            with CaptureQueriesContext(connection) as ctx:
+                self._import(body)
+            return len(ctx.captured_queries)
+
+        self.assertEqual(count_queries(2, 'few'), count_queries(20, 'many'))
+
+    def test_import_invalidates_cache(self):
+        """Test imported recipes show up in a previously cached list"""
+        self.client.get(RECIPE_URL)
+
+        self._import(recipe_line())
+        res = self.client.get(RECIPE_URL)
+
+        self.assertEqual(res['X-Cache'], 'MISS')
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_export_round_trip(self):
+        """Test an export can be imported into another account"""
+        self._import(recipe_line('Bean stew', description='Slow cooked') + recipe_line('Soup', tags=[]))
+        body = b''.join(self.client.get(EXPORT_URL, {'output': 'ndjson'}).streaming_content)
+        other_user = get_user_model().objects.create_user(email='other@example.com', password='testpass123')
+        self.client.force_authenticate(other_user)
+
+        res = self._import(body)
+        reexported = b''.join(self.client.get(EXPORT_URL, {'output': 'ndjson'}).streaming_content)
+
+        self.assertEqual(res.data['created'], 2)
+        by_title = itemgetter('title')
+        self.assertEqual(sorted((without_ids(json.loads(line)) for line in reexported.splitlines()), key=by_title),
+                         sorted((without_ids(json.loads(line)) for line in body.splitlines()), key=by_title))
+
+
+def no_soup(value):
+    """Refuse soups"""
+    if 'soup' in value.lower():
+        raise serializers.ValidationError('No soup.')
+
+
+class NoSoupTitleSerializer(RecipeExportSerializer):
+    """Export serializer with a validate_<field> method"""
+
+    def validate_title(self, value):
+        """Refuse soups"""
+        no_soup(value)
+        return value
+
+
+class NoSoupValidatorSerializer(RecipeExportSerializer):
+    """Export serializer with a custom field validator"""
+    title = serializers.CharField(max_length=255, validators=[no_soup])
+
+
+class RowValidatorTests(TestCase):
+    """Test the compiled validator agrees with the serializer"""
+
+    def test_matches_serializer(self):
+        """Test accepted objects validate exactly as the serializer validates them"""
+        serializer = RecipeExportSerializer()
+        validator = RowValidator.for_serializer(serializer)
+        samples = [
+            {'title': ' Stew ', 'time_minutes': 5, 'price': '3', 'link': '', 'tags': [{'name': ' Vegan', 'id': 9}]},
+            {'title': 'Soup', 'time_minutes': 5, 'price': 4, 'description': '', 'ingredients': []},
+            {'title': 'Soup', 'time_minutes': '5', 'price': '4.00'},
+        ]
+
+        for data in samples:
+            validated = validator.validate(data)
+            if validated is not None:
+                self.assertEqual(validated, serializer.run_validation(data))
+        self.assertIsNotNone(validator.validate(samples[0]))
+
+    def test_defers_invalid_data(self):
+        """Test anything the serializer would refuse is left to the serializer"""
+        validator = RowValidator.for_serializer(RecipeExportSerializer())
+        valid = {'title': 'Soup', 'time_minutes': 5, 'price': '4.00'}
+
+        for invalid in ({'title': ' '}, {'title': 'x' * 256}, {'price': '1234.5'}, {'time_minutes': 2 ** 40},
+                        {'tags': [{'name': ''}]}, {'tags': {'name': 'Vegan'}}, {'title': None}):
+            self.assertIsNone(validator.validate(valid | invalid), invalid)
+        self.assertIsNone(validator.validate({'title': 'Soup', 'price': '4.00'}))
+
+    def test_serializer_validation_not_skipped(self):
+        """Test serializers with validate_<field> methods or custom field validators are not compiled"""
+        self.assertIsNone(RowValidator.for_serializer(NoSoupTitleSerializer()))
+        self.assertIsNone(RowValidator.for_serializer(NoSoupValidatorSerializer()))
@@ -12,9 +12,10 @@ from rest_framework.test import APIClient
 
 from core.models import Ingredient, Recipe
 
-from recipe.serializers import IngredientSerializer
+from recipe.serializers import IngredientDetailSerializer
 
 INGREDIENTS_URL = reverse('recipe:ingredient-list')
+AUTOCOMPLETE_URL = reverse('recipe:ingredient-autocomplete')
 
 
 def detail_url(ingredient_id):
@@ -64,10 +65,10 @@ class PrivateIngredientApiTests(TestCase):
 
         res = self.client.get(INGREDIENTS_URL)
         ingredients = Ingredient.objects.all().order_by('-name')
-        serializer = IngredientSerializer(ingredients, many=True)
+        serializer = IngredientDetailSerializer(ingredients, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_ingredients_list_limited_to_user(self):
         """Test list of ingredients is limited to authenticated user."""
@@ -77,10 +78,10 @@ class PrivateIngredientApiTests(TestCase):
 
         res = self.client.get(INGREDIENTS_URL)
         ingredients = Ingredient.objects.filter(user=self.user)
-        serializer = IngredientSerializer(ingredients, many=True)
+        serializer = IngredientDetailSerializer(ingredients, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_update_ingredient(self):
         """Test updating a ingredient."""
@@ -120,10 +121,11 @@ class PrivateIngredientApiTests(TestCase):
 
         res = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
 
-        s1 = IngredientSerializer(in1)
-        s2 = IngredientSerializer(in2)
-        self.assertIn(s1.data, res.data)
-        self.assertNotIn(s2.data, res.data)
+        in1.refresh_from_db()
+        s1 = IngredientDetailSerializer(in1)
+        s2 = IngredientDetailSerializer(in2)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertNotIn(s2.data, res.data['results'])
 
     def test_filtered_ingredient_unique(self):
         """Test filtered ingredients returnes a unique list"""
@@ -146,4 +148,15 @@ class PrivateIngredientApiTests(TestCase):
 
         res = self.client.get(INGREDIENTS_URL, {'assigned_only': 1})
 
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_autocomplete_ingredients(self):
+        """Test autocompleting ingredients by prefix and misspelling"""
+        for name in ['Garlic', 'Garlic powder', 'Ginger', 'Cucumber']:
+            Ingredient.objects.create(user=self.user, name=name)
+
+        res1 = self.client.get(AUTOCOMPLETE_URL, {'q': 'garl'})
+        res2 = self.client.get(AUTOCOMPLETE_URL, {'q': 'cucumbr'})
+
+        self.assertEqual([i['name'] for i in res1.data['results']], ['Garlic', 'Garlic powder'])
+        self.assertEqual([i['name'] for i in res2.data['results']], ['Cucumber'])
@@ -0,0 +1,137 @@
+"""
+Tests for serving recipe image files
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from recipe import media
+
+DATA = bytes(range(256)) * 40
+
+
+def media_url(name):
+    """Create and return the URL of a stored file"""
+    return reverse('media', args=[name])
+
+
+class RecipeMediaTests(TestCase):
+    """Test image files are served to the owner of the recipe only"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='testpass123')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+        self.recipe = Recipe.objects.create(user=self.user, title='Soup', time_minutes=5, price=Decimal('4.50'))
+        self.recipe.image.save('image.jpg', ContentFile(DATA))
+        self.url = media_url(self.recipe.image.name)
+
+    def tearDown(self):
+        self.recipe.image.delete()
+
+    def test_image_url_is_served(self):
+        """Test the URL of the stored image is the media view"""
+        self.assertEqual(self.recipe.image.url, self.url)
+
+    def test_owner_gets_file(self):
+        """Test the file is streamed with headers letting clients cache it for good"""
+        res = self.client.get(self.url, HTTP_ACCEPT='image/jpeg')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(res.streaming_content), DATA)
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+        self.assertEqual(res['Content-Length'], str(len(DATA)))
+        self.assertEqual(res['Accept-Ranges'], 'bytes')
+        self.assertIn('immutable', res['Cache-Control'])
+        self.assertIn('private', res['Cache-Control'])
+
+    def test_range(self):
+        """Test a byte range returns a partial response with only those bytes"""
+        for header, first, last in (('bytes=100-199', 100, 199), ('bytes=10000-', 10000, 10239),
+                                    ('bytes=-40', 10200, 10239), ('bytes=10200-99999', 10200, 10239)):
+            res = self.client.get(self.url, HTTP_RANGE=header)
+
+            self.assertEqual(res.status_code, status.HTTP_206_PARTIAL_CONTENT)
+            self.assertEqual(b''.join(res.streaming_content), DATA[first:last + 1])
+            self.assertEqual(res['Content-Range'], f'bytes {first}-{last}/{len(DATA)}')
+            self.assertEqual(res['Content-Length'], str(last - first + 1))
+
+    def test_range_not_satisfiable(self):
+        """Test a range starting past the end of the file returns a 416"""
+        res = self.client.get(self.url, HTTP_RANGE='bytes=20000-')
+
+        self.assertEqual(res.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        self.assertEqual(res['Content-Range'], f'bytes */{len(DATA)}')
+
+    def test_if_range_mismatch_sends_whole_file(self):
+        """Test a range is ignored when the client's copy is of another version"""
+        res = self.client.get(self.url, HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"other"')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(b''.join(res.streaming_content), DATA)
+
+    def test_not_modified(self):
+        """Test a request with the current ETag returns a 304"""
+        etag = self.client.get(self.url)['ETag']
+
+        res = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_other_user_not_found(self):
+        """Test files of other users' recipes are not served"""
+        other = get_user_model().objects.create_user(email='other@example.com', password='testpass123')
+        client = APIClient()
+        client.force_authenticate(other)
+
+        self.assertEqual(client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(APIClient().get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_variant_served(self):
+        """Test the recorded variants of an image are served"""
+        storage = self.recipe.image.storage
+        name = storage.save(self.recipe.image.name.replace('.jpg', '_thumbnail.jpg'), ContentFile(b'small'))
+        Recipe.objects.filter(id=self.recipe.id).update(image_variants={'thumbnail': name})
+
+        res = self.client.get(media_url(name))
+
+        self.assertEqual(b''.join(res.streaming_content), b'small')
+        storage.delete(name)
+
+    @override_settings(RECIPE_MEDIA_SENDFILE_HEADER='X-Accel-Redirect')
+    def test_accel_redirect(self):
+        """Test the transfer is handed to nginx with an internal redirect"""
+        res = self.client.get(self.url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.content, b'')
+        self.assertEqual(res['X-Accel-Redirect'], f'/protected/media/{self.recipe.image.name}')
+        self.assertEqual(res['Content-Type'], 'image/jpeg')
+
+    @override_settings(RECIPE_MEDIA_SENDFILE_HEADER='X-Sendfile')
+    def test_sendfile(self):
+        """Test the transfer is handed to the server with the file path"""
+        res = self.client.get(self.url)
+
+        self.assertEqual(res['X-Sendfile'], self.recipe.image.path)
+
+
+class ParseRangeTests(TestCase):
+    """Test reading the Range header"""
+
+    def test_ignored_ranges(self):
+        """Test missing, malformed and multiple ranges send the whole file"""
+        for header in (None, '', 'bytes=-', 'items=0-1', 'bytes=5-2', 'bytes=0-1,4-5'):
+            self.assertIsNone(media.parse_range(header, 100))
+
+    def test_empty_suffix(self):
+        """Test a suffix of no bytes cannot be satisfied"""
+        with self.assertRaises(media.RangeNotSatisfiable):
+            media.parse_range('bytes=-0', 100)
@@ -4,16 +4,23 @@ Tests for the recipe API
 import os
 import tempfile
 from decimal import Decimal
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlparse
 
 from PIL import Image
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APIClient
 
 from core.models import Recipe, Tag, Ingredient
+from recipe.pagination import RecipeCursorPagination
 from recipe.serializers import RecipeSerializer, RecipeDetailSerializer
+from recipe.views import RecipeViewSet
 
 RECIPE_URL = reverse('recipe:recipe-list')
 
@@ -87,7 +94,7 @@ class PrivateRecipeApiTests(TestCase):
         serializer = RecipeSerializer(recipes, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_recipe_list_limited_to_user(self):
         """Test list of recipe is limited to authenticated user."""
@@ -100,7 +107,7 @@ class PrivateRecipeApiTests(TestCase):
         serializer = RecipeSerializer(recipes, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_get_recipe_detail(self):
         """Test get recipe details."""
@@ -233,6 +240,33 @@ class PrivateRecipeApiTests(TestCase):
             exists = recipe.tags.filter(name=tag['name'], user=self.user).exists()
             self.assertTrue(exists)
 
+    def test_create_recipe_collapses_duplicate_names(self):
+        """Test a name repeated in the payload creates and links one tag"""
+        payload = {'title': 'Pongal', 'time_minutes': 60, 'price': Decimal('4.50'),
+                   'tags': [{'name': 'Indian'}, {'name': 'Indian'}]}
+        res = self.client.post(RECIPE_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(len(res.data['tags']), 1)
+
+    def test_create_recipe_query_count_independent_of_ingredients(self):
+        """Test the ingredients of a new recipe are resolved and linked with a fixed number of queries"""
+        def count_queries(names):
+            payload = {'title': 'Soup', 'time_minutes': 60, 'price': Decimal('4.50'),
+                       'ingredients': [{'name': name} for name in names]}
+            with CaptureQueriesContext(connection) as ctx:
+                self.client.post(RECIPE_URL, payload, format='json')
+            return len(ctx.captured_queries)
+
+        Ingredient.objects.create(user=self.user, name='Salt')
+        Ingredient.objects.create(user=self.user, name='Pepper')
+
+        few = count_queries(['Salt', 'Leek'])
+        many = count_queries(['Pepper'] + [f'Ingredient {i}' for i in range(20)])
+
+        self.assertEqual(few, many)
+
     def test_create_tag_on_update(self):
         """Test creating a tag on update recipe"""
         recipe = create_recipe(user=self.user)
@@ -350,6 +384,50 @@ class PrivateRecipeApiTests(TestCase):
         self.assertEqual(res.status_code, status.HTTP_200_OK)
         self.assertEqual(recipe.ingredients.count(), 0)
 
+    def test_update_recipe_changes_only_differing_links(self):
+        """Test replacing one ingredient keeps the links of the others"""
+        recipe = create_recipe(user=self.user)
+        names = [f'Ingredient {i}' for i in range(30)]
+        recipe.ingredients.add(*(Ingredient.objects.create(user=self.user, name=name) for name in names))
+        links = Recipe.ingredients.through.objects.filter(recipe=recipe)
+        kept = set(links.exclude(ingredient__name='Ingredient 0').values_list('id', flat=True))
+
+        payload = {'ingredients': [{'name': name} for name in ['Lime'] + names[1:]]}
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.patch(detail_url(recipe.id), payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(links.exclude(ingredient__name='Lime').values_list('id', flat=True)), kept)
+        writes = [query['sql'] for query in ctx.captured_queries
+                  if query['sql'].startswith(('INSERT INTO "core_recipe_ingredients"', 'DELETE'))]
+        self.assertEqual(len(writes), 2)
+
+    def test_update_recipe_saves_changed_columns(self):
+        """Test a partial update writes only the columns that changed"""
+        recipe = create_recipe(user=self.user, title='Stew')
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.patch(detail_url(recipe.id), {'title': 'Curry', 'price': '5.25'}, format='json')
+
+        updates = [query['sql'] for query in ctx.captured_queries if query['sql'].startswith('UPDATE "core_recipe"')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"title"', updates[0])
+        self.assertNotIn('"price"', updates[0])
+        self.assertNotIn('"description"', updates[0])
+
+    def test_unchanged_update_writes_nothing(self):
+        """Test an update with the current values runs no writes"""
+        recipe = create_recipe(user=self.user, title='Stew')
+        recipe.tags.add(Tag.objects.create(user=self.user, name='Vegan'))
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.patch(detail_url(recipe.id), {'title': 'Stew', 'tags': [{'name': 'Vegan'}]},
+                                    format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertFalse([query for query in ctx.captured_queries
+                          if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))])
+
     def test_filter_by_ingredients(self):
         """test filtering recipes by ingredients"""
         r1 = create_recipe(user=self.user, title='Egusi')
@@ -367,9 +445,9 @@ class PrivateRecipeApiTests(TestCase):
         s2 = RecipeSerializer(r2)
         s3 = RecipeSerializer(r3)
 
-        self.assertIn(s1.data, res.data)
-        self.assertIn(s2.data, res.data)
-        self.assertNotIn(s3.data, res.data)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertIn(s2.data, res.data['results'])
+        self.assertNotIn(s3.data, res.data['results'])
 
     def test_filter_by_tags(self):
         """test filtering recipes by tags"""
@@ -388,9 +466,327 @@ class PrivateRecipeApiTests(TestCase):
         s2 = RecipeSerializer(r2)
         s3 = RecipeSerializer(r3)
 
-        self.assertIn(s1.data, res.data)
-        self.assertIn(s2.data, res.data)
-        self.assertNotIn(s3.data, res.data)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertIn(s2.data, res.data['results'])
+        self.assertNotIn(s3.data, res.data['results'])
+
+    def test_filter_returns_each_recipe_once(self):
+        """Test a recipe matching several filter IDs is returned once, without DISTINCT"""
+        recipe = create_recipe(user=self.user)
+        tag1 = Tag.objects.create(user=self.user, name='soup')
+        tag2 = Tag.objects.create(user=self.user, name='igbo')
+        recipe.tags.add(tag1, tag2)
+
+        params = {'tags': f'{tag1.id},{tag2.id}'}
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(RECIPE_URL, params)
+
+        self.assertEqual([r['id'] for r in res.data['results']], [recipe.id])
+        self.assertNotIn('DISTINCT', ctx.captured_queries[0]['sql'])
+
+    def test_filter_match_all(self):
+        """Test match=all returns only recipes with every requested tag and ingredient"""
+        r1 = create_recipe(user=self.user, title='Egusi')
+        r2 = create_recipe(user=self.user, title='Okra')
+        tag1 = Tag.objects.create(user=self.user, name='soup')
+        tag2 = Tag.objects.create(user=self.user, name='igbo')
+        in1 = Ingredient.objects.create(user=self.user, name='melon')
+        r1.tags.add(tag1, tag2)
+        r1.ingredients.add(in1)
+        r2.tags.add(tag1)
+        r2.ingredients.add(in1)
+
+        params = {'tags': f'{tag1.id},{tag2.id}', 'ingredients': f'{in1.id}', 'match': 'all'}
+        res = self.client.get(RECIPE_URL, params)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['id'] for r in res.data['results']], [r1.id])
+
+    def test_filter_invalid_ids_error(self):
+        """Test filtering with non-integer IDs returns a bad request"""
+        res = self.client.get(RECIPE_URL, {'tags': '1,abc'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filter_invalid_match_error(self):
+        """Test an unknown match mode returns a bad request"""
+        res = self.client.get(RECIPE_URL, {'tags': '1', 'match': 'some'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_search_ranks_title_matches_first(self):
+        """Test searching matches title and description, title matches first"""
+        r1 = create_recipe(user=self.user, title='Rice and beans', description='With plenty of tomato')
+        r2 = create_recipe(user=self.user, title='Tomato soup', description='Blended')
+        create_recipe(user=self.user, title='Chips', description='Fried potatoes')
+
+        res = self.client.get(RECIPE_URL, {'search': 'tomatoes'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual([r['id'] for r in res.data['results']], [r2.id, r1.id])
+
+    def test_search_follows_updates(self):
+        """Test the search index is kept up to date when a recipe changes"""
+        recipe = create_recipe(user=self.user, title='Jollof rice')
+        self.client.patch(detail_url(recipe.id), {'title': 'Fried plantain'})
+
+        self.assertEqual(self.client.get(RECIPE_URL, {'search': 'jollof'}).data['results'], [])
+        res = self.client.get(RECIPE_URL, {'search': 'plantain'})
+        self.assertEqual([r['id'] for r in res.data['results']], [recipe.id])
+
+    def test_search_pages_by_rank(self):
+        """Test walking search result pages returns every match once"""
+        for i in range(3):
+            create_recipe(user=self.user, title=f'Pepper soup {i}', description='Pepper' * i)
+        create_recipe(user=self.user, title='Pepper', description='pepper pepper pepper')
+
+        ids = []
+        res = self.client.get(RECIPE_URL, {'search': 'pepper', 'page_size': 1})
+        while True:
+            ids += [recipe['id'] for recipe in res.data['results']]
+            if not res.data['next']:
+                break
+            res = self.client.get(res.data['next'])
+
+        self.assertEqual(len(ids), 4)
+        self.assertEqual(len(set(ids)), 4)
+
+    def test_search_pages_through_equal_ranks(self):
+        """Test search pages past equal ranks follow the rank and id instead of an OFFSET"""
+        recipes = [create_recipe(user=self.user, title='Pepper soup') for i in range(5)]
+
+        ids = []
+        res = self.client.get(RECIPE_URL, {'search': 'pepper', 'page_size': 2})
+        with CaptureQueriesContext(connection) as ctx:
+            while True:
+                ids += [recipe['id'] for recipe in res.data['results']]
+                if not res.data['next']:
+                    break
+                res = self.client.get(res.data['next'])
+
+        self.assertEqual(ids, sorted([recipe.id for recipe in recipes], reverse=True))
+        recipe_sql = [query['sql'] for query in ctx.captured_queries if 'ts_rank' in query['sql']][-1]
+        self.assertIn('"core_recipe"."id" <', recipe_sql)
+        self.assertNotIn('OFFSET', recipe_sql)
+
+
+class RecipePaginationTests(TestCase):
+    """Test cursor pagination of the recipe list"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='testpass123')
+        self.client.force_authenticate(self.user)
+
+    def test_pages_follow_id_ordering(self):
+        """Test walking every page returns each recipe once, newest first"""
+        recipes = [create_recipe(user=self.user, title=f'Recipe {i}') for i in range(5)]
+
+        ids = []
+        res = self.client.get(RECIPE_URL, {'page_size': 2})
+        while True:
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(res.data['results']), 2)
+            ids += [recipe['id'] for recipe in res.data['results']]
+            if not res.data['next']:
+                break
+            res = self.client.get(res.data['next'])
+
+        self.assertEqual(ids, sorted([recipe.id for recipe in recipes], reverse=True))
+
+    def test_deep_page_uses_keyset(self):
+        """Test following a cursor filters on the key instead of using OFFSET"""
+        for i in range(3):
+            create_recipe(user=self.user, title=f'Recipe {i}')
+        res = self.client.get(RECIPE_URL, {'page_size': 1})
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(res.data['next'])
+
+        recipe_sql = ctx.captured_queries[0]['sql']
+        self.assertIn('"core_recipe"."id" <', recipe_sql)
+        self.assertNotIn('OFFSET', recipe_sql)
+
+    def test_page_size_capped(self):
+        """Test the requested page size cannot exceed the maximum"""
+        for i in range(3):
+            create_recipe(user=self.user, title=f'Recipe {i}')
+
+        with patch.object(RecipeCursorPagination, 'max_page_size', 2):
+            res = self.client.get(RECIPE_URL, {'page_size': 1000})
+
+        self.assertEqual(len(res.data['results']), 2)
+
+
+class RecipeQueryCountTests(TestCase):
+    """Test the recipe API runs a fixed number of queries"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='testpass123')
+        self.client.force_authenticate(self.user)
+
+    def _create_recipes(self, count):
+        """Create recipes that each have a tag and an ingredient"""
+        for i in range(count):
+            recipe = create_recipe(user=self.user, title=f'Recipe {i}')
+            recipe.tags.add(Tag.objects.create(user=self.user, name=f'Tag {recipe.id}'))
+            recipe.ingredients.add(Ingredient.objects.create(user=self.user, name=f'Ingredient {recipe.id}'))
+        return recipe
+
+    def _count_queries(self, method, url, data=None):
+        """Return the number of queries run by a request"""
+        with CaptureQueriesContext(connection) as ctx:
+            res = getattr(self.client, method)(url, data, format='json')
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return len(ctx.captured_queries)
+
+    def test_list_query_count_independent_of_recipes(self):
+        """Test listing recipes does not run queries per recipe"""
+        self._create_recipes(1)
+        few = self._count_queries('get', RECIPE_URL)
+        self._create_recipes(10)
+        many = self._count_queries('get', RECIPE_URL)
+
+        self.assertEqual(few, many)
+        self.assertEqual(many, 3)
+
+    def test_retrieve_query_count(self):
+        """Test retrieving a recipe prefetches its tags and ingredients"""
+        recipe = self._create_recipes(10)
+
+        self.assertEqual(self._count_queries('get', detail_url(recipe.id)), 3)
+
+    def test_partial_update_query_count_independent_of_recipes(self):
+        """Test updating a recipe does not run queries per recipe"""
+        recipe = self._create_recipes(1)
+        few = self._count_queries('patch', detail_url(recipe.id), {'title': 'New title'})
+        self._create_recipes(10)
+        many = self._count_queries('patch', detail_url(recipe.id), {'title': 'Newer title'})
+
+        self.assertEqual(few, many)
+
+    def test_create_query_count_independent_of_tags_and_ingredients(self):
+        """Test creating a recipe runs the same queries however many tags and ingredients it has"""
+        def count_queries(size, prefix):
+            payload = {
+                'title': f'{prefix} stew', 'time_minutes': 30, 'price': '4.50',
+                'tags': [{'name': f'{prefix} tag {i}'} for i in range(size)],
+                'ingredients': [{'name': f'{prefix} ingredient {i}'} for i in range(size)],
+            }
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.post(RECIPE_URL, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            self.assertEqual((len(res.data['tags']), len(res.data['ingredients'])), (size, size))
+            return len(ctx.captured_queries)
+
+        self.assertEqual(count_queries(2, 'few'), count_queries(20, 'many'))
+
+
+class RecipeSparseFieldsTests(TestCase):
+    """Test the fields and expand query params"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='testpass123')
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(user=self.user)
+        self.tag = Tag.objects.create(user=self.user, name='Vegan')
+        self.recipe.tags.add(self.tag)
+        self.recipe.ingredients.add(Ingredient.objects.create(user=self.user, name='Salt'))
+
+    def test_list_only_requested_fields(self):
+        """Test a sparse list skips unrequested columns and relations in SQL"""
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(RECIPE_URL, {'fields': 'id,title'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'], [{'id': self.recipe.id, 'title': self.recipe.title}])
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertNotIn('"link"', ctx.captured_queries[0]['sql'])
+
+    def test_relations_as_ids_unless_expanded(self):
+        """Test requested relations are IDs unless expanded"""
+        res = self.client.get(RECIPE_URL, {'fields': 'title,tags', 'expand': 'ingredients'})
+
+        recipe = res.data['results'][0]
+        self.assertEqual(set(recipe), {'title', 'tags', 'ingredients'})
+        self.assertEqual(recipe['tags'], [self.tag.id])
+        self.assertEqual(recipe['ingredients'][0]['name'], 'Salt')
+
+    def test_retrieve_sparse_fields(self):
+        """Test a sparse detail defers the text columns and keeps its validators"""
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(detail_url(self.recipe.id), {'fields': 'id,price'})
+
+        self.assertEqual(res.data, {'id': self.recipe.id, 'price': '5.25'})
+        self.assertIn('ETag', res)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertNotIn('"description"', ctx.captured_queries[0]['sql'])
+
+    def test_full_representation_by_default(self):
+        """Test expand alone leaves the full representation unchanged"""
+        res = self.client.get(detail_url(self.recipe.id), {'expand': 'tags'})
+
+        self.assertEqual(res.data, RecipeDetailSerializer(self.recipe).data)
+
+    def test_unknown_fields_rejected(self):
+        """Test unknown fields or relations return a 400"""
+        res1 = self.client.get(RECIPE_URL, {'fields': 'id,user'})
+        res2 = self.client.get(RECIPE_URL, {'fields': 'id', 'expand': 'title'})
+
+        self.assertEqual(res1.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res2.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class RecipeFastListTests(TestCase):
+    """Test the fast list path renders exactly what the serializer renders"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='testpass123')
+        self.client.force_authenticate(self.user)
+        tags = [Tag.objects.create(user=self.user, name=name) for name in ['Vegan', 'Quick', 'Dinner']]
+        salt = Ingredient.objects.create(user=self.user, name='Salt')
+        for i in range(5):
+            recipe = create_recipe(user=self.user, title=f'Bean stew {i}', price=Decimal(f'{i}.50'), link='')
+            recipe.tags.add(*tags[i % 3:])
+            if i % 2:
+                recipe.ingredients.add(salt)
+
+    def assertSameAsSerializer(self, params):
+        """Assert both list paths return the same bytes for a request"""
+        fast = self.client.get(RECIPE_URL, params)
+        cache.clear()
+        with patch.object(RecipeViewSet, 'fast_list', False):
+            slow = self.client.get(RECIPE_URL, params)
+
+        self.assertEqual(fast.status_code, status.HTTP_200_OK)
+        self.assertEqual(fast.content, slow.content)
+
+    def test_list_identical(self):
+        """Test the default list is identical"""
+        self.assertSameAsSerializer({})
+
+    def test_pages_identical(self):
+        """Test later pages are identical"""
+        next_url = self.client.get(RECIPE_URL, {'page_size': 2}).data['next']
+
+        self.assertSameAsSerializer(parse_qs(urlparse(next_url).query))
+
+    def test_search_identical(self):
+        """Test ranked search results are identical"""
+        self.assertSameAsSerializer({'search': 'bean'})
+
+    def test_sparse_fields_identical(self):
+        """Test sparse fieldsets are identical"""
+        self.assertSameAsSerializer({'fields': 'title,price,tags', 'expand': 'ingredients'})
+
+    def test_list_query_count(self):
+        """Test the fast path fetches each relation with one grouped query"""
+        with self.assertNumQueries(3):
+            self.client.get(RECIPE_URL)
 
 
 class ImageUploadTests(TestCase):
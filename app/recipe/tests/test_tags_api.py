@@ -2,19 +2,23 @@
 Test for the tags API.
 """
 from decimal import Decimal
+from unittest.mock import patch
 
 from django.contrib.auth import get_user_model
+from django.db.models.expressions import RawSQL
 from django.urls import reverse
-from django.test import TestCase
+from django.test import TestCase, override_settings
 
 from rest_framework import status
 from rest_framework.test import APIClient
 
 from core.models import Tag, Recipe
 
-from recipe.serializers import TagSerializer
+from recipe.serializers import TagDetailSerializer
+from recipe.views import TagViewSet
 
 TAGS_URL = reverse('recipe:tag-list')
+AUTOCOMPLETE_URL = reverse('recipe:tag-autocomplete')
 
 
 def detail_url(tag_id):
@@ -60,10 +64,10 @@ class PrivateTagsApiTests(TestCase):
 
         res = self.client.get(TAGS_URL)
         tags = Tag.objects.all().order_by('-name')
-        serializer = TagSerializer(tags, many=True)
+        serializer = TagDetailSerializer(tags, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_tags_list_limited_to_user(self):
         """Test list of tags is limited to authenticated user."""
@@ -74,9 +78,41 @@ class PrivateTagsApiTests(TestCase):
         res = self.client.get(TAGS_URL)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['name'], tag.name)
-        self.assertEqual(res.data[0]['id'], tag.id)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['name'], tag.name)
+        self.assertEqual(res.data['results'][0]['id'], tag.id)
+
+    def test_tags_paginated_by_name(self):
+        """Test walking tag pages returns each tag once in name order"""
+        for name in ['Vegan', 'Dessert', 'Lunch', 'Breakfast', 'Dinner']:
+            Tag.objects.create(user=self.user, name=name)
+
+        names = []
+        res = self.client.get(TAGS_URL, {'page_size': 2})
+        while True:
+            names += [tag['name'] for tag in res.data['results']]
+            if not res.data['next']:
+                break
+            res = self.client.get(res.data['next'])
+
+        self.assertEqual(names, ['Vegan', 'Lunch', 'Dinner', 'Dessert', 'Breakfast'])
+
+    def test_tags_paginated_by_count_past_ties(self):
+        """Test walking tag pages by recipe count returns each tag once past a thousand ties"""
+        Tag.objects.bulk_create(
+            [Tag(user=self.user, name=f'Tag {i:04}', recipe_count=0) for i in range(1500)]
+            + [Tag(user=self.user, name='Popular', recipe_count=5)]
+        )
+
+        names = []
+        res = self.client.get(TAGS_URL, {'ordering': '-recipe_count', 'page_size': 500})
+        while len(names) <= 1501:
+            names += [tag['name'] for tag in res.data['results']]
+            if not res.data['next']:
+                break
+            res = self.client.get(res.data['next'])
+
+        self.assertEqual(names, ['Popular'] + [f'Tag {i:04}' for i in reversed(range(1500))])
 
     def test_update_tags(self):
         """Test updating a tag."""
@@ -91,6 +127,16 @@ class PrivateTagsApiTests(TestCase):
 
         self.assertEqual(tag.name, payload['name'])
 
+    def test_update_tag_to_existing_name(self):
+        """Test renaming a tag to the name of another of the user's tags returns a 400"""
+        Tag.objects.create(user=self.user, name='Dessert')
+        tag = Tag.objects.create(user=self.user, name='After Dinner')
+
+        res = self.client.patch(detail_url(tag.id), {'name': 'Dessert'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('name', res.data)
+
     def test_delete_tags(self):
         """Test deleting a tag."""
         tag = Tag.objects.create(user=self.user, name='After Dinner')
@@ -116,10 +162,11 @@ class PrivateTagsApiTests(TestCase):
 
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
 
-        s1 = TagSerializer(tag1)
-        s2 = TagSerializer(tag2)
-        self.assertIn(s1.data, res.data)
-        self.assertNotIn(s2.data, res.data)
+        tag1.refresh_from_db()
+        s1 = TagDetailSerializer(tag1)
+        s2 = TagDetailSerializer(tag2)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertNotIn(s2.data, res.data['results'])
 
     def test_filtered_tags_unique(self):
         """Test filtered tags returnes a unique list"""
@@ -142,4 +189,69 @@ class PrivateTagsApiTests(TestCase):
 
         res = self.client.get(TAGS_URL, {'assigned_only': 1})
 
-        self.assertEqual(len(res.data), 1)
+        self.assertEqual(len(res.data['results']), 1)
+
+
+class TagAutocompleteTests(TestCase):
+    """Test the tag autocomplete endpoint"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = create_user(email='user@example.com', password='testpass123')
+        self.client.force_authenticate(self.user)
+        for name in ['Tomato', 'Cherry tomatoes', 'Tom yum', 'Basil', 'Dessert']:
+            Tag.objects.create(user=self.user, name=name)
+
+    def test_autocomplete_prefix(self):
+        """Test a prefix matches names containing a word starting with it"""
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'tom'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['results'][0]['name'], 'Tom yum')
+        self.assertEqual({tag['name'] for tag in res.data['results']}, {'Tomato', 'Cherry tomatoes', 'Tom yum'})
+        self.assertFalse(res.data['timed_out'])
+
+    def test_autocomplete_misspelling(self):
+        """Test a misspelled name still finds the tag"""
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'desert'})
+
+        self.assertEqual([tag['name'] for tag in res.data['results']], ['Dessert'])
+
+    def test_autocomplete_limit(self):
+        """Test limit caps the number of matches and is validated"""
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'tom', 'limit': 2})
+        bad = self.client.get(AUTOCOMPLETE_URL, {'q': 'tom', 'limit': 'ten'})
+
+        self.assertEqual(len(res.data['results']), 2)
+        self.assertEqual(bad.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_autocomplete_limited_to_user(self):
+        """Test autocomplete only matches the user's own tags"""
+        other_user = create_user(email='other@example.com', password='testpass123')
+        Tag.objects.create(user=other_user, name='Tomatillo')
+
+        res = self.client.get(AUTOCOMPLETE_URL, {'q': 'tomatil'})
+
+        self.assertNotIn('Tomatillo', [tag['name'] for tag in res.data['results']])
+
+    def test_autocomplete_empty_query(self):
+        """Test an empty query returns no matches without querying"""
+        with self.assertNumQueries(0):
+            res = self.client.get(AUTOCOMPLETE_URL, {'q': ' '})
+
+        self.assertEqual(res.data['results'], [])
+
+    @override_settings(RECIPE_AUTOCOMPLETE_TIMEOUT_MS=10)
+    def test_autocomplete_time_budget(self):
+        """Test a query over the time budget is cancelled and reported"""
+        get_queryset = TagViewSet.get_autocomplete_queryset
+
+        def slow_queryset(view, query, limit):
+            return get_queryset(view, query, limit).annotate(delay=RawSQL('pg_sleep(0.2)', ()))
+
+        with patch.object(TagViewSet, 'get_autocomplete_queryset', slow_queryset):
+            res = self.client.get(AUTOCOMPLETE_URL, {'q': 'tom'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data, {'results': [], 'timed_out': True})
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 5)
@@ -0,0 +1,133 @@
+"""
+Tests for the streaming image upload limits
+"""
+import io
+import os
+import struct
+import zlib
+from decimal import Decimal
+
+from PIL import Image
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from recipe.uploads import ImageUploadHandler, UploadTooLarge
+
+
+def image_upload_url(recipe_id):
+    """Create and return a recipe image upload URL"""
+    return reverse('recipe:recipe-upload-image', args=[recipe_id])
+
+
+def image_bytes(size, image_format='PNG', mode='RGB'):
+    """Return an encoded solid image"""
+    buffer = io.BytesIO()
+    Image.new(mode, size).save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+def png_claiming_size(width, height):
+    """Return a tiny PNG whose header claims the given size"""
+    data = image_bytes((1, 1))
+    ihdr = struct.pack('>II', width, height) + data[24:29]
+    return data[:16] + ihdr + struct.pack('>I', zlib.crc32(b'IHDR' + ihdr)) + data[33:]
+
+
+class ImageUploadLimitTests(TestCase):
+    """Test uploads are checked against the byte and pixel limits"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(email='user@example.com', password='testpass123')
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(user=self.user, title='Soup', time_minutes=5, price=Decimal('4.50'))
+
+    def _upload(self, data, name='image.png'):
+        """Post a file to the upload endpoint"""
+        upload = SimpleUploadedFile(name, data)
+        return self.client.post(image_upload_url(self.recipe.id), {'image': upload}, format='multipart')
+
+    def assertNoImage(self):
+        """Assert the recipe still has no image"""
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image)
+
+    @override_settings(RECIPE_IMAGE_MAX_BYTES=50 * 1024)
+    def test_too_many_bytes(self):
+        """Test an image over the byte limit returns a 413"""
+        noise = Image.frombytes('L', (400, 400), os.urandom(400 * 400))
+        buffer = io.BytesIO()
+        noise.save(buffer, format='PNG')
+
+        res = self._upload(buffer.getvalue())
+
+        self.assertEqual(res.status_code, status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        self.assertNoImage()
+
+    @override_settings(RECIPE_IMAGE_MAX_PIXELS=10_000)
+    def test_too_many_pixels(self):
+        """Test an image over the pixel limit returns a 400"""
+        res = self._upload(image_bytes((200, 100)))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', res.data)
+        self.assertNoImage()
+
+    def test_decompression_bomb(self):
+        """Test an image is refused by the size in its header"""
+        res = self._upload(png_claiming_size(100_000, 100_000))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertNoImage()
+
+    def test_not_an_image(self):
+        """Test a file that is not an image, or not a supported one, returns a 400"""
+        for data, name in ((b'not an image' * 100, 'image.jpg'), (image_bytes((10, 10), 'BMP'), 'image.bmp')):
+            res = self._upload(data, name)
+
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('image', res.data)
+        self.assertNoImage()
+
+    def test_valid_image(self):
+        """Test an image within the limits is stored"""
+        res = self._upload(image_bytes((20, 10), 'JPEG'), 'image.jpg')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image.width, 20)
+        self.recipe.image.delete()
+
+
+class ImageUploadHandlerTests(TestCase):
+    """Test the handler refuses uploads before reading all of them"""
+
+    def test_content_length_over_limit(self):
+        """Test a body over the byte limit is refused before any of it is read"""
+        handler = ImageUploadHandler()
+
+        with override_settings(RECIPE_IMAGE_MAX_BYTES=1024), self.assertRaises(UploadTooLarge):
+            handler.handle_raw_input(None, {}, 1024 * 1024, b'boundary')
+
+    def test_header_checked_on_first_chunk(self):
+        """Test an oversized image is refused from the first chunk"""
+        handler = ImageUploadHandler()
+        handler.new_file('image', 'image.png', 'image/png', None)
+
+        with self.assertRaises(ValidationError):
+            handler.receive_data_chunk(png_claiming_size(30_000, 30_000)[:1024], 0)
+
+    def test_header_not_found(self):
+        """Test data without an image header is refused once the header limit is buffered"""
+        handler = ImageUploadHandler()
+        handler.new_file('image', 'image.jpg', 'image/jpeg', None)
+
+        with override_settings(RECIPE_IMAGE_HEADER_BYTES=2048), self.assertRaises(ValidationError):
+            for start in range(0, 4096, 1024):
+                handler.receive_data_chunk(b'\0' * 1024, start)
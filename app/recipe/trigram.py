@@ -0,0 +1,28 @@
+"""
+Trigram word similarity for name autocomplete
+
+Django 3.2 only ships whole string trigram similarity, which scores a short
+prefix such as "tom" poorly against a longer name like "cherry tomatoes".
+pg_trgm's word similarity compares the query with the best matching word
+instead, and its %> operator is served by a gin_trgm_ops index.
+"""
+from django.contrib.postgres.lookups import PostgresOperatorLookup
+from django.db.models import CharField, FloatField, Func, TextField, Value
+
+
+class TrigramWordSimilarity(Func):
+    """Word similarity of a string to the best matching word of an expression"""
+    function = 'WORD_SIMILARITY'
+    output_field = FloatField()
+
+    def __init__(self, string, expression, **extra):
+        if not hasattr(string, 'resolve_expression'):
+            string = Value(string, output_field=TextField())
+        super().__init__(string, expression, **extra)
+
+
+@CharField.register_lookup
+class TrigramWordSimilar(PostgresOperatorLookup):
+    """Match rows where the value contains a word similar to the query"""
+    lookup_name = 'trigram_word_similar'
+    postgres_operator = '%%>'
@@ -0,0 +1,98 @@
+"""
+Streaming upload handler for recipe images.
+
+Uploads are written to a temporary file chunk by chunk. The first bytes
+are also kept in memory until Pillow can read the image header from
+them; the format and pixel count are checked from that header alone,
+without decoding, and a file that is too big by either measure is
+rejected before the rest of the body is read.
+"""
+import io
+import warnings
+
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from PIL import Image, UnidentifiedImageError
+from rest_framework import status
+from rest_framework.exceptions import APIException, ValidationError
+
+IMAGE_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+# Room for the multipart boundaries and headers around the file.
+MULTIPART_OVERHEAD = 64 * 1024
+INVALID_IMAGE = 'Upload a valid image. The file you uploaded was either not an image or a corrupted image.'
+
+
+class UploadTooLarge(APIException):
+    status_code = status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+    default_detail = 'The upload is too large.'
+    default_code = 'upload_too_large'
+
+
+def _too_large():
+    """Return the error for an upload over RECIPE_IMAGE_MAX_BYTES"""
+    return UploadTooLarge(f'Images may be at most {settings.RECIPE_IMAGE_MAX_BYTES} bytes.')
+
+
+def read_header(data):
+    """
+    Return the format and size of the image at the start of data, or None
+    if more data is needed, raising a ValidationError for unsupported or
+    oversized images
+    """
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', Image.DecompressionBombWarning)
+            image = Image.open(io.BytesIO(data))
+    except UnidentifiedImageError:
+        return None
+    except Image.DecompressionBombError:
+        raise ValidationError({'image': [f'Images may have at most {settings.RECIPE_IMAGE_MAX_PIXELS} pixels.']})
+    if image.format not in IMAGE_FORMATS:
+        raise ValidationError({'image': [f'Unsupported image format {image.format}.']})
+    width, height = image.size
+    if width * height > settings.RECIPE_IMAGE_MAX_PIXELS:
+        raise ValidationError({'image': [f'Images may have at most {settings.RECIPE_IMAGE_MAX_PIXELS} pixels.']})
+    return image.format, image.size
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    """Stream an image upload to disk, enforcing the byte and pixel limits as it arrives"""
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        if content_length > settings.RECIPE_IMAGE_MAX_BYTES + MULTIPART_OVERHEAD:
+            raise _too_large()
+        return super().handle_raw_input(input_data, META, content_length, boundary, encoding)
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+        self.header = io.BytesIO()
+        self.image = None
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.RECIPE_IMAGE_MAX_BYTES:
+            self.file.close()
+            raise _too_large()
+        if self.image is None:
+            self._check_header(raw_data, final=False)
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        if self.image is None:
+            self._check_header(b'', final=True)
+        return super().file_complete(file_size)
+
+    def _check_header(self, raw_data, final):
+        """Read the image header once enough of the file has arrived"""
+        self.header.write(raw_data)
+        try:
+            self.image = read_header(self.header.getvalue())
+        except ValidationError:
+            self.file.close()
+            raise
+        if self.image is not None:
+            self.header = None
+        elif final or self.header.tell() >= settings.RECIPE_IMAGE_HEADER_BYTES:
+            self.file.close()
+            raise ValidationError({'image': [INVALID_IMAGE]})
@@ -1,60 +1,244 @@
 """
 Views for the recipe api
 """
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.models import Exists, F, FloatField, OuterRef, Prefetch, Q
+from django.db.models.functions import Cast, Greatest
+from django.http import Http404, StreamingHttpResponse
 from drf_spectacular.utils import extend_schema_view, extend_schema, OpenApiParameter, OpenApiTypes
 from rest_framework import viewsets, mixins, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
-from rest_framework.authentication import TokenAuthentication
+from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 
+from core.authentication import CachedTokenAuthentication, SignedTokenAuthentication
 from core.models import Recipe, Tag, Ingredient
-from recipe import serializers
+from recipe import cache, export, facets, images, importer, media, serializers
+from recipe.batch import BatchMixin
+from recipe.cache import CachedListMixin
+from recipe.conditional import ConditionalListMixin, ConditionalRequestMixin
+from recipe.facets import HISTOGRAM_FIELDS
+from recipe.fastpath import FastListMixin, RowSerializer
+from recipe.pagination import RecipeCursorPagination, RecipeAttrCursorPagination
+from recipe.parsers import ImageUploadParser, NDJSONParser
+from recipe.trigram import TrigramWordSimilarity
+
+QUERY_CANCELED = '57014'
+
+
+@contextmanager
+def statement_timeout(milliseconds):
+    """
+    Cancel queries in the block that run longer than the given time.
+    The previous timeout is restored afterwards, since SET LOCAL would
+    otherwise outlive a savepoint into the enclosing transaction.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT current_setting('statement_timeout'), set_config('statement_timeout', %s, true)",
+            [str(milliseconds)],
+        )
+        previous = cursor.fetchone()[0]
+        yield
+        cursor.execute("SELECT set_config('statement_timeout', %s, true)", [previous])
+
+
+RECIPE_FILTER_PARAMETERS = [
+    OpenApiParameter(
+        'tags',
+        OpenApiTypes.STR,
+        description='Comma separated list of tags IDs to filter'
+    ),
+    OpenApiParameter(
+        'ingredients',
+        OpenApiTypes.STR,
+        description='Comma separated list of ingredients IDs to filter'
+    ),
+    OpenApiParameter(
+        'match',
+        OpenApiTypes.STR, enum=['any', 'all'],
+        description='Return recipes with any (default) or all of the given tags and ingredients'
+    ),
+    OpenApiParameter(
+        'search',
+        OpenApiTypes.STR,
+        description='Full text search over title and description, results ranked by relevance'
+    ),
+]
+
+SPARSE_FIELDSET_PARAMETERS = [
+    OpenApiParameter(
+        'fields',
+        OpenApiTypes.STR,
+        description='Comma separated list of fields to return, relations as IDs unless expanded'
+    ),
+    OpenApiParameter(
+        'expand',
+        OpenApiTypes.STR,
+        description='Comma separated list of relations to return as objects when fields is given'
+    ),
+]
 
 
 @extend_schema_view(
-    list=extend_schema(
-        parameters=[
+    list=extend_schema(parameters=RECIPE_FILTER_PARAMETERS + SPARSE_FIELDSET_PARAMETERS),
+    retrieve=extend_schema(parameters=SPARSE_FIELDSET_PARAMETERS),
+    export=extend_schema(
+        parameters=RECIPE_FILTER_PARAMETERS + [
             OpenApiParameter(
-                'tags',
-                OpenApiTypes.STR,
-                description='Comma separated list of tags IDs to filter'
+                'output',
+                OpenApiTypes.STR, enum=list(export.CONTENT_TYPES),
+                description='Stream a JSON array (default) or newline delimited JSON'
             ),
+        ]
+    ),
+    facets=extend_schema(
+        parameters=RECIPE_FILTER_PARAMETERS + [
             OpenApiParameter(
-                'ingredients',
+                'histogram',
                 OpenApiTypes.STR,
-                description='Comma separated list of ingredients IDs to filter'
+                description=f'Comma separated list of columns to return histograms of: {", ".join(HISTOGRAM_FIELDS)}'
             ),
-        ]
-    )
+            OpenApiParameter('buckets', OpenApiTypes.INT, description='Number of buckets of each histogram'),
+        ],
+        responses={200: OpenApiTypes.OBJECT},
+    ),
 )
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(ConditionalRequestMixin, CachedListMixin, FastListMixin, BatchMixin, viewsets.ModelViewSet):
     """
     View for manage recipe APIs
     """
-    authentication_classes = (TokenAuthentication,)
+    authentication_classes = (CachedTokenAuthentication, SignedTokenAuthentication)
     permission_classes = (IsAuthenticated,)
+    pagination_class = RecipeCursorPagination
     queryset = Recipe.objects.all()
     serializer_class = serializers.RecipeDetailSerializer
+    batch_serializer_class = serializers.RecipeExportSerializer
+    m2m_fields = ('tags', 'ingredients')
+    export_chunk_size = 2000
+    histogram_buckets = 10
+    max_histogram_buckets = 50
 
     def _params_to_ints(self, qs):
         """Convert a list of strings to integers"""
-        return [int(str_id) for str_id in qs.split(',')]
+        try:
+            return sorted({int(str_id) for str_id in qs.split(',')})
+        except ValueError:
+            raise ValidationError({'detail': f'Expected a comma separated list of IDs, got {qs!r}.'})
+
+    def _filter_by_related(self, queryset, field_name, ids, match):
+        """
+        Filter recipes linked to any or all of the given related IDs.
+        Each condition is an EXISTS semi-join on the through table, so the
+        result never has duplicate rows to remove.
+        """
+        field = Recipe._meta.get_field(field_name)
+        related_column = f'{field.m2m_reverse_field_name()}_id'
+        links = field.remote_field.through.objects.filter(recipe_id=OuterRef('pk'))
+        if match == 'all':
+            for related_id in ids:
+                queryset = queryset.filter(Exists(links.filter(**{related_column: related_id})))
+            return queryset
+        return queryset.filter(Exists(links.filter(**{f'{related_column}__in': ids})))
+
+    def _search_query(self):
+        """Return the full text query of the search param, if any"""
+        search = self.request.query_params.get('search', '').strip()
+        if search:
+            return SearchQuery(search, search_type='websearch', config='english')
+        return None
+
+    def filter_recipes(self, queryset):
+        """
+        Apply the tags, ingredients, match and search query params
+        """
+        match = self.request.query_params.get('match', 'any')
+        if match not in ('any', 'all'):
+            raise ValidationError({'detail': 'match must be "any" or "all".'})
+        for field_name in self.m2m_fields:
+            ids = self.request.query_params.get(field_name)
+            if ids:
+                queryset = self._filter_by_related(queryset, field_name, self._params_to_ints(ids), match)
+        search_query = self._search_query()
+        if search_query is not None:
+            queryset = queryset.filter(search_vector=search_query)
+        return queryset
 
     def get_queryset(self):
         """
         Retrieve the recipes for the authenticated user
         """
-        tags = self.request.query_params.get('tags')
-        ingredients = self.request.query_params.get('ingredients')
-        queryset = self.queryset
-        if tags:
-            tag_ids = self._params_to_ints(tags)
-            queryset = queryset.filter(tags__id__in=tag_ids)
-        if ingredients:
-            ingredient_ids = self._params_to_ints(ingredients)
-            queryset = queryset.filter(ingredients__id__in=ingredient_ids)
-        return queryset.filter(user=self.request.user).order_by('-id').distinct()
+        queryset = self.filter_recipes(self.queryset)
+        queryset = queryset.filter(user=self.request.user).order_by('-id')
+        search_query = self._search_query()
+        if search_query is not None:
+            # Cast the real returned by ts_rank to double precision so the rank
+            # survives the round trip through a pagination cursor unchanged.
+            rank = Cast(SearchRank(F('search_vector'), search_query), FloatField())
+            queryset = queryset.annotate(rank=rank).order_by('-rank', '-id')
+        return self._optimize_queryset(queryset)
+
+    def get_cursor_ordering(self):
+        """
+        Page search results by rank, and by id among equal ranks
+        """
+        if self._search_query() is not None:
+            return ('-rank', '-id')
+        return None
+
+    def _split_param(self, name, allowed):
+        """Return the names in a comma separated query param, refusing unknown ones"""
+        names = {value.strip() for value in self.request.query_params.get(name, '').split(',') if value.strip()}
+        unknown = names.difference(allowed)
+        if unknown:
+            raise ValidationError({'detail': f'Unknown {name}: {", ".join(sorted(unknown))}.'})
+        return names
+
+    def get_sparse_fields(self):
+        """
+        Return the fields and expanded relations requested by the fields and
+        expand query params, or None for the full representation
+        """
+        if self.action not in ('list', 'retrieve') or 'fields' not in self.request.query_params:
+            return None
+        expand = self._split_param('expand', self.m2m_fields)
+        fields = self._split_param('fields', self.get_serializer_class().Meta.fields)
+        return fields | expand, expand
+
+    def get_serializer_context(self):
+        """Pass the sparse fieldset on to the serializer"""
+        context = super().get_serializer_context()
+        context['sparse_fields'] = self.get_sparse_fields()
+        return context
+
+    def _optimize_queryset(self, queryset):
+        """
+        Load only the columns and relations the current action serializes
+        """
+        sparse_fields = self.get_sparse_fields()
+        serializer_fields = self.get_serializer_class().Meta.fields
+        requested, expand = sparse_fields or (set(serializer_fields), set(self.m2m_fields))
+        columns = [name for name in serializer_fields if name in requested and name not in self.m2m_fields]
+        if self.action == 'list':
+            queryset = queryset.only('id', *columns)
+        elif sparse_fields is not None:
+            queryset = queryset.only('id', self.version_field, *columns)
+        else:
+            queryset = queryset.defer('search_vector')
+        if self.action in ('list', 'retrieve', 'update', 'partial_update'):
+            for name in self.m2m_fields:
+                if name in requested:
+                    related = Recipe._meta.get_field(name).related_model
+                    loaded = ('id', 'name') if name in expand else ('id',)
+                    related_queryset = related.objects.only(*loaded).order_by('id')
+                    queryset = queryset.prefetch_related(Prefetch(name, queryset=related_queryset))
+        return queryset
 
     def get_serializer_class(self):
         """
@@ -64,6 +248,8 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return serializers.RecipeSerializer
         elif self.action == 'upload_image':
             return serializers.RecipeImageSerializer
+        elif self.action == 'export':
+            return serializers.RecipeExportSerializer
         return self.serializer_class
 
     def perform_create(self, serializer):
@@ -72,7 +258,71 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """
         serializer.save(user=self.request.user)
 
-    @action(methods=['post'], detail=True, url_path='upload-image')
+    @action(methods=['get'], detail=False)
+    def export(self, request):
+        """Stream all of the user's recipes with their tags and ingredients"""
+        output = request.query_params.get('output', 'json')
+        if output not in export.CONTENT_TYPES:
+            raise ValidationError({'detail': f'output must be one of {", ".join(export.CONTENT_TYPES)}.'})
+        rows = RowSerializer.for_serializer(self.get_serializer())
+        queryset = rows.values(self.filter_queryset(self.get_queryset()))
+        response = StreamingHttpResponse(
+            export.stream(rows, queryset, output, self.export_chunk_size),
+            content_type=export.CONTENT_TYPES[output],
+        )
+        response['Content-Disposition'] = f'attachment; filename="recipes.{output}"'
+        return response
+
+    def _get_histogram_buckets(self):
+        """Return the buckets query param, between 1 and max_histogram_buckets"""
+        buckets = self.request.query_params.get('buckets')
+        if buckets is None:
+            return self.histogram_buckets
+        try:
+            buckets = int(buckets)
+        except ValueError:
+            raise ValidationError({'detail': f'Expected a number for buckets, got {buckets!r}.'})
+        if not 1 <= buckets <= self.max_histogram_buckets:
+            raise ValidationError({'detail': f'buckets must be between 1 and {self.max_histogram_buckets}.'})
+        return buckets
+
+    @action(methods=['get'], detail=False)
+    def facets(self, request):
+        """
+        Count the recipes matching the list filters by tag and ingredient,
+        with histograms of the columns in the histogram query param
+        """
+        requested = self._split_param('histogram', HISTOGRAM_FIELDS)
+        buckets = self._get_histogram_buckets()
+        key = cache.response_key(request)
+        data = cache.get_response_data(key)
+        if data is not None:
+            return Response(data, headers={'X-Cache': 'HIT'})
+
+        recipes = self.filter_recipes(self.queryset.filter(user=request.user))
+        filtered = self._search_query() is not None or any(request.query_params.get(name) for name in self.m2m_fields)
+        columns = [name for name in HISTOGRAM_FIELDS if name in requested]
+        count, related, histograms = facets.facet_counts(recipes, self.m2m_fields if filtered else (), columns, buckets)
+        data = {'count': count}
+        for name in self.m2m_fields:
+            # Unfiltered counts are the stored recipe counts.
+            data[name] = related[name] if filtered else facets.stored_counts(name, request.user)
+        data['histograms'] = histograms
+        cache.set_response_data(key, data)
+        return Response(data, headers={'X-Cache': 'MISS'})
+
+    @extend_schema(request={NDJSONParser.media_type: OpenApiTypes.STR}, responses={200: OpenApiTypes.OBJECT})
+    @action(methods=['post'], detail=False, url_path='import', url_name='import', parser_classes=[NDJSONParser])
+    def import_recipes(self, request):
+        """
+        Create recipes from an NDJSON body, one recipe per line in the export
+        format, and report the lines that could not be imported
+        """
+        if isinstance(request.data, dict):
+            raise ValidationError({'detail': 'Expected a newline delimited JSON body.'})
+        return Response(importer.import_recipes(request.user, request.data), status=status.HTTP_200_OK)
+
+    @action(methods=['post'], detail=True, url_path='upload-image', parser_classes=[ImageUploadParser])
     def upload_image(self, request, pk=None):
         """Upload an image to recipe"""
         recipe = self.get_object()
@@ -92,24 +342,118 @@ class RecipeViewSet(viewsets.ModelViewSet):
                 OpenApiTypes.INT, enum=[0, 1],
                 description='Filter by items assigned to recipes'
             ),
+            OpenApiParameter(
+                'min_count',
+                OpenApiTypes.INT,
+                description='Only return items used by at least this many recipes'
+            ),
+            OpenApiParameter(
+                'ordering',
+                OpenApiTypes.STR, enum=['-name', '-recipe_count'],
+                description='Order by name (default) or by number of recipes, most used first'
+            ),
+        ]
+    ),
+    autocomplete=extend_schema(
+        parameters=[
+            OpenApiParameter('q', OpenApiTypes.STR, description='Name prefix or misspelled name to match'),
+            OpenApiParameter('limit', OpenApiTypes.INT, description='Maximum number of matches to return'),
         ]
-    )
+    ),
 )
-class BaseRecipeAttrViewSet(mixins.DestroyModelMixin, mixins.UpdateModelMixin, mixins.ListModelMixin,
-                            viewsets.GenericViewSet):
+class BaseRecipeAttrViewSet(ConditionalListMixin, CachedListMixin, mixins.DestroyModelMixin,
+                            mixins.UpdateModelMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
     """Base viewsets for recipe attributes."""
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication, SignedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = RecipeAttrCursorPagination
+    autocomplete_limit = 10
+    max_autocomplete_limit = 50
+    orderings = {'-name': ('-name',), '-recipe_count': ('-recipe_count', '-name')}
+
+    def _get_int_param(self, name, default):
+        """Return an integer query param, or raise a 400 if it is not a number"""
+        value = self.request.query_params.get(name, default)
+        try:
+            return int(value)
+        except ValueError:
+            raise ValidationError({'detail': f'Expected a number for {name}, got {value!r}.'})
+
+    def _get_min_count(self):
+        """Return the minimum recipe count of the min_count and assigned_only query params"""
+        min_count = self._get_int_param('min_count', '0')
+        if self._get_int_param('assigned_only', '0'):
+            min_count = max(min_count, 1)
+        return min_count
+
+    def get_cursor_ordering(self):
+        """Return the ordering of the ordering query param"""
+        ordering = self.request.query_params.get('ordering', '-name')
+        if ordering not in self.orderings:
+            raise ValidationError({'detail': f'ordering must be one of {", ".join(self.orderings)}.'})
+        return self.orderings[ordering]
 
     def get_queryset(self):
         """
             Filter queryset for the authenticated user
         """
-        assigned_only = bool(int(self.request.query_params.get('assigned_only', 0)))
         queryset = self.queryset
-        if assigned_only:
-            queryset = queryset.filter(recipe__isnull=False)
-        return queryset.filter(user=self.request.user).order_by('-name').distinct()
+        min_count = self._get_min_count()
+        if min_count > 0:
+            queryset = queryset.filter(recipe_count__gte=min_count)
+        return queryset.filter(user=self.request.user).order_by(*self.get_cursor_ordering())
+
+    def perform_update(self, serializer):
+        """Save the changes, refusing a name the user already has"""
+        try:
+            with transaction.atomic():
+                serializer.save()
+        except IntegrityError:
+            raise ValidationError({'name': ['You already have one with this name.']})
+
+    def _get_autocomplete_limit(self):
+        """Return the limit query param capped to max_autocomplete_limit"""
+        limit = self.request.query_params.get('limit')
+        if limit is None:
+            return self.autocomplete_limit
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ValidationError({'detail': f'Expected a number for limit, got {limit!r}.'})
+        if limit < 1:
+            raise ValidationError({'detail': 'limit must be at least 1.'})
+        return min(limit, self.max_autocomplete_limit)
+
+    def get_autocomplete_queryset(self, query, limit):
+        """
+        Return the user's best matches for a query, most similar first.
+        Both trigram operators are served by the name trigram index.
+        """
+        similarity = Greatest(TrigramWordSimilarity(query, 'name'), TrigramSimilarity('name', query))
+        return self.queryset.filter(
+            Q(name__trigram_word_similar=query) | Q(name__trigram_similar=query),
+            user=self.request.user,
+        ).annotate(similarity=similarity).order_by('-similarity', 'name')[:limit]
+
+    @action(methods=['get'], detail=False)
+    def autocomplete(self, request):
+        """
+        Return the names best matching q within the autocomplete time budget.
+        A query cut short by the budget returns no results and timed_out.
+        """
+        query = request.query_params.get('q', '').strip()
+        limit = self._get_autocomplete_limit()
+        if not query:
+            return Response({'results': [], 'timed_out': False})
+        try:
+            with statement_timeout(settings.RECIPE_AUTOCOMPLETE_TIMEOUT_MS):
+                matches = list(self.get_autocomplete_queryset(query, limit))
+        except OperationalError as exc:
+            if getattr(exc.__cause__, 'pgcode', None) != QUERY_CANCELED:
+                raise
+            return Response({'results': [], 'timed_out': True})
+        serializer = self.get_serializer(matches, many=True)
+        return Response({'results': serializer.data, 'timed_out': False})
 
 
 class TagViewSet(BaseRecipeAttrViewSet):
@@ -117,10 +461,31 @@ class TagViewSet(BaseRecipeAttrViewSet):
     View for manage Tag APIs
     """
     queryset = Tag.objects.all()
-    serializer_class = serializers.TagSerializer
+    serializer_class = serializers.TagDetailSerializer
 
 
 class IngredientViewSet(BaseRecipeAttrViewSet):
     """Manage ingredients in the database"""
     queryset = Ingredient.objects.all()
-    serializer_class = serializers.IngredientSerializer
+    serializer_class = serializers.IngredientDetailSerializer
+
+
+class RecipeMediaView(APIView):
+    """Serve the image files of the authenticated user's recipes"""
+    authentication_classes = [CachedTokenAuthentication, SignedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    schema = None
+
+    def perform_content_negotiation(self, request, force=False):
+        """Accept any Accept header, as the response is the file rather than rendered data"""
+        return super().perform_content_negotiation(request, force=True)
+
+    def get(self, request, name):
+        """Send a file that is the image or an image variant of one of the user's recipes"""
+        references = Q(image=name)
+        for variant in images.VARIANTS:
+            # Containment rather than a key lookup, so it can use the GIN index.
+            references |= Q(image_variants__contains={variant: name})
+        if not Recipe.objects.filter(references, user=request.user).exists():
+            raise Http404
+        return media.serve(request, Recipe._meta.get_field('image').storage, name)
@@ -3,6 +3,9 @@ from django.contrib.auth import get_user_model, authenticate
 from rest_framework import serializers
 from django.utils.translation import gettext_lazy as _
 
+from core import tokens
+from user.throttling import password_hash_slot
+
 
 class UserSerializer(serializers.ModelSerializer):
     """Serializers for the user object"""
@@ -14,7 +17,8 @@ class UserSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         """Create and return a user with encrypted password"""
-        return get_user_model().objects.create_user(**validated_data)
+        with password_hash_slot():
+            return get_user_model().objects.create_user(**validated_data)
 
     def update(self, instance, validated_data):
         """Update and return a user with encrypted password"""
@@ -22,7 +26,8 @@ class UserSerializer(serializers.ModelSerializer):
         user = super().update(instance, validated_data)
 
         if password:
-            user.set_password(password)
+            with password_hash_slot():
+                user.set_password(password)
             user.save()
 
         return user
@@ -40,14 +45,29 @@ class AuthTokenSerializer(serializers.Serializer):
         """Validate and authenticate the user"""
         email = attrs.get('email')
         password = attrs.get('password')
-        user = authenticate(
-            request=self.context.get('request'),
-            username=email,
-            password=password
-        )
+        with password_hash_slot():
+            user = authenticate(
+                request=self.context.get('request'),
+                username=email,
+                password=password
+            )
         if not user:
             msg = _('Unable to authenticate with the provided credentials')
             raise serializers.ValidationError(msg, code='authorization')
 
         attrs['user'] = user
         return attrs
+
+
+class SignedTokenSerializer(serializers.Serializer):
+    """Serializer for a signed access token and its refresh token"""
+    access = serializers.CharField(read_only=True)
+    refresh = serializers.CharField()
+    expires_in = serializers.IntegerField(read_only=True, help_text='Seconds until the access token expires')
+
+    def validate_refresh(self, value):
+        """Exchange a refresh token for new tokens"""
+        try:
+            return tokens.refresh(value)
+        except tokens.InvalidToken:
+            raise serializers.ValidationError(_('Invalid or expired refresh token'), code='authorization')
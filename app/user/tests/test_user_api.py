@@ -1,5 +1,6 @@
 from django.test import TestCase
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.urls import reverse
 
 from rest_framework.test import APIClient
@@ -8,6 +9,9 @@ from rest_framework import status
 CREATE_USER_URL = reverse('user:create')
 TOKEN_URL = reverse('user:token')
 ME_URL = reverse('user:me')
+SIGNED_TOKEN_URL = reverse('user:signed-token')
+REFRESH_URL = reverse('user:signed-token-refresh')
+REVOKE_URL = reverse('user:signed-token-revoke')
 
 
 def create_user(**params):
@@ -19,6 +23,7 @@ class PublicUserApiTests(TestCase):
     """Test the public features of the user api"""
 
     def setUp(self) -> None:
+        cache.clear()
         self.client = APIClient()
 
     def test_create_user_success(self):
@@ -131,3 +136,45 @@ class PrivateUserApiTest(TestCase):
         self.assertEqual(self.user.name, payload['name'])
         self.assertTrue(self.user.check_password(payload['password']))
         self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+
+class SignedTokenApiTests(TestCase):
+    """Test issuing, refreshing and revoking signed tokens"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.user = create_user(email='test@example.com', password='testpass123')
+
+    def test_signed_token_flow(self):
+        """Test the tokens issued for credentials are refreshed until revoked"""
+        issued = self.client.post(SIGNED_TOKEN_URL, {'email': 'test@example.com', 'password': 'testpass123'})
+        refreshed = self.client.post(REFRESH_URL, {'refresh': issued.data['refresh']})
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refreshed.data["access"]}')
+        revoked = self.client.post(REVOKE_URL)
+        res = self.client.post(REFRESH_URL, {'refresh': refreshed.data['refresh']})
+
+        self.assertEqual(issued.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(issued.data), {'access', 'refresh', 'expires_in'})
+        self.assertEqual(refreshed.status_code, status.HTTP_200_OK)
+        self.assertEqual(revoked.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_signed_token_bad_credentials(self):
+        """Test no tokens are issued for wrong credentials"""
+        res = self.client.post(SIGNED_TOKEN_URL, {'email': 'test@example.com', 'password': 'wrong'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertNotIn('access', res.data)
+
+    def test_update_profile_with_access_token(self):
+        """Test the profile is read and updated with an access token"""
+        access = self.client.post(SIGNED_TOKEN_URL, {'email': 'test@example.com', 'password': 'testpass123'})
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {access.data["access"]}')
+
+        res = self.client.patch(ME_URL, {'name': 'New'})
+
+        self.assertEqual(res.data, {'email': 'test@example.com', 'name': 'New'})
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.name, 'New')
+        self.assertTrue(self.user.check_password('testpass123'))
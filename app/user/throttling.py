@@ -0,0 +1,145 @@
+"""
+Throttles protecting the CPU spent hashing passwords.
+
+Logins and signups hash a password, which takes tens of milliseconds of
+CPU. Each client IP and each email gets a token bucket, and the number of
+hashes running at once across all processes is capped. State is kept in
+the cache alias AUTH_THROTTLE_CACHE_ALIAS, which must be shared by the
+processes for the limits to hold across them.
+"""
+import hashlib
+import math
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.exceptions import Throttled
+from rest_framework.throttling import BaseThrottle
+
+BUCKET_KEY = 'auth:bucket:{scope}:{digest}'
+HASHES_KEY = 'auth:password-hashes'
+# An in-flight count lost with a killed process is forgotten once no hash
+# has started for this long.
+HASHES_TIMEOUT = 60
+
+
+def _cache():
+    """Return the cache backend shared by the processes"""
+    return caches[settings.AUTH_THROTTLE_CACHE_ALIAS]
+
+
+class TokenBucket:
+    """
+    Bucket of capacity tokens, refilled with one token every interval
+    seconds. It is stored as the single number of milliseconds at which the
+    bucket will be full again, so taking a token is an atomic cache.incr
+    and concurrent processes never both get the last one.
+    """
+
+    def __init__(self, key, capacity, interval):
+        self.key = key
+        self.capacity = capacity
+        self.step = int(interval * 1000)
+
+    def take(self):
+        """Take a token, returning 0 or the seconds to wait until one is available"""
+        cache = _cache()
+        timeout = math.ceil(self.capacity * self.step / 1000)
+        now = int(time.time() * 1000)
+        if cache.add(self.key, now + self.step, timeout):
+            return 0
+        try:
+            full_at = cache.incr(self.key, self.step)
+        except ValueError:
+            cache.set(self.key, now + self.step, timeout)
+            return 0
+        if full_at - self.step < now:
+            # The bucket had filled up again while unused.
+            cache.set(self.key, now + self.step, timeout)
+            return 0
+        wait = full_at - now - self.capacity * self.step
+        if wait > 0:
+            cache.decr(self.key, self.step)
+            return wait / 1000
+        cache.touch(self.key, timeout)
+        return 0
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Throttle taking a token from the bucket of what identifies a request"""
+    scope = None
+    setting = None
+
+    def get_identity(self, request):
+        """Return what the bucket is kept for, or None to not throttle the request"""
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        """Return whether the bucket of the request had a token left"""
+        identity = self.get_identity(request)
+        if identity is None:
+            return True
+        digest = hashlib.sha256(identity.encode()).hexdigest()
+        capacity, interval = getattr(settings, self.setting)
+        self.retry_after = TokenBucket(BUCKET_KEY.format(scope=self.scope, digest=digest), capacity, interval).take()
+        return not self.retry_after
+
+    def wait(self):
+        """Return the whole seconds until a token is available, for the Retry-After header"""
+        return math.ceil(self.retry_after)
+
+
+class PasswordIPThrottle(TokenBucketThrottle):
+    """Throttle password checks per client IP"""
+    scope = 'ip'
+    setting = 'AUTH_THROTTLE_IP_BUCKET'
+
+    def get_identity(self, request):
+        """Return the client IP, taking NUM_PROXIES into account"""
+        return self.get_ident(request)
+
+
+class PasswordEmailThrottle(TokenBucketThrottle):
+    """Throttle password checks per email, whichever IPs they come from"""
+    scope = 'email'
+    setting = 'AUTH_THROTTLE_EMAIL_BUCKET'
+
+    def get_identity(self, request):
+        """Return the normalized email of the request body, if it has one"""
+        email = request.data.get('email') if hasattr(request.data, 'get') else None
+        return email.strip().lower() if isinstance(email, str) and email.strip() else None
+
+
+@contextmanager
+def password_hash_slot():
+    """
+    Hold one of the AUTH_PASSWORD_HASH_CONCURRENCY slots for hashing a
+    password, raising Throttled at once if they are all taken
+    """
+    cache = _cache()
+    cache.add(HASHES_KEY, 0, HASHES_TIMEOUT)
+    try:
+        in_flight = cache.incr(HASHES_KEY)
+    except ValueError:
+        in_flight = 1
+    # Keep the count alive while hashes are in flight, so it does not expire
+    # from under a steady stream of checks and restart from zero.
+    cache.touch(HASHES_KEY, HASHES_TIMEOUT)
+    if in_flight < 1:
+        # Releases outlived an expired count and left it negative.
+        cache.set(HASHES_KEY, 1, HASHES_TIMEOUT)
+        in_flight = 1
+    try:
+        if in_flight > settings.AUTH_PASSWORD_HASH_CONCURRENCY:
+            raise Throttled(
+                wait=settings.AUTH_PASSWORD_HASH_RETRY_AFTER,
+                detail='Too many password checks at once, try again shortly.',
+            )
+        yield
+    finally:
+        try:
+            if cache.decr(HASHES_KEY) < 0:
+                cache.set(HASHES_KEY, 0, HASHES_TIMEOUT)
+        except ValueError:
+            pass
@@ -8,5 +8,8 @@ app_name = 'user'
 urlpatterns = [
     path('create/', views.CreateUserView.as_view(), name='create'),
     path('token/', views.CreateTokenView.as_view(), name='token'),
+    path('signed-token/', views.CreateSignedTokenView.as_view(), name='signed-token'),
+    path('signed-token/refresh/', views.RefreshSignedTokenView.as_view(), name='signed-token-refresh'),
+    path('signed-token/revoke/', views.RevokeSignedTokensView.as_view(), name='signed-token-revoke'),
     path('me/', views.ManageUserView.as_view(), name='me'),
 ]
@@ -1,27 +1,80 @@
 """Views for the User API"""
-from rest_framework import generics, authentication, permissions
-from user.serializers import UserSerializer, AuthTokenSerializer
+from drf_spectacular.utils import extend_schema
+from rest_framework import generics, permissions, status
+from user.serializers import UserSerializer, AuthTokenSerializer, SignedTokenSerializer
 from rest_framework.authtoken.views import ObtainAuthToken
+from rest_framework.response import Response
 from rest_framework.settings import api_settings
 
+from core import tokens
+from core.authentication import CachedTokenAuthentication, SignedTokenAuthentication
+from user.throttling import PasswordEmailThrottle, PasswordIPThrottle
+
+# Views taking credentials have no authentication classes, as Basic
+# authentication would hash a password before the throttles run.
+PASSWORD_THROTTLES = [PasswordIPThrottle, PasswordEmailThrottle]
+
 
 class CreateUserView(generics.CreateAPIView):
     """Create a new user in the system"""
     serializer_class = UserSerializer
+    authentication_classes = []
+    throttle_classes = PASSWORD_THROTTLES
 
 
 class CreateTokenView(ObtainAuthToken):
     """Create a new auth token for user"""
     serializer_class = AuthTokenSerializer
     renderer_classes = api_settings.DEFAULT_RENDERER_CLASSES
+    authentication_classes = []
+    throttle_classes = PASSWORD_THROTTLES
+
+
+class CreateSignedTokenView(generics.GenericAPIView):
+    """Create a short lived signed access token and a refresh token for a user"""
+    serializer_class = AuthTokenSerializer
+    authentication_classes = []
+    throttle_classes = PASSWORD_THROTTLES
+
+    @extend_schema(responses=SignedTokenSerializer)
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(tokens.issue(serializer.validated_data['user']))
+
+
+class RefreshSignedTokenView(generics.GenericAPIView):
+    """Exchange a refresh token for a new access and refresh token"""
+    serializer_class = SignedTokenSerializer
+    authentication_classes = []
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(serializer.validated_data['refresh'])
+
+
+class RevokeSignedTokensView(generics.GenericAPIView):
+    """Revoke every signed token issued to the authenticated user"""
+    authentication_classes = [CachedTokenAuthentication, SignedTokenAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    @extend_schema(request=None, responses={204: None})
+    def post(self, request):
+        tokens.revoke(request.user)
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 class ManageUserView(generics.RetrieveUpdateAPIView):
     """Manage the authenticated user."""
     serializer_class = UserSerializer
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication, SignedTokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):
-        """Retrieve and return the authenticated user"""
-        return self.request.user
+        """Retrieve and return the authenticated user, loading the fields a token left out in one query"""
+        user = self.request.user
+        deferred = user.get_deferred_fields() - {'password'}
+        if deferred:
+            user.refresh_from_db(fields=deferred)
+        return user